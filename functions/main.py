@@ -15,13 +15,43 @@ from src.services.megasena_service import (
     obter_resultado_via_scraping,
     obter_resultado_api,
     obter_estatisticas,
+    validar_janelas,
+    obter_estatisticas_janelas,
     executar_scraping,
     importar_concursos_megasena,
+    obter_status_importacao_megasena,
+    obter_cobertura_megasena,
+    sincronizar_concursos,
+    conferir_apostas_megasena,
+    executar_backtest_megasena,
+    parametros_busca,
+    buscar_concursos_megasena,
+    obter_coocorrencia_megasena,
+    obter_atrasos_megasena,
+    obter_perfis_megasena,
+    obter_tendencias_megasena,
+    obter_series_megasena,
+    obter_cidades_ganhadoras_megasena,
     obter_historico_megasena,
-    obter_ultimos_sorteios
+    decodificar_cursor,
+    validar_campos_historico,
+    parametros_historico,
+    obter_ultimos_sorteios,
+    obter_estado_upstream
 )
 
 from src.megasena_api import MegasenaAPI
+from src.services.importacao_service import retomar_importacoes_pendentes
+from src.services.response_encoding import codificar_resposta
+from src.services.snapshot_listener import iniciar_listener
+from src.services.http_cache import (
+    etag_antecipada,
+    etag_corresponde,
+    cabecalhos_cache,
+    cabecalhos_nao_modificado,
+    inteiro_ou_padrao,
+    numero_da_resposta
+)
 
 # Importar o FirebaseService
 from src.services.firebase_service import FirebaseService
@@ -46,6 +76,8 @@ try:
     # Verificar se o Firebase está disponível após a inicialização
     firebase_available = True
     print("Firebase inicializado com sucesso!")
+    # Listener opcional (FIRESTORE_LISTENER=true) que mantém o histórico em memória atualizado
+    iniciar_listener()
 except Exception as e:
     print(f"Erro ao inicializar Firebase: {str(e)}")
     firebase_available = False
@@ -66,11 +98,49 @@ def atualizar_ultimo_sorteio(event: scheduler_fn.ScheduledEvent) -> None:
         # Registrar log de execução
         print(f"Atualização do último sorteio executada com sucesso: {resultado}")
         
+        # Avançar importações em segundo plano que não puderam continuar após a resposta HTTP
+        if firebase_available:
+            for status in retomar_importacoes_pendentes(max_lotes=2):
+                print(f"Importação {status['id']} retomada: {status['status']} ({status['progresso']}%)")
+        
         return None
     except Exception as e:
         print(f"Erro ao atualizar último sorteio: {str(e)}")
         return None
 
+def _responder(request, dados, status, headers):
+    """Codifica a resposta conforme os cabeçalhos Accept e Accept-Encoding da requisição."""
+    corpo, headers_codificacao = codificar_resposta(
+        dados,
+        accept=request.headers.get('Accept'),
+        accept_encoding=request.headers.get('Accept-Encoding')
+    )
+    return https_fn.Response(corpo, status=status, headers={**headers, **headers_codificacao})
+
+def _nao_modificado(request, recurso, headers, concurso=None, parametros=None):
+    """Responde 304 sem consultar o Firestore quando o cliente já possui a versão atual do recurso."""
+    etag = etag_antecipada(recurso, concurso, parametros)
+    if etag and etag_corresponde(request.headers.get('If-None-Match'), etag):
+        headers_cache = cabecalhos_nao_modificado(etag, concurso, concurso is not None)
+        return https_fn.Response('', status=304, headers={**headers, **headers_cache})
+    return None
+
+def _responder_leitura(request, recurso, dados, headers, concurso=None, parametros=None, registrar_ultimo=True):
+    """Responde um endpoint de leitura com os cabeçalhos de cache HTTP (ETag, Cache-Control)."""
+    headers_cache = cabecalhos_cache(
+        recurso,
+        concurso if concurso is not None else numero_da_resposta(recurso, dados),
+        concurso_fixo=concurso is not None,
+        parametros=parametros,
+        data_sorteio=dados.get('data_sorteio') if recurso == 'concurso' and isinstance(dados, dict) else None,
+        dados=dados,
+        registrar_ultimo=registrar_ultimo
+    )
+    # Recursos que ainda podem mudar só são comparados depois de obtidos os dados (a ETag inclui o hash deles)
+    if headers_cache and etag_corresponde(request.headers.get('If-None-Match'), headers_cache['ETag']):
+        return https_fn.Response('', status=304, headers={**headers, **headers_cache})
+    return _responder(request, dados, 200, {**headers, **headers_cache})
+
 # Função Firebase Functions
 @https_fn.on_request()
 def api(request: https_fn.Request) -> https_fn.Response:
@@ -82,13 +152,14 @@ def api(request: https_fn.Request) -> https_fn.Response:
         headers = {
             'Access-Control-Allow-Origin': '*',
             'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
-            'Access-Control-Allow-Headers': 'Content-Type',
+            'Access-Control-Allow-Headers': 'Content-Type, If-None-Match, Idempotency-Key',
             'Access-Control-Max-Age': '3600'
         }
         return https_fn.Response('', status=204, headers=headers)
     
     headers = {
-        'Access-Control-Allow-Origin': '*'
+        'Access-Control-Allow-Origin': '*',
+        'Access-Control-Expose-Headers': 'ETag, Last-Modified'
     }
     
     # Extrair o caminho da URL
@@ -96,33 +167,56 @@ def api(request: https_fn.Request) -> https_fn.Response:
     
     # Rotas da API
     if path == '/' or path == '':
-        return https_fn.Response(json.dumps({'status': 'Api working well'}), status=200, headers=headers)
+        return _responder(request, {'status': 'Api working well'}, 200, headers)
     
     elif path == '/megasena':
         res = obter_resultado_via_scraping()
-        return https_fn.Response(json.dumps(res), status=200, headers=headers)
+        return _responder(request, res, 200, headers)
     
     elif path == '/megasena/api':
         try:
             concurso = request.args.get('concurso')
+            numero_fixo = inteiro_ou_padrao(concurso)
+            resposta_304 = _nao_modificado(request, 'concurso', headers, numero_fixo)
+            if resposta_304:
+                return resposta_304
+            
             resultado = obter_resultado_api(concurso)
-            return https_fn.Response(json.dumps(resultado), status=200, headers=headers)
+            return _responder_leitura(request, 'concurso', resultado, headers, numero_fixo)
         except ValueError as ve:
-            return https_fn.Response(json.dumps({"erro": str(ve)}), status=400, headers=headers)
+            return _responder(request, {"erro": str(ve)}, 400, headers)
         except Exception as e:
-            return https_fn.Response(json.dumps({"erro": str(e)}), status=500, headers=headers)
+            return _responder(request, {"erro": str(e)}, 500, headers)
     
     elif path == '/megasena/estatisticas':
         try:
+            # Várias janelas de uma vez (ex.: janelas=10,50,100,500): uma resposta e uma entrada de cache
+            if request.args.get('janelas'):
+                janelas = validar_janelas(request.args.get('janelas'))
+                parametros = {'janelas': '+'.join(str(janela) for janela in janelas)}
+                resposta_304 = _nao_modificado(request, 'estatisticas_janelas', headers, parametros=parametros)
+                if resposta_304:
+                    return resposta_304
+                
+                estatisticas = obter_estatisticas_janelas(janelas)
+                return _responder_leitura(request, 'estatisticas_janelas', estatisticas, headers, parametros=parametros)
+            
             ultimos_n = request.args.get('ultimos', 10)
+            parametros = {'ultimos': inteiro_ou_padrao(ultimos_n, 10)}
+            resposta_304 = _nao_modificado(request, 'estatisticas', headers, parametros=parametros)
+            if resposta_304:
+                return resposta_304
+            
             estatisticas = obter_estatisticas(ultimos_n)
-            return https_fn.Response(json.dumps(estatisticas), status=200, headers=headers)
+            return _responder_leitura(request, 'estatisticas', estatisticas, headers, parametros=parametros)
+        except ValueError as ve:
+            return _responder(request, {"erro": str(ve)}, 400, headers)
         except Exception as e:
-            return https_fn.Response(json.dumps({"erro": str(e)}), status=500, headers=headers)
+            return _responder(request, {"erro": str(e)}, 500, headers)
     
     elif path == '/firebase-scraping':
         if not firebase_available:
-            return https_fn.Response(json.dumps({'error': 'Firebase não está disponível neste ambiente'}), status=503, headers=headers)
+            return _responder(request, {'error': 'Firebase não está disponível neste ambiente'}, 503, headers)
         
         try:
             data = request.get_json() if request.is_json else {}
@@ -130,76 +224,279 @@ def api(request: https_fn.Request) -> https_fn.Response:
             opcoes = data.get('opcoes')
             
             resultado = executar_scraping(url, opcoes)
-            return https_fn.Response(json.dumps(resultado), status=200, headers=headers)
+            return _responder(request, resultado, 200, headers)
         except Exception as e:
-            return https_fn.Response(json.dumps({'error': str(e)}), status=500, headers=headers)
+            return _responder(request, {'error': str(e)}, 500, headers)
     
     elif path == '/megasena/importar':
         if not firebase_available:
-            return https_fn.Response(json.dumps({'erro': 'Firebase não está disponível neste ambiente'}), status=503, headers=headers)
+            return _responder(request, {'erro': 'Firebase não está disponível neste ambiente'}, 503, headers)
         
         try:
             data = request.get_json() if request.is_json else {}
             inicio = data.get('inicio', 2800)
             fim = data.get('fim')
+            tamanho_lote = data.get('tamanho_lote')
+            importacao_id = data.get('importacao_id')
+            chave_idempotencia = request.headers.get('Idempotency-Key') or data.get('chave_idempotencia')
+            
+            resultado = importar_concursos_megasena(inicio, fim, tamanho_lote, importacao_id, chave_idempotencia)
+            
+            return _responder(request, resultado, 202, headers)
+        except ValueError as ve:
+            return _responder(request, {'erro': str(ve)}, 400, headers)
+        except Exception as e:
+            return _responder(request, {'status': 'error', 'erro': str(e)}, 500, headers)
+    
+    elif path == '/megasena/importar/status':
+        if not firebase_available:
+            return _responder(request, {'erro': 'Firebase não está disponível neste ambiente'}, 503, headers)
+        
+        try:
+            resultado = obter_status_importacao_megasena(request.args.get('id'))
+            if resultado is None:
+                return _responder(request, {'erro': 'Importação não encontrada'}, 404, headers)
+            return _responder(request, resultado, 200, headers)
+        except ValueError as ve:
+            return _responder(request, {'erro': str(ve)}, 400, headers)
+        except Exception as e:
+            return _responder(request, {'status': 'error', 'erro': str(e)}, 500, headers)
+    
+    elif path == '/megasena/cobertura':
+        if not firebase_available:
+            return _responder(request, {'erro': 'Firebase não está disponível neste ambiente'}, 503, headers)
+        
+        try:
+            return _responder(request, obter_cobertura_megasena(), 200, headers)
+        except Exception as e:
+            return _responder(request, {'status': 'error', 'erro': str(e)}, 500, headers)
+    
+    elif path == '/megasena/sincronizar':
+        if not firebase_available:
+            return _responder(request, {'erro': 'Firebase não está disponível neste ambiente'}, 503, headers)
+        
+        try:
+            limite = inteiro_ou_padrao(request.args.get('limite'), None)
+            return _responder(request, sincronizar_concursos(request.args.get('desde', 0), limite), 200, headers)
+        except ValueError as ve:
+            return _responder(request, {'erro': str(ve)}, 400, headers)
+        except Exception as e:
+            return _responder(request, {'status': 'error', 'erro': str(e)}, 500, headers)
+    
+    elif path == '/megasena/conferir':
+        try:
+            # JSON ({"apostas": [[...], ...]}) ou texto com uma aposta por linha, lido em streaming
+            if request.is_json:
+                dados = request.get_json(silent=True) or {}
+                apostas = dados.get('apostas') or []
+            else:
+                dados = {}
+                apostas = request.stream
+            
+            resultado = conferir_apostas_megasena(
+                apostas,
+                concurso=inteiro_ou_padrao(dados.get('concurso', request.args.get('concurso'))),
+                inicio=inteiro_ou_padrao(dados.get('inicio', request.args.get('inicio'))),
+                fim=inteiro_ou_padrao(dados.get('fim', request.args.get('fim'))),
+                max_premiadas=inteiro_ou_padrao(dados.get('max_premiadas', request.args.get('max_premiadas')))
+            )
+            return _responder(request, resultado, 200, headers)
+        except ValueError as ve:
+            return _responder(request, {'erro': str(ve)}, 400, headers)
+        except Exception as e:
+            return _responder(request, {'status': 'error', 'erro': str(e)}, 500, headers)
+    
+    elif path == '/megasena/backtest':
+        try:
+            dados = request.get_json(silent=True) or {}
+            resultado = executar_backtest_megasena(
+                dados.get('apostas'),
+                inicio=inteiro_ou_padrao(dados.get('inicio', request.args.get('inicio'))),
+                fim=inteiro_ou_padrao(dados.get('fim', request.args.get('fim')))
+            )
+            return _responder(request, resultado, 200, headers)
+        except ValueError as ve:
+            return _responder(request, {'erro': str(ve)}, 400, headers)
+        except Exception as e:
+            return _responder(request, {'status': 'error', 'erro': str(e)}, 500, headers)
+    
+    elif path == '/megasena/buscar':
+        try:
+            parametros = parametros_busca(
+                request.args.get('dezenas', ''),
+                inteiro_ou_padrao(request.args.get('minimo')),
+                inteiro_ou_padrao(request.args.get('limite'))
+            )
+            resposta_304 = _nao_modificado(request, 'buscar', headers, parametros=parametros)
+            if resposta_304:
+                return resposta_304
             
-            resultado = importar_concursos_megasena(inicio, fim)
+            resultado = buscar_concursos_megasena(parametros['dezenas'], parametros['minimo'], parametros['limite'])
+            return _responder_leitura(request, 'buscar', resultado, headers, parametros=parametros)
+        except ValueError as ve:
+            return _responder(request, {'erro': str(ve)}, 400, headers)
+        except Exception as e:
+            return _responder(request, {'status': 'error', 'erro': str(e)}, 500, headers)
+    
+    elif path == '/megasena/coocorrencia':
+        try:
+            parametros = {
+                campo: inteiro_ou_padrao(request.args.get(campo))
+                for campo in ('tamanho', 'ultimos', 'inicio', 'fim', 'top')
+            }
+            resposta_304 = _nao_modificado(request, 'coocorrencia', headers, parametros=parametros)
+            if resposta_304:
+                return resposta_304
             
-            return https_fn.Response(json.dumps(resultado), status=200, headers=headers)
+            resultado = obter_coocorrencia_megasena(**parametros)
+            return _responder_leitura(request, 'coocorrencia', resultado, headers, parametros=parametros)
         except ValueError as ve:
-            return https_fn.Response(json.dumps({'erro': str(ve)}), status=400, headers=headers)
+            return _responder(request, {'erro': str(ve)}, 400, headers)
         except Exception as e:
-            return https_fn.Response(json.dumps({'status': 'error', 'erro': str(e)}), status=500, headers=headers)
+            return _responder(request, {'status': 'error', 'erro': str(e)}, 500, headers)
+    
+    elif path == '/megasena/atrasos':
+        try:
+            parametros = {'ordenar': request.args.get('ordenar')}
+            resposta_304 = _nao_modificado(request, 'atrasos', headers, parametros=parametros)
+            if resposta_304:
+                return resposta_304
+            
+            resultado = obter_atrasos_megasena(**parametros)
+            return _responder_leitura(request, 'atrasos', resultado, headers, parametros=parametros)
+        except ValueError as ve:
+            return _responder(request, {'erro': str(ve)}, 400, headers)
+        except Exception as e:
+            return _responder(request, {'status': 'error', 'erro': str(e)}, 500, headers)
+    
+    elif path == '/megasena/estatisticas/perfis':
+        try:
+            parametros = {
+                campo: inteiro_ou_padrao(request.args.get(campo))
+                for campo in ('ultimos', 'inicio', 'fim')
+            }
+            resposta_304 = _nao_modificado(request, 'perfis', headers, parametros=parametros)
+            if resposta_304:
+                return resposta_304
+            
+            resultado = obter_perfis_megasena(**parametros)
+            return _responder_leitura(request, 'perfis', resultado, headers, parametros=parametros)
+        except ValueError as ve:
+            return _responder(request, {'erro': str(ve)}, 400, headers)
+        except Exception as e:
+            return _responder(request, {'status': 'error', 'erro': str(e)}, 500, headers)
+    
+    elif path == '/megasena/estatisticas/tendencias':
+        try:
+            parametros = {
+                campo: inteiro_ou_padrao(request.args.get(campo))
+                for campo in ('janela', 'pontos')
+            }
+            resposta_304 = _nao_modificado(request, 'tendencias', headers, parametros=parametros)
+            if resposta_304:
+                return resposta_304
+            
+            resultado = obter_tendencias_megasena(**parametros)
+            return _responder_leitura(request, 'tendencias', resultado, headers, parametros=parametros)
+        except ValueError as ve:
+            return _responder(request, {'erro': str(ve)}, 400, headers)
+        except Exception as e:
+            return _responder(request, {'status': 'error', 'erro': str(e)}, 500, headers)
+    
+    elif path == '/megasena/series':
+        try:
+            parametros = {
+                'campo': request.args.get('campo'),
+                'agrupar': request.args.get('agrupar'),
+                **{campo: inteiro_ou_padrao(request.args.get(campo)) for campo in ('pontos', 'ultimos', 'inicio', 'fim')}
+            }
+            resposta_304 = _nao_modificado(request, 'series', headers, parametros=parametros)
+            if resposta_304:
+                return resposta_304
+            
+            resultado = obter_series_megasena(**parametros)
+            return _responder_leitura(request, 'series', resultado, headers, parametros=parametros)
+        except ValueError as ve:
+            return _responder(request, {'erro': str(ve)}, 400, headers)
+        except Exception as e:
+            return _responder(request, {'status': 'error', 'erro': str(e)}, 500, headers)
+    
+    elif path == '/megasena/cidades':
+        try:
+            parametros = {
+                'uf': request.args.get('uf'),
+                'busca': request.args.get('busca'),
+                'top': inteiro_ou_padrao(request.args.get('top'))
+            }
+            resposta_304 = _nao_modificado(request, 'cidades', headers, parametros=parametros)
+            if resposta_304:
+                return resposta_304
+            
+            resultado = obter_cidades_ganhadoras_megasena(**parametros)
+            return _responder_leitura(request, 'cidades', resultado, headers, parametros=parametros)
+        except ValueError as ve:
+            return _responder(request, {'erro': str(ve)}, 400, headers)
+        except Exception as e:
+            return _responder(request, {'status': 'error', 'erro': str(e)}, 500, headers)
     
     elif path == '/megasena/historico':
         if not firebase_available:
-            return https_fn.Response(json.dumps({'erro': 'Firebase não está disponível neste ambiente'}), status=503, headers=headers)
+            return _responder(request, {'erro': 'Firebase não está disponível neste ambiente'}, 503, headers)
         
         try:
-            limite = request.args.get('limite', 10)
-            limite = int(limite) if limite else 10
-            resultados = obter_historico_megasena(limite)
+            # limite é aceito como sinônimo de page_size
+            page_size = inteiro_ou_padrao(request.args.get('page_size', request.args.get('limite')), 10)
+            cursor = request.args.get('cursor')
+            antes_de = decodificar_cursor(cursor)
+            campos = validar_campos_historico(request.args.get('fields'))
+            parametros = parametros_historico(page_size, campos)
+            
+            # Mesmo após um cursor, a página muda quando concursos anteriores são importados ou
+            # reparados: a ETag inclui o hash do conteúdo e o 304 só é decidido depois da leitura
+            resultados = obter_historico_megasena(page_size, cursor, campos)
             
             # Usar diretamente o conteúdo já serializado em obter_historico_megasena
-            return https_fn.Response(
-                json.dumps(resultados), 
-                status=200, 
-                headers=headers
-            )
+            return _responder_leitura(request, 'historico', resultados, headers, parametros=parametros,
+                                      registrar_ultimo=antes_de is None)
+        except ValueError as ve:
+            return _responder(request, {'erro': str(ve)}, 400, headers)
         except TypeError as te:
             # Capturar erros específicos de serialização JSON
             if "not JSON serializable" in str(te):
-                return https_fn.Response(
-                    json.dumps({
-                        'status': 'error', 
-                        'erro': 'Erro na serialização dos dados do Firestore. Detalhes: ' + str(te)
-                    }), 
-                    status=500, 
-                    headers=headers
-                )
-            return https_fn.Response(json.dumps({'status': 'error', 'erro': str(te)}), status=500, headers=headers)
-        except Exception as e:
-            return https_fn.Response(
-                json.dumps({
+                return _responder(request, {
                     'status': 'error', 
-                    'erro': str(e),
-                    'tipo': str(type(e).__name__)
-                }), 
-                status=500, 
-                headers=headers
-            )
+                    'erro': 'Erro na serialização dos dados do Firestore. Detalhes: ' + str(te)
+                }, 500, headers)
+            return _responder(request, {'status': 'error', 'erro': str(te)}, 500, headers)
+        except Exception as e:
+            return _responder(request, {
+                'status': 'error', 
+                'erro': str(e),
+                'tipo': str(type(e).__name__)
+            }, 500, headers)
     
     elif path == '/megasena/ultimos_sorteios':
         try:
             ultimos_n = request.args.get('ultimos', 10)
             ultimos_n = int(ultimos_n) if ultimos_n else 10
+            parametros = {'ultimos': inteiro_ou_padrao(ultimos_n, 10)}
+            resposta_304 = _nao_modificado(request, 'ultimos_sorteios', headers, parametros=parametros)
+            if resposta_304:
+                return resposta_304
+            
             resultado = obter_ultimos_sorteios(ultimos_n)
-            return https_fn.Response(json.dumps(resultado), status=200, headers=headers)
+            return _responder_leitura(request, 'ultimos_sorteios', resultado, headers, parametros=parametros)
+        except Exception as e:
+            return _responder(request, {"erro": str(e)}, 500, headers)
+    
+    elif path == '/megasena/upstream':
+        try:
+            return _responder(request, obter_estado_upstream(), 200, headers)
         except Exception as e:
-            return https_fn.Response(json.dumps({"erro": str(e)}), status=500, headers=headers)
+            return _responder(request, {"erro": str(e)}, 500, headers)
     
     # Rota não encontrada
-    return https_fn.Response(json.dumps({'error': 'Endpoint não encontrado'}), status=404, headers=headers)
+    return _responder(request, {'error': 'Endpoint não encontrado'}, 404, headers)
 
     """
     Wrapper para executar a função com o functions-framework local.
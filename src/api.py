@@ -1,19 +1,47 @@
 # -*- coding: utf-8 -*-
 import os
-from flask import Flask, request, jsonify
-from json import dumps
+from flask import Flask, request, Response
 import importlib.util
 import sys
 from src.services.megasena_service import (
     obter_resultado_via_scraping,
     obter_resultado_api,
     obter_estatisticas,
+    validar_janelas,
+    obter_estatisticas_janelas,
     executar_scraping,
     importar_concursos_megasena,
+    obter_status_importacao_megasena,
+    obter_cobertura_megasena,
+    sincronizar_concursos,
+    conferir_apostas_megasena,
+    executar_backtest_megasena,
+    parametros_busca,
+    buscar_concursos_megasena,
+    obter_coocorrencia_megasena,
+    obter_atrasos_megasena,
+    obter_perfis_megasena,
+    obter_tendencias_megasena,
+    obter_series_megasena,
+    obter_cidades_ganhadoras_megasena,
     obter_historico_megasena,
-    obter_ultimos_sorteios
+    decodificar_cursor,
+    validar_campos_historico,
+    parametros_historico,
+    obter_ultimos_sorteios,
+    obter_estado_upstream
 )
 from src.services.firebase_service import FirebaseService
+from src.services.response_encoding import codificar_resposta
+from src.services.snapshot_listener import iniciar_listener
+from src.services.http_cache import (
+    etag_antecipada,
+    etag_corresponde,
+    cabecalhos_cache,
+    cabecalhos_nao_modificado,
+    inteiro_ou_padrao,
+    numero_da_resposta
+)
 
 api = Flask(__name__)
 
@@ -21,9 +49,43 @@ api = Flask(__name__)
 firebase_available = FirebaseService.is_available()
 if firebase_available:
     print("Firebase inicializado com sucesso!")
+    # Listener opcional (FIRESTORE_LISTENER=true) que mantém o histórico em memória atualizado
+    iniciar_listener()
 else:
     print("Firebase não está disponível neste ambiente")
 
+def responder(dados, status=200, headers=None):
+    """Codifica a resposta conforme os cabeçalhos Accept e Accept-Encoding da requisição."""
+    corpo, headers_codificacao = codificar_resposta(
+        dados,
+        accept=request.headers.get('Accept'),
+        accept_encoding=request.headers.get('Accept-Encoding')
+    )
+    return Response(corpo, status=status, headers={**(headers or {}), **headers_codificacao})
+
+def nao_modificado(recurso, concurso=None, parametros=None):
+    """Responde 304 sem consultar o Firestore quando o cliente já possui a versão atual do recurso."""
+    etag = etag_antecipada(recurso, concurso, parametros)
+    if etag and etag_corresponde(request.headers.get('If-None-Match'), etag):
+        return Response(status=304, headers=cabecalhos_nao_modificado(etag, concurso, concurso is not None))
+    return None
+
+def responder_leitura(recurso, dados, concurso=None, parametros=None, registrar_ultimo=True):
+    """Responde um endpoint de leitura com os cabeçalhos de cache HTTP (ETag, Cache-Control)."""
+    headers = cabecalhos_cache(
+        recurso,
+        concurso if concurso is not None else numero_da_resposta(recurso, dados),
+        concurso_fixo=concurso is not None,
+        parametros=parametros,
+        data_sorteio=dados.get('data_sorteio') if recurso == 'concurso' and isinstance(dados, dict) else None,
+        dados=dados,
+        registrar_ultimo=registrar_ultimo
+    )
+    # Recursos que ainda podem mudar só são comparados depois de obtidos os dados (a ETag inclui o hash deles)
+    if headers and etag_corresponde(request.headers.get('If-None-Match'), headers['ETag']):
+        return Response(status=304, headers=headers)
+    return responder(dados, headers=headers)
+
 @api.route("/", methods=['GET'])
 def working():
     return 'Api working well'
@@ -31,7 +93,7 @@ def working():
 @api.route("/megasena", methods=['GET'])
 def getresult():
     res = obter_resultado_via_scraping()
-    return dumps(res, indent=2)
+    return responder(res)
 
 @api.route("/megasena/api", methods=['GET'])
 def get_megasena_api():
@@ -39,31 +101,55 @@ def get_megasena_api():
     try:
         # Verificar se foi informado um número de concurso
         concurso = request.args.get('concurso')
+        numero_fixo = inteiro_ou_padrao(concurso)
+        resposta_304 = nao_modificado('concurso', numero_fixo)
+        if resposta_304:
+            return resposta_304
+        
         resultado = obter_resultado_api(concurso)
-        return jsonify(resultado)
+        return responder_leitura('concurso', resultado, numero_fixo)
     except ValueError as ve:
-        return jsonify({"erro": str(ve)}), 400
+        return responder({"erro": str(ve)}, 400)
     except Exception as e:
-        return jsonify({"erro": str(e)}), 500
+        return responder({"erro": str(e)}, 500)
 
 @api.route("/megasena/estatisticas", methods=['GET'])
 def get_megasena_estatisticas():
     """Endpoint para obter estatísticas da Megasena."""
     try:
+        # Várias janelas de uma vez (ex.: janelas=10,50,100,500): uma resposta e uma entrada de cache
+        if request.args.get('janelas'):
+            janelas = validar_janelas(request.args.get('janelas'))
+            # Sem vírgulas, que separam as ETags no If-None-Match
+            parametros = {'janelas': '+'.join(str(janela) for janela in janelas)}
+            resposta_304 = nao_modificado('estatisticas_janelas', parametros=parametros)
+            if resposta_304:
+                return resposta_304
+            
+            estatisticas = obter_estatisticas_janelas(janelas)
+            return responder_leitura('estatisticas_janelas', estatisticas, parametros=parametros)
+        
         # Verificar se foi informado o número de concursos a analisar
         ultimos_n = request.args.get('ultimos', 10)
+        parametros = {'ultimos': inteiro_ou_padrao(ultimos_n, 10)}
+        resposta_304 = nao_modificado('estatisticas', parametros=parametros)
+        if resposta_304:
+            return resposta_304
+        
         estatisticas = obter_estatisticas(ultimos_n)
-        return jsonify(estatisticas)
+        return responder_leitura('estatisticas', estatisticas, parametros=parametros)
+    except ValueError as ve:
+        return responder({"erro": str(ve)}, 400)
     except Exception as e:
-        return jsonify({"erro": str(e)}), 500
+        return responder({"erro": str(e)}, 500)
 
 @api.route("/firebase-scraping", methods=['POST'])
 def firebase_scraping():
     """Endpoint para iniciar um scraping e salvar no Firebase."""
     if not firebase_available:
-        return jsonify({
+        return responder({
             'error': 'Firebase não está disponível neste ambiente'
-        }), 503
+        }, 503)
     
     try:
         # Obter parâmetros da requisição
@@ -72,55 +158,326 @@ def firebase_scraping():
         opcoes = data.get('opcoes')
         
         resultado = executar_scraping(url, opcoes)
-        return jsonify(resultado)
+        return responder(resultado)
     except Exception as e:
-        return jsonify({
+        return responder({
             'error': str(e)
-        }), 500
+        }, 500)
 
 @api.route("/megasena/importar", methods=['POST'])
 def importar_megasena():
     """Endpoint para importar vários concursos da Megasena e armazenar no Firebase."""
     if not firebase_available:
-        return jsonify({
+        return responder({
             'erro': 'Firebase não está disponível neste ambiente'
-        }), 503
+        }, 503)
     
     try:
         # Obter parâmetros da requisição
         data = request.get_json() if request.is_json else {}
         inicio = data.get('inicio', 2800)
         fim = data.get('fim')
+        tamanho_lote = data.get('tamanho_lote')
+        importacao_id = data.get('importacao_id')
+        chave_idempotencia = request.headers.get('Idempotency-Key') or data.get('chave_idempotencia')
+        
+        resultado = importar_concursos_megasena(inicio, fim, tamanho_lote, importacao_id, chave_idempotencia)
+        
+        return responder(resultado, 202)
+    except ValueError as ve:
+        return responder({'erro': str(ve)}, 400)
+    except Exception as e:
+        return responder({
+            'status': 'error',
+            'erro': str(e)
+        }, 500)
+
+@api.route("/megasena/importar/status", methods=['GET'])
+def status_importacao_megasena():
+    """Endpoint para acompanhar o progresso de uma importação em segundo plano."""
+    if not firebase_available:
+        return responder({
+            'erro': 'Firebase não está disponível neste ambiente'
+        }, 503)
+    
+    try:
+        resultado = obter_status_importacao_megasena(request.args.get('id'))
+        if resultado is None:
+            return responder({'erro': 'Importação não encontrada'}, 404)
+        return responder(resultado)
+    except ValueError as ve:
+        return responder({'erro': str(ve)}, 400)
+    except Exception as e:
+        return responder({
+            'status': 'error',
+            'erro': str(e)
+        }, 500)
+
+@api.route("/megasena/cobertura", methods=['GET'])
+def cobertura_megasena():
+    """Endpoint para consultar quantos concursos estão salvos em relação ao último concurso."""
+    if not firebase_available:
+        return responder({
+            'erro': 'Firebase não está disponível neste ambiente'
+        }, 503)
+    
+    try:
+        return responder(obter_cobertura_megasena())
+    except Exception as e:
+        return responder({
+            'status': 'error',
+            'erro': str(e)
+        }, 500)
+
+@api.route("/megasena/sincronizar", methods=['GET'])
+def sincronizar_megasena():
+    """Endpoint para réplicas obterem os concursos alterados desde a última sincronização."""
+    if not firebase_available:
+        return responder({
+            'erro': 'Firebase não está disponível neste ambiente'
+        }, 503)
+    
+    try:
+        limite = inteiro_ou_padrao(request.args.get('limite'), None)
+        return responder(sincronizar_concursos(request.args.get('desde', 0), limite))
+    except ValueError as ve:
+        return responder({'erro': str(ve)}, 400)
+    except Exception as e:
+        return responder({
+            'status': 'error',
+            'erro': str(e)
+        }, 500)
+
+@api.route("/megasena/conferir", methods=['POST'])
+def conferir_megasena():
+    """
+    Endpoint para conferir apostas em massa. Aceita JSON ({"apostas": [[...], ...]}) ou um
+    upload de texto com uma aposta por linha, lido em streaming.
+    """
+    try:
+        if request.is_json:
+            dados = request.get_json(silent=True) or {}
+            apostas = dados.get('apostas') or []
+        else:
+            dados = {}
+            apostas = request.stream
+        
+        resultado = conferir_apostas_megasena(
+            apostas,
+            concurso=inteiro_ou_padrao(dados.get('concurso', request.args.get('concurso'))),
+            inicio=inteiro_ou_padrao(dados.get('inicio', request.args.get('inicio'))),
+            fim=inteiro_ou_padrao(dados.get('fim', request.args.get('fim'))),
+            max_premiadas=inteiro_ou_padrao(dados.get('max_premiadas', request.args.get('max_premiadas')))
+        )
+        return responder(resultado)
+    except ValueError as ve:
+        return responder({'erro': str(ve)}, 400)
+    except Exception as e:
+        return responder({
+            'status': 'error',
+            'erro': str(e)
+        }, 500)
+
+@api.route("/megasena/backtest", methods=['POST'])
+def backtest_megasena():
+    """Endpoint para avaliar um conjunto de apostas contra todo o histórico de concursos."""
+    try:
+        dados = request.get_json(silent=True) or {}
+        resultado = executar_backtest_megasena(
+            dados.get('apostas'),
+            inicio=inteiro_ou_padrao(dados.get('inicio', request.args.get('inicio'))),
+            fim=inteiro_ou_padrao(dados.get('fim', request.args.get('fim')))
+        )
+        return responder(resultado)
+    except ValueError as ve:
+        return responder({'erro': str(ve)}, 400)
+    except Exception as e:
+        return responder({
+            'status': 'error',
+            'erro': str(e)
+        }, 500)
+
+@api.route("/megasena/buscar", methods=['GET'])
+def buscar_megasena():
+    """Endpoint para buscar os concursos que contêm uma combinação de dezenas."""
+    try:
+        parametros = parametros_busca(
+            request.args.get('dezenas', ''),
+            inteiro_ou_padrao(request.args.get('minimo')),
+            inteiro_ou_padrao(request.args.get('limite'))
+        )
+        resposta_304 = nao_modificado('buscar', parametros=parametros)
+        if resposta_304:
+            return resposta_304
+        
+        resultado = buscar_concursos_megasena(parametros['dezenas'], parametros['minimo'], parametros['limite'])
+        return responder_leitura('buscar', resultado, parametros=parametros)
+    except ValueError as ve:
+        return responder({'erro': str(ve)}, 400)
+    except Exception as e:
+        return responder({
+            'status': 'error',
+            'erro': str(e)
+        }, 500)
+
+@api.route("/megasena/coocorrencia", methods=['GET'])
+def coocorrencia_megasena():
+    """Endpoint para obter os pares ou trios de dezenas mais e menos frequentes."""
+    try:
+        parametros = {
+            campo: inteiro_ou_padrao(request.args.get(campo))
+            for campo in ('tamanho', 'ultimos', 'inicio', 'fim', 'top')
+        }
+        resposta_304 = nao_modificado('coocorrencia', parametros=parametros)
+        if resposta_304:
+            return resposta_304
+        
+        resultado = obter_coocorrencia_megasena(**parametros)
+        return responder_leitura('coocorrencia', resultado, parametros=parametros)
+    except ValueError as ve:
+        return responder({'erro': str(ve)}, 400)
+    except Exception as e:
+        return responder({
+            'status': 'error',
+            'erro': str(e)
+        }, 500)
+
+@api.route("/megasena/atrasos", methods=['GET'])
+def atrasos_megasena():
+    """Endpoint para obter o atraso atual e o maior atraso de cada dezena."""
+    try:
+        parametros = {'ordenar': request.args.get('ordenar')}
+        resposta_304 = nao_modificado('atrasos', parametros=parametros)
+        if resposta_304:
+            return resposta_304
         
-        resultado = importar_concursos_megasena(inicio, fim)
+        resultado = obter_atrasos_megasena(**parametros)
+        return responder_leitura('atrasos', resultado, parametros=parametros)
+    except ValueError as ve:
+        return responder({'erro': str(ve)}, 400)
+    except Exception as e:
+        return responder({
+            'status': 'error',
+            'erro': str(e)
+        }, 500)
+
+@api.route("/megasena/estatisticas/perfis", methods=['GET'])
+def perfis_megasena():
+    """Endpoint para obter a distribuição de pares/ímpares, somas, décadas e quadrantes dos sorteios."""
+    try:
+        parametros = {
+            campo: inteiro_ou_padrao(request.args.get(campo))
+            for campo in ('ultimos', 'inicio', 'fim')
+        }
+        resposta_304 = nao_modificado('perfis', parametros=parametros)
+        if resposta_304:
+            return resposta_304
         
-        return jsonify(resultado)
+        resultado = obter_perfis_megasena(**parametros)
+        return responder_leitura('perfis', resultado, parametros=parametros)
     except ValueError as ve:
-        return jsonify({'erro': str(ve)}), 400
+        return responder({'erro': str(ve)}, 400)
     except Exception as e:
-        return jsonify({
+        return responder({
             'status': 'error',
             'erro': str(e)
-        }), 500
+        }, 500)
+
+@api.route("/megasena/estatisticas/tendencias", methods=['GET'])
+def tendencias_megasena():
+    """Endpoint para obter a frequência móvel de cada dezena ao longo do histórico."""
+    try:
+        parametros = {
+            campo: inteiro_ou_padrao(request.args.get(campo))
+            for campo in ('janela', 'pontos')
+        }
+        resposta_304 = nao_modificado('tendencias', parametros=parametros)
+        if resposta_304:
+            return resposta_304
+        
+        resultado = obter_tendencias_megasena(**parametros)
+        return responder_leitura('tendencias', resultado, parametros=parametros)
+    except ValueError as ve:
+        return responder({'erro': str(ve)}, 400)
+    except Exception as e:
+        return responder({
+            'status': 'error',
+            'erro': str(e)
+        }, 500)
+
+@api.route("/megasena/series", methods=['GET'])
+def series_megasena():
+    """Endpoint para obter séries de arrecadação, estimativas e prêmios, com agregados por mês ou ano."""
+    try:
+        parametros = {
+            'campo': request.args.get('campo'),
+            'agrupar': request.args.get('agrupar'),
+            **{campo: inteiro_ou_padrao(request.args.get(campo)) for campo in ('pontos', 'ultimos', 'inicio', 'fim')}
+        }
+        resposta_304 = nao_modificado('series', parametros=parametros)
+        if resposta_304:
+            return resposta_304
+        
+        resultado = obter_series_megasena(**parametros)
+        return responder_leitura('series', resultado, parametros=parametros)
+    except ValueError as ve:
+        return responder({'erro': str(ve)}, 400)
+    except Exception as e:
+        return responder({
+            'status': 'error',
+            'erro': str(e)
+        }, 500)
+
+@api.route("/megasena/cidades", methods=['GET'])
+def cidades_ganhadoras_megasena():
+    """Endpoint para obter as UFs e cidades com mais ganhadores da sena."""
+    try:
+        parametros = {
+            'uf': request.args.get('uf'),
+            'busca': request.args.get('busca'),
+            'top': inteiro_ou_padrao(request.args.get('top'))
+        }
+        resposta_304 = nao_modificado('cidades', parametros=parametros)
+        if resposta_304:
+            return resposta_304
+        
+        resultado = obter_cidades_ganhadoras_megasena(**parametros)
+        return responder_leitura('cidades', resultado, parametros=parametros)
+    except ValueError as ve:
+        return responder({'erro': str(ve)}, 400)
+    except Exception as e:
+        return responder({
+            'status': 'error',
+            'erro': str(e)
+        }, 500)
 
 @api.route("/megasena/historico", methods=['GET'])
 def historico_megasena():
     """Endpoint para obter o histórico de resultados da Megasena salvos no Firebase."""
     if not firebase_available:
-        return jsonify({
+        return responder({
             'erro': 'Firebase não está disponível neste ambiente'
-        }), 503
+        }, 503)
     
     try:
-        # Obter parâmetros
-        limite = request.args.get('limite', 10)
-        resultados = obter_historico_megasena(limite)
-        return jsonify(resultados)
+        # Obter parâmetros (limite é aceito como sinônimo de page_size)
+        page_size = inteiro_ou_padrao(request.args.get('page_size', request.args.get('limite')), 10)
+        cursor = request.args.get('cursor')
+        antes_de = decodificar_cursor(cursor)
+        campos = validar_campos_historico(request.args.get('fields'))
+        parametros = parametros_historico(page_size, campos)
+        
+        # Mesmo após um cursor, a página muda quando concursos anteriores são importados ou
+        # reparados: a ETag inclui o hash do conteúdo e o 304 só é decidido depois da leitura
+        resultados = obter_historico_megasena(page_size, cursor, campos)
+        return responder_leitura('historico', resultados, parametros=parametros, registrar_ultimo=antes_de is None)
+    except ValueError as ve:
+        return responder({'erro': str(ve)}, 400)
     except Exception as e:
-        return jsonify({
+        return responder({
             'status': 'error',
             'erro': str(e)
-        }), 500
+        }, 500)
 
 @api.route("/megasena/ultimos_sorteios", methods=['GET'])
 def get_megasena_ultimos_sorteios():
@@ -128,10 +485,23 @@ def get_megasena_ultimos_sorteios():
     try:
         # Verificar se foi informado o número de concursos a analisar
         ultimos_n = request.args.get('ultimos', 10)
+        parametros = {'ultimos': inteiro_ou_padrao(ultimos_n, 10)}
+        resposta_304 = nao_modificado('ultimos_sorteios', parametros=parametros)
+        if resposta_304:
+            return resposta_304
+        
         resultado = obter_ultimos_sorteios(ultimos_n)
-        return jsonify(resultado)
+        return responder_leitura('ultimos_sorteios', resultado, parametros=parametros)
+    except Exception as e:
+        return responder({"erro": str(e)}, 500)
+
+@api.route("/megasena/upstream", methods=['GET'])
+def get_megasena_upstream():
+    """Endpoint para obter o estado do circuit breaker e as latências da API da Caixa."""
+    try:
+        return responder(obter_estado_upstream())
     except Exception as e:
-        return jsonify({"erro": str(e)}), 500
+        return responder({"erro": str(e)}, 500)
 
 if (__name__ == '__main__'):
     port = os.environ.get("PORT", 5000) #Heroku will set the PORT environment variable for web traffic
@@ -5,7 +5,6 @@ Classe para gerenciar operações de scraping e armazenamento no Firebase
 """
 
 import os
-import time
 import uuid
 from datetime import datetime
 import firebase_admin
@@ -153,9 +152,6 @@ class FirebaseScraper:
                         'doc_id': doc_id,
                         'sucesso': True
                     })
-                    
-                    # Aguardar um pouco para não sobrecarregar a API
-                    time.sleep(0.5)
                 except Exception as e:
                     resultados.append({
                         'concurso': num_concurso,
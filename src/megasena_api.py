@@ -1,8 +1,16 @@
+import os
 import requests
+import hashlib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import Dict, List, Optional, Any, Union
+from typing import Dict, Iterable, Iterator, List, Optional, Any, Tuple, Union
 import json
-from src.services.firebase_service import FirebaseService
+from src.services.firebase_service import FirebaseService, FAIXAS_PREMIACAO
+from src.services import historico_store
+from src.services.circuit_breaker import CircuitBreaker, CircuitoAbertoError
+from src.services.rate_limiter import TokenBucket
 
 class MegasenaAPI:
     """
@@ -23,63 +31,124 @@ class MegasenaAPI:
         self.headers = {
             "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
         }
+        # Sessão reutilizada para manter a conexão com o servidor da Caixa aberta
+        self.session = requests.Session()
+        # Validadores da última resposta processada de cada URL (ETag, Last-Modified, hash do
+        # conteúdo); apenas a URL do último concurso guarda também os dados (_registrar_validadores)
+        self._url_ultimo = f"{self.base_url}/"
+        self._validadores = {}
+        self._lock_validadores = threading.Lock()
+        # Timeout (conexão, leitura) das requisições à API da Caixa
+        self.timeout = (
+            float(os.environ.get('CAIXA_CONNECT_TIMEOUT', 3)),
+            float(os.environ.get('CAIXA_READ_TIMEOUT', 10))
+        )
+        # Circuit breaker para falhar rápido quando a API da Caixa estiver instável
+        self.circuit_breaker = CircuitBreaker(
+            'api_caixa',
+            limite_falhas=int(os.environ.get('CAIXA_BREAKER_FALHAS', 5)),
+            tempo_abertura=float(os.environ.get('CAIXA_BREAKER_ABERTURA', 30))
+        )
+        self._revalidacao_em_andamento = False
+        self._lock_revalidacao = threading.Lock()
+        # Limitador de taxa compartilhado por todas as chamadas (importações, scheduler, requisições)
+        self.limitador = TokenBucket.a_partir_do_ambiente('CAIXA', taxa_padrao=4, capacidade_padrao=8)
     
-    def _buscar_concurso_no_firestore(self, numero_concurso: Optional[int]) -> Optional[Dict[str, Any]]:
+    def _requisitar_api(self, url: str) -> Tuple[Dict[str, Any], Optional[Dict[str, Any]]]:
         """
-        Tenta buscar os dados do concurso no Firestore.
+        Faz uma requisição condicional à API da Caixa.
+        
+        Envia If-None-Match/If-Modified-Since com os validadores da última resposta processada
+        da URL, quando os dados dela estão guardados. Uma resposta 304, ou um corpo com o mesmo
+        hash do anterior, indica que os dados não mudaram.
+        
+        Os validadores novos não são guardados aqui: quem processa os dados os registra com
+        _registrar_validadores depois de processá-los com sucesso.
         
         Args:
-            numero_concurso: Número do concurso a ser buscado.
+            url: URL a ser consultada
             
         Returns:
-            Dicionário com os dados do concurso ou None se não encontrar.
-        """
-        if not FirebaseService.is_available():
-            return None
+            Tupla (dados, validadores), onde validadores é None se os dados são os mesmos da
+            última resposta processada
             
+        Raises:
+            CircuitoAbertoError: Se o circuito da API da Caixa estiver aberto
+            requests.RequestException: Se houver erro na requisição
+        """
+        with self._lock_validadores:
+            anterior = self._validadores.get(url)
+        
+        headers = dict(self.headers)
+        # Sem os dados guardados, uma resposta 304 não teria o que devolver
+        if anterior and anterior.get('dados') is not None:
+            if anterior.get('etag'):
+                headers['If-None-Match'] = anterior['etag']
+            if anterior.get('last_modified'):
+                headers['If-Modified-Since'] = anterior['last_modified']
+        
+        # Falhar imediatamente se o circuito estiver aberto
+        self.circuit_breaker.verificar()
+        
+        # Respeitar o limite de requisições à API da Caixa
+        self.limitador.adquirir()
+        
+        inicio = time.monotonic()
         try:
-            # Se não foi especificado um concurso, vamos buscar o último
-            if numero_concurso is None:
-                # Buscar o histórico de concursos ordenados por data de sorteio decrescente
-                resultados = FirebaseService.buscar_historico_concursos_ordenado(limite=1)
-                if resultados and len(resultados) > 0:
-                    # O primeiro resultado deve ser o concurso mais recente
-                    resultado = resultados[0]
-                    if 'conteudo' in resultado and isinstance(resultado['conteudo'], dict):
-                        numero_concurso_encontrado = resultado['conteudo'].get('concurso')
-                        print(f"Concurso mais recente (número {numero_concurso_encontrado}) obtido do Firestore ordenado por data")
-                        return resultado['conteudo']
-            else:
-                # Buscar um concurso específico com filtro direto na consulta
-                # Usar o método buscar_concurso_por_numero do FirebaseService
-                resultado = self._buscar_concurso_por_numero(numero_concurso)
-                if resultado and 'conteudo' in resultado:
-                    print(f"Concurso {numero_concurso} obtido do Firestore com filtro direto")
-                    return resultado['conteudo']
-        except Exception as e:
-            print(f"Erro ao buscar concurso no Firestore: {str(e)}")
-            
-        return None
+            response = self.session.get(url, headers=headers, timeout=self.timeout)
+        except requests.RequestException:
+            self.circuit_breaker.registrar_falha(time.monotonic() - inicio)
+            raise
+        
+        # Apenas erros do servidor indicam instabilidade; 4xx (ex.: concurso inexistente) não abrem o circuito
+        if response.status_code >= 500:
+            self.circuit_breaker.registrar_falha(time.monotonic() - inicio)
+        else:
+            self.circuit_breaker.registrar_sucesso(time.monotonic() - inicio)
+        
+        if response.status_code == 304 and anterior and anterior.get('dados') is not None:
+            return anterior['dados'], None
+        
+        response.raise_for_status()  # Levanta exceção para status de erro
+        
+        hash_conteudo = hashlib.sha256(response.content).hexdigest()
+        if anterior and anterior.get('hash') == hash_conteudo:
+            return (anterior['dados'] if anterior.get('dados') is not None else response.json()), None
+        
+        dados = response.json()
+        return dados, {
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+            'hash': hash_conteudo,
+            'dados': dados
+        }
     
-    def _deve_salvar_concurso(self, numero_concurso: Optional[int]) -> bool:
+    def _registrar_validadores(self, url: str, validadores: Dict[str, Any], processado: bool = True) -> None:
         """
-        Verifica se o concurso deve ser salvo no Firebase.
-        Retorna False se o concurso já existe, True caso contrário.
+        Registra os validadores de uma resposta da API da Caixa.
+        
+        Apenas a URL do último concurso guarda os dados completos, servidos enquanto a API está
+        indisponível; as demais guardam só o hash do conteúdo. Quando o processamento falhou,
+        os validadores são descartados, para que a próxima consulta trate os dados como novos.
         
         Args:
-            numero_concurso: Número do concurso a verificar
-            
-        Returns:
-            bool: True se deve salvar, False se já existe
+            url: URL consultada
+            validadores: Validadores retornados por _requisitar_api
+            processado: False se os dados não puderam ser processados (ex.: erro ao salvar)
         """
-        if numero_concurso is None:
-            return True
-            
-        return not FirebaseService.concurso_ja_existe(numero_concurso)
-        
-    def _buscar_concurso_por_numero(self, numero_concurso: int) -> Optional[Dict[str, Any]]:
+        if url == self._url_ultimo:
+            registro = validadores if processado else {'dados': validadores['dados']}
+        else:
+            registro = {'hash': validadores['hash']} if processado else None
+        with self._lock_validadores:
+            if registro is None:
+                self._validadores.pop(url, None)
+            else:
+                self._validadores[url] = registro
+    
+    def _buscar_concurso_no_firestore(self, numero_concurso: Optional[int]) -> Optional[Dict[str, Any]]:
         """
-        Busca um concurso específico no Firestore usando filtro na consulta.
+        Tenta buscar os dados do concurso na coleção concursos do Firestore.
         
         Args:
             numero_concurso: Número do concurso a ser buscado.
@@ -91,47 +160,26 @@ class MegasenaAPI:
             return None
             
         try:
-            # Verificar se o firebase_scraper está disponível
-            firebase_scraper = FirebaseService.get_instance()
-            if not firebase_scraper or not hasattr(firebase_scraper, 'db'):
-                return None
-                
-            # Usar a nova sintaxe recomendada para evitar o warning
-            from google.cloud.firestore_v1.base_query import FieldFilter
-            
-            # Tentar buscar com filtro no conteudo.concurso
-            query1 = (firebase_scraper.db.collection('scraping_results')
-                     .where(filter=FieldFilter('conteudo.concurso', '==', numero_concurso))
-                     .limit(1))
-            
-            docs1 = query1.get()
-            for doc in docs1:
-                data = doc.to_dict()
-                return {
-                    'id': doc.id,
-                    'conteudo': data.get('conteudo', {}),
-                    'metadados': data.get('metadados', {})
-                }
-            
-            # Se não encontrou, tentar buscar com filtro nos metadados
-            query2 = (firebase_scraper.db.collection('scraping_results')
-                     .where(filter=FieldFilter('metadados.concurso', '==', numero_concurso))
-                     .limit(1))
-            
-            docs2 = query2.get()
-            for doc in docs2:
-                data = doc.to_dict()
-                return {
-                    'id': doc.id,
-                    'conteudo': data.get('conteudo', {}),
-                    'metadados': data.get('metadados', {})
-                }
-                
-            # Se não encontrou em nenhum dos dois, retornar None
-            return None
+            # Se não foi especificado um concurso, vamos buscar o último
+            if numero_concurso is None:
+                # Com o listener do Firestore ativo, o último concurso já está em memória
+                ultimo = historico_store.ultimo_concurso()
+                if ultimo:
+                    return ultimo
+                resultados = FirebaseService.buscar_ultimos_concursos(limite=1)
+                if resultados:
+                    print(f"Concurso mais recente (número {resultados[0].get('concurso')}) obtido do Firestore")
+                    return resultados[0]
+            else:
+                # O ID do documento é o número do concurso: leitura direta
+                resultado = FirebaseService.buscar_concurso(numero_concurso)
+                if resultado:
+                    print(f"Concurso {numero_concurso} obtido do Firestore")
+                    return resultado
         except Exception as e:
-            print(f"Erro ao buscar concurso {numero_concurso} com filtro: {str(e)}")
-            return None
+            print(f"Erro ao buscar concurso no Firestore: {str(e)}")
+            
+        return None
     
     def _obter_concurso_da_api(self, numero_concurso: Optional[int] = None) -> Dict[str, Any]:
         """
@@ -151,38 +199,115 @@ class MegasenaAPI:
             concurso_param = str(numero_concurso) if numero_concurso is not None else ""
             url = f"{self.base_url}/{concurso_param}"
             
-            response = requests.get(url, headers=self.headers, timeout=10)
-            response.raise_for_status()  # Levanta exceção para status de erro
+            dados, validadores = self._requisitar_api(url)
             
-            dados = response.json()
+            # Se nada mudou desde a última consulta, o concurso já foi processado
+            if validadores is None:
+                print(f"Concurso {dados.get('numero')} inalterado na API da Caixa, nada a processar")
+                return dados
             
-            # Salvar no Firestore se disponível e se o concurso ainda não existe
+            # Salvar no Firestore se disponível (o documento do concurso é sobrescrito, sem duplicar).
+            # A resposta só é marcada como processada depois de salva, senão a próxima consulta tenta de novo
+            processado = True
             if FirebaseService.is_available():
                 try:
                     numero_do_concurso = dados.get('numero')
-                    if self._deve_salvar_concurso(numero_do_concurso):
-                        conteudo_formatado = self.formatar_resultado(dados)
-                        FirebaseService.salvar_resultado(
-                            url=f"megasena/concursos/{numero_concurso if numero_concurso else 'ultimo'}",
-                            conteudo=conteudo_formatado,
+                    if numero_do_concurso:
+                        FirebaseService.salvar_concurso(
+                            self.formatar_resultado(dados),
                             metadados={
                                 'fonte': 'api_caixa',
-                                'concurso': numero_do_concurso,
                                 'data_obtencao': datetime.now().isoformat()
                             }
                         )
                         print(f"Concurso {numero_do_concurso} salvo no Firestore")
-                    else:
-                        print(f"Concurso {numero_do_concurso} já existe no Firestore, não salvando novamente")
                 except Exception as e:
+                    processado = False
                     print(f"Erro ao salvar concurso no Firestore: {str(e)}")
             
+            self._registrar_validadores(url, validadores, processado)
+            
             return dados
-        except requests.RequestException as e:
+        except (requests.RequestException, CircuitoAbertoError) as e:
+            # Para o último concurso, servir o último valor conhecido enquanto revalida em segundo plano
+            if numero_concurso is None:
+                ultimo_conhecido = self._ultimo_concurso_conhecido()
+                if ultimo_conhecido is not None:
+                    print(f"API da Caixa indisponível ({str(e)}), servindo último concurso conhecido")
+                    self._revalidar_ultimo_em_segundo_plano()
+                    return ultimo_conhecido
             raise Exception(f"Erro ao obter dados do concurso: {str(e)}")
         except json.JSONDecodeError:
             raise Exception("Erro ao processar resposta da API (formato JSON inválido)")
     
+    def _ultimo_concurso_conhecido(self) -> Optional[Dict[str, Any]]:
+        """Retorna os dados da última resposta bem-sucedida para o último concurso, se houver."""
+        with self._lock_validadores:
+            anterior = self._validadores.get(self._url_ultimo)
+        return anterior.get('dados') if anterior else None
+    
+    def _revalidar_ultimo_em_segundo_plano(self) -> None:
+        """
+        Agenda, em uma thread, uma nova consulta do último concurso assim que o circuito
+        permitir uma chamada de teste. Apenas uma revalidação fica em andamento por vez.
+        """
+        with self._lock_revalidacao:
+            if self._revalidacao_em_andamento:
+                return
+            self._revalidacao_em_andamento = True
+        
+        def _revalidar():
+            try:
+                espera = self.circuit_breaker.segundos_para_teste()
+                while espera > 0:
+                    time.sleep(espera)
+                    espera = self.circuit_breaker.segundos_para_teste()
+                self._obter_concurso_da_api()
+            except Exception as e:
+                print(f"Erro ao revalidar último concurso em segundo plano: {str(e)}")
+            finally:
+                with self._lock_revalidacao:
+                    self._revalidacao_em_andamento = False
+        
+        threading.Thread(target=_revalidar, name='revalidar_ultimo_concurso', daemon=True).start()
+    
+    def obter_estado_upstream(self) -> Dict[str, Any]:
+        """
+        Retorna o estado do circuit breaker e os percentis de latência da API da Caixa.
+        
+        Returns:
+            Dicionário com estado do circuito, contadores e latências (p50, p90, p99)
+        """
+        estado = self.circuit_breaker.obter_estado()
+        estado['url'] = self.base_url
+        estado['timeout'] = {'conexao': self.timeout[0], 'leitura': self.timeout[1]}
+        estado['ultimo_concurso_em_cache'] = (self._ultimo_concurso_conhecido() or {}).get('numero')
+        return estado
+    
+    def obter_concursos_em_lote(self, numeros: Iterable[int], max_paralelo: Optional[int] = None) -> Iterator[Tuple[int, Optional[Dict[str, Any]], Optional[str]]]:
+        """
+        Baixa vários concursos da API da Caixa em paralelo, sem consultar nem gravar no Firestore.
+        As chamadas passam pelo mesmo limitador de taxa e circuit breaker das demais.
+        
+        Args:
+            numeros: Números dos concursos a baixar
+            max_paralelo: Número máximo de requisições simultâneas (padrão: CAIXA_DOWNLOAD_PARALELO ou 4)
+            
+        Returns:
+            Iterador de tuplas (numero, dados brutos ou None, mensagem de erro ou None), na ordem informada
+        """
+        max_paralelo = max_paralelo or int(os.environ.get('CAIXA_DOWNLOAD_PARALELO', 4))
+        
+        def _baixar(numero):
+            try:
+                dados, _ = self._requisitar_api(f"{self.base_url}/{numero}")
+                return numero, dados, None
+            except Exception as e:
+                return numero, None, str(e)
+        
+        with ThreadPoolExecutor(max_workers=max_paralelo) as executor:
+            yield from executor.map(_baixar, numeros)
+    
     def obter_concurso(self, numero_concurso: Optional[int] = None) -> Dict[str, Any]:
         """
         Obtém os dados de um concurso específico ou do último concurso.
@@ -407,113 +532,30 @@ class MegasenaAPI:
                     
                     # Se encontrou resultado
                     if resultado and 'conteudo' in resultado:
-                        print(f"Estatísticas encontradas no Firestore para os últimos {ultimos_n_concursos} concursos e concurso {numero_ultimo}")
-                        
-                        # Converter para o formato esperado pela aplicação
-                        estatisticas_salvas = resultado['conteudo']
-                        
-                        # Verificar se tem o formato esperado
-                        if (isinstance(estatisticas_salvas, dict) and 
-                            'periodo' in estatisticas_salvas and 
-                            'dezenas_mais_sorteadas' in estatisticas_salvas and
-                            'dezenas_menos_sorteadas' in estatisticas_salvas):
-                            
-                            # Converter dezenas para o formato [(dezena, frequencia), ...]
-                            dezenas_mais = []
-                            for item in estatisticas_salvas.get('dezenas_mais_sorteadas', []):
-                                if isinstance(item, dict) and 'dezena' in item and 'frequencia' in item:
-                                    dezenas_mais.append((item['dezena'], item['frequencia']))
-                                
-                            dezenas_menos = []
-                            for item in estatisticas_salvas.get('dezenas_menos_sorteadas', []):
-                                if isinstance(item, dict) and 'dezena' in item and 'frequencia' in item:
-                                    dezenas_menos.append((item['dezena'], item['frequencia']))
-                            
-                            # Montar estatísticas no formato esperado
-                            return {
-                                "concursos_analisados": estatisticas_salvas.get('total_concursos', 0),
-                                "periodo": estatisticas_salvas.get('periodo', {}),
-                                "dezenas_mais_sorteadas": dezenas_mais,
-                                "dezenas_menos_sorteadas": dezenas_menos,
-                                "total_ganhadores": estatisticas_salvas.get('total_ganhadores', {})
-                            }
+                        estatisticas = self._estatisticas_do_conteudo(resultado['conteudo'])
+                        if estatisticas is not None:
+                            print(f"Estatísticas encontradas no Firestore para os últimos {ultimos_n_concursos} concursos e concurso {numero_ultimo}")
+                            return estatisticas
                 except Exception as e:
                     print(f"Erro ao buscar estatísticas no Firestore: {str(e)}")
             
             # Se não encontrou no Firestore ou ocorreu erro, calcular novamente
             print(f"Calculando estatísticas para os últimos {ultimos_n_concursos} concursos")
-            
-            # Calculamos o número do primeiro concurso a analisar
-            primeiro_concurso = max(1, numero_ultimo - ultimos_n_concursos + 1)
-            
-            # Inicializamos contadores
-            frequencia_dezenas = {str(i).zfill(2): 0 for i in range(1, 61)}
-            total_ganhadores = {
-                "6 acertos": 0,
-                "5 acertos": 0,
-                "4 acertos": 0
-            }
-            
-            # Coletamos dados dos concursos
-            concursos_analisados = []
-            for num_concurso in range(primeiro_concurso, numero_ultimo + 1):
-                try:
-                    # Usar a função obter_concurso, que agora tenta primeiro no Firestore
-                    dados = self.obter_concurso(num_concurso)
-                    concursos_analisados.append(num_concurso)
-                    
-                    # Contabiliza frequência das dezenas
-                    for dezena in dados.get("listaDezenas", []):
-                        if dezena in frequencia_dezenas:
-                            frequencia_dezenas[dezena] += 1
-                    
-                    # Contabiliza ganhadores
-                    for faixa in dados.get("listaRateioPremio", []):
-                        descricao = faixa.get("descricaoFaixa", "")
-                        if descricao in total_ganhadores:
-                            total_ganhadores[descricao] += faixa.get("numeroDeGanhadores", 0)
-                except Exception as e:
-                    print(f"Erro ao obter concurso {num_concurso}: {str(e)}")
-                    # Se houver erro em um concurso específico, continuamos para o próximo
-                    continue
-            
-            # Ordenamos as dezenas por frequência (decrescente)
-            dezenas_mais_sorteadas = sorted(
-                [(dezena, freq) for dezena, freq in frequencia_dezenas.items()],
-                key=lambda x: x[1],
-                reverse=True
-            )
-            
-            # Montamos as estatísticas
-            estatisticas = {
-                "concursos_analisados": len(concursos_analisados),
-                "periodo": {
-                    "primeiro_concurso": min(concursos_analisados) if concursos_analisados else None,
-                    "ultimo_concurso": max(concursos_analisados) if concursos_analisados else None
-                },
-                "dezenas_mais_sorteadas": dezenas_mais_sorteadas[:10],
-                "dezenas_menos_sorteadas": dezenas_mais_sorteadas[-10:],
-                "total_ganhadores": total_ganhadores
-            }
+            estatisticas = self._calcular_estatisticas(numero_ultimo, [ultimos_n_concursos])[ultimos_n_concursos]
             
             # Salvar estatísticas no Firestore, se disponível
             if FirebaseService.is_available():
                 try:
                     FirebaseService.salvar_resultado(
                         url="megasena_estatisticas",
-                        conteudo={
-                            "periodo": estatisticas["periodo"],
-                            "total_concursos": estatisticas["concursos_analisados"],
-                            "dezenas_mais_sorteadas": [{"dezena": d[0], "frequencia": d[1]} for d in estatisticas["dezenas_mais_sorteadas"]],
-                            "dezenas_menos_sorteadas": [{"dezena": d[0], "frequencia": d[1]} for d in estatisticas["dezenas_menos_sorteadas"]],
-                            "total_ganhadores": estatisticas["total_ganhadores"]
-                        },
+                        conteudo=self._conteudo_das_estatisticas(estatisticas),
                         metadados={
                             'fonte': 'analise_interna', 
                             'ultimos_concursos': ultimos_n_concursos,
                             'ultimo_concurso': numero_ultimo,
                             'data_analise': datetime.now().isoformat()
-                        }
+                        },
+                        chave_idempotencia=f"megasena-estatisticas-{numero_ultimo}-{ultimos_n_concursos}"
                     )
                     print(f"Estatísticas salvas no Firestore")
                 except Exception as e:
@@ -522,6 +564,206 @@ class MegasenaAPI:
             return estatisticas
         except Exception as e:
             raise Exception(f"Erro ao calcular estatísticas: {str(e)}")
+    
+    def obter_estatisticas_janelas(self, janelas: Iterable[int]) -> Dict[str, Any]:
+        """
+        Obtém as estatísticas de várias janelas (ex.: últimos 10, 50, 100 e 500 concursos)
+        em uma única passada sobre os concursos da maior janela.
+        
+        Args:
+            janelas: Quantidades de concursos de cada janela
+            
+        Returns:
+            Dicionário com o último concurso e as estatísticas de cada janela, em ordem crescente
+        """
+        janelas = sorted({int(janela) for janela in janelas})
+        if not janelas or janelas[0] <= 0:
+            raise ValueError("Informe ao menos uma janela com número positivo de concursos")
+        
+        try:
+            # O último concurso é consultado uma única vez para todas as janelas
+            numero_ultimo = self.obter_concurso().get("numero", 0)
+            
+            # Uma única entrada no Firestore para o conjunto de janelas
+            if FirebaseService.is_available():
+                try:
+                    resultado = FirebaseService.buscar_estatisticas_megasena(
+                        url="megasena_estatisticas_janelas",
+                        ultimo_concurso=numero_ultimo,
+                        ultimos_n_concursos=janelas
+                    )
+                    if resultado and 'conteudo' in resultado:
+                        salvas = {
+                            item.get('ultimos'): self._estatisticas_do_conteudo(item)
+                            for item in resultado['conteudo'].get('janelas', []) if isinstance(item, dict)
+                        }
+                        if all(salvas.get(janela) is not None for janela in janelas):
+                            print(f"Estatísticas das janelas {janelas} encontradas no Firestore para o concurso {numero_ultimo}")
+                            return self._resposta_janelas(numero_ultimo, janelas, salvas)
+                except Exception as e:
+                    print(f"Erro ao buscar estatísticas no Firestore: {str(e)}")
+            
+            print(f"Calculando estatísticas para as janelas {janelas}")
+            estatisticas = self._calcular_estatisticas(numero_ultimo, janelas)
+            
+            if FirebaseService.is_available():
+                try:
+                    FirebaseService.salvar_resultado(
+                        url="megasena_estatisticas_janelas",
+                        conteudo={'janelas': [
+                            {'ultimos': janela, **self._conteudo_das_estatisticas(estatisticas[janela])}
+                            for janela in janelas
+                        ]},
+                        metadados={
+                            'fonte': 'analise_interna',
+                            'ultimos_concursos': janelas,
+                            'ultimo_concurso': numero_ultimo,
+                            'data_analise': datetime.now().isoformat()
+                        },
+                        chave_idempotencia=f"megasena-estatisticas-janelas-{numero_ultimo}-{'-'.join(map(str, janelas))}"
+                    )
+                    print(f"Estatísticas das janelas salvas no Firestore")
+                except Exception as e:
+                    print(f"Erro ao salvar estatísticas no Firestore: {str(e)}")
+            
+            return self._resposta_janelas(numero_ultimo, janelas, estatisticas)
+        except Exception as e:
+            raise Exception(f"Erro ao calcular estatísticas: {str(e)}")
+    
+    @staticmethod
+    def _resposta_janelas(numero_ultimo, janelas, estatisticas):
+        """Monta a resposta de várias janelas a partir das estatísticas de cada uma."""
+        return {
+            "ultimo_concurso": numero_ultimo,
+            "janelas": [{"ultimos": janela, **estatisticas[janela]} for janela in janelas]
+        }
+    
+    def _calcular_estatisticas(self, numero_ultimo: int, janelas: List[int]) -> Dict[int, Dict[str, Any]]:
+        """
+        Calcula as estatísticas de uma ou mais janelas terminadas no último concurso.
+        
+        Os concursos são percorridos uma única vez, do último para o primeiro da maior janela,
+        e as estatísticas de cada janela são extraídas quando a passada atinge o seu início.
+        
+        Args:
+            numero_ultimo: Número do último concurso
+            janelas: Quantidades de concursos de cada janela
+            
+        Returns:
+            Dicionário {janela: estatísticas}
+        """
+        pendentes = sorted(set(janelas))
+        primeiro_concurso = max(1, numero_ultimo - pendentes[-1] + 1)
+        
+        # Inicializamos contadores
+        frequencia_dezenas = {str(i).zfill(2): 0 for i in range(1, 61)}
+        total_ganhadores = {faixa: 0 for faixa in FAIXAS_PREMIACAO}
+        concursos_analisados = []
+        estatisticas = {}
+        
+        # Concursos do histórico em memória (blocos do Firestore) dispensam consultas individuais
+        entradas = historico_store.obter_entradas(primeiro_concurso, numero_ultimo)
+        
+        for num_concurso in range(numero_ultimo, primeiro_concurso - 1, -1):
+            self._contabilizar_concurso(num_concurso, entradas.get(num_concurso), frequencia_dezenas,
+                                        total_ganhadores, concursos_analisados)
+            # Janelas que começam neste concurso estão completas
+            while pendentes and num_concurso <= max(1, numero_ultimo - pendentes[0] + 1):
+                estatisticas[pendentes.pop(0)] = self._montar_estatisticas(
+                    frequencia_dezenas, total_ganhadores, concursos_analisados)
+        
+        for janela in pendentes:
+            estatisticas[janela] = self._montar_estatisticas(frequencia_dezenas, total_ganhadores, concursos_analisados)
+        return estatisticas
+    
+    def _contabilizar_concurso(self, num_concurso, entrada, frequencia_dezenas, total_ganhadores, concursos_analisados):
+        """Soma as dezenas e os ganhadores de um concurso aos contadores das estatísticas."""
+        if entrada is not None:
+            concursos_analisados.append(num_concurso)
+            for dezena in entrada.get('dezenas') or []:
+                frequencia_dezenas[f"{dezena:02d}"] += 1
+            for faixa, ganhadores in zip(FAIXAS_PREMIACAO, entrada.get('ganhadores') or []):
+                total_ganhadores[faixa] += ganhadores
+            return
+        
+        try:
+            # Usar a função obter_concurso, que agora tenta primeiro no Firestore
+            dados = self.obter_concurso(num_concurso)
+            concursos_analisados.append(num_concurso)
+            
+            # Contabiliza frequência das dezenas
+            for dezena in dados.get("listaDezenas", []):
+                if dezena in frequencia_dezenas:
+                    frequencia_dezenas[dezena] += 1
+            
+            # Contabiliza ganhadores
+            for faixa in dados.get("listaRateioPremio", []):
+                descricao = faixa.get("descricaoFaixa", "")
+                if descricao in total_ganhadores:
+                    total_ganhadores[descricao] += faixa.get("numeroDeGanhadores", 0)
+        except Exception as e:
+            print(f"Erro ao obter concurso {num_concurso}: {str(e)}")
+            # Se houver erro em um concurso específico, continuamos para o próximo
+    
+    @staticmethod
+    def _montar_estatisticas(frequencia_dezenas, total_ganhadores, concursos_analisados):
+        """Monta as estatísticas a partir dos contadores acumulados até o momento."""
+        # Ordenamos as dezenas por frequência (decrescente)
+        dezenas_mais_sorteadas = sorted(
+            [(dezena, freq) for dezena, freq in frequencia_dezenas.items()],
+            key=lambda x: x[1],
+            reverse=True
+        )
+        
+        return {
+            "concursos_analisados": len(concursos_analisados),
+            "periodo": {
+                "primeiro_concurso": min(concursos_analisados) if concursos_analisados else None,
+                "ultimo_concurso": max(concursos_analisados) if concursos_analisados else None
+            },
+            "dezenas_mais_sorteadas": dezenas_mais_sorteadas[:10],
+            "dezenas_menos_sorteadas": dezenas_mais_sorteadas[-10:],
+            "total_ganhadores": dict(total_ganhadores)
+        }
+    
+    @staticmethod
+    def _conteudo_das_estatisticas(estatisticas):
+        """Converte as estatísticas para o formato salvo no Firestore."""
+        return {
+            "periodo": estatisticas["periodo"],
+            "total_concursos": estatisticas["concursos_analisados"],
+            "dezenas_mais_sorteadas": [{"dezena": d[0], "frequencia": d[1]} for d in estatisticas["dezenas_mais_sorteadas"]],
+            "dezenas_menos_sorteadas": [{"dezena": d[0], "frequencia": d[1]} for d in estatisticas["dezenas_menos_sorteadas"]],
+            "total_ganhadores": estatisticas["total_ganhadores"]
+        }
+    
+    @staticmethod
+    def _estatisticas_do_conteudo(estatisticas_salvas):
+        """Converte estatísticas salvas no Firestore para o formato da aplicação (None se o formato não for o esperado)."""
+        if not (isinstance(estatisticas_salvas, dict) and 
+                'periodo' in estatisticas_salvas and 
+                'dezenas_mais_sorteadas' in estatisticas_salvas and
+                'dezenas_menos_sorteadas' in estatisticas_salvas):
+            return None
+        
+        # Converter dezenas para o formato [(dezena, frequencia), ...]
+        dezenas_mais = []
+        for item in estatisticas_salvas.get('dezenas_mais_sorteadas', []):
+            if isinstance(item, dict) and 'dezena' in item and 'frequencia' in item:
+                dezenas_mais.append((item['dezena'], item['frequencia']))
+            
+        dezenas_menos = []
+        for item in estatisticas_salvas.get('dezenas_menos_sorteadas', []):
+            if isinstance(item, dict) and 'dezena' in item and 'frequencia' in item:
+                dezenas_menos.append((item['dezena'], item['frequencia']))
+        
+        return {
+            "concursos_analisados": estatisticas_salvas.get('total_concursos', 0),
+            "periodo": estatisticas_salvas.get('periodo', {}),
+            "dezenas_mais_sorteadas": dezenas_mais,
+            "dezenas_menos_sorteadas": dezenas_menos,
+            "total_ganhadores": estatisticas_salvas.get('total_ganhadores', {})
+        }
 
 
 # Exemplo de uso:
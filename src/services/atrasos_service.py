@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+"""
+Atrasos e intervalos de cada dezena.
+
+Para cada uma das 60 dezenas são mantidos o último concurso em que saiu, o primeiro, a
+quantidade de aparições e o maior atraso já registrado (concursos seguidos sem sair).
+O atraso atual e o intervalo médio entre aparições derivam desses quatro valores, então
+um concurso novo atualiza apenas as 6 dezenas sorteadas.
+
+O estado é mantido por um observador do historico_store. Concursos novos, em ordem, são
+aplicados incrementalmente; a correção de um concurso antigo marca o estado para ser
+reconstruído, em uma única passada vetorizada sobre o histórico em memória.
+"""
+import threading
+from src.services import historico_store
+
+# Dependência opcional: sem numpy, a reconstrução aplica os concursos um a um
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+ORDENACOES = ('dezena', 'atraso', 'maior_atraso', 'aparicoes')
+
+# Listas com 60 posições (índice d-1 = dezena d)
+_estado = {
+    'ultimo_visto': [0] * 60,
+    'primeiro_visto': [0] * 60,
+    'aparicoes': [0] * 60,
+    'maior_atraso': [0] * 60,
+    'mascaras': {},       # numero -> máscara das dezenas, para detectar concursos corrigidos
+    'ultimo': 0,
+    'construido': False
+}
+_lock = threading.Lock()
+
+
+def _mascara(dezenas):
+    mascara = 0
+    for dezena in dezenas:
+        mascara |= 1 << (dezena - 1)
+    return mascara
+
+
+def _dezenas_validas(entrada):
+    dezenas = sorted(int(dezena) for dezena in entrada.get('dezenas') or [])
+    return dezenas if len(dezenas) == 6 else None
+
+
+def _aplicar_concurso(numero, dezenas):
+    """Aplica um concurso posterior a todos os já aplicados: O(6)."""
+    for dezena in dezenas:
+        i = dezena - 1
+        anterior = _estado['ultimo_visto'][i]
+        _estado['maior_atraso'][i] = max(_estado['maior_atraso'][i], numero - anterior - 1)
+        if not anterior:
+            _estado['primeiro_visto'][i] = numero
+        _estado['ultimo_visto'][i] = numero
+        _estado['aparicoes'][i] += 1
+    _estado['mascaras'][numero] = _mascara(dezenas)
+    _estado['ultimo'] = numero
+
+
+def _reconstruir(sorteios):
+    """Recalcula o estado de todas as dezenas a partir do histórico completo."""
+    validos = sorted((int(numero), dezenas) for numero, dezenas in
+                     ((numero, _dezenas_validas(entrada)) for numero, entrada in sorteios.items()) if dezenas)
+    _estado.update({
+        'ultimo_visto': [0] * 60, 'primeiro_visto': [0] * 60, 'aparicoes': [0] * 60,
+        'maior_atraso': [0] * 60, 'mascaras': {}, 'ultimo': 0, 'construido': True
+    })
+    if not validos:
+        return
+    if np is None:
+        for numero, dezenas in validos:
+            _aplicar_concurso(numero, dezenas)
+        return
+
+    numeros = np.array([numero for numero, _ in validos], dtype=np.int64)
+    matriz = np.zeros((len(validos), 60), dtype=bool)
+    matriz[np.repeat(np.arange(len(validos)), 6), np.array([dezenas for _, dezenas in validos]).ravel() - 1] = True
+
+    # Aparições agrupadas por dezena e, dentro de cada dezena, em ordem de concurso
+    dezena, linha = np.nonzero(matriz.T)
+    concurso = numeros[linha]
+    inicio_grupo = np.ones(len(dezena), dtype=bool)
+    inicio_grupo[1:] = dezena[1:] != dezena[:-1]
+    anterior = np.where(inicio_grupo, 0, np.roll(concurso, 1))
+    atraso = concurso - anterior - 1
+
+    aparicoes = np.bincount(dezena, minlength=60)
+    ultimo_visto = np.zeros(60, dtype=np.int64)
+    ultimo_visto[dezena] = concurso  # a última atribuição de cada dezena é a aparição mais recente
+    primeiro_visto = np.zeros(60, dtype=np.int64)
+    primeiro_visto[dezena[inicio_grupo]] = concurso[inicio_grupo]
+    maior_atraso = np.zeros(60, dtype=np.int64)
+    np.maximum.at(maior_atraso, dezena, atraso)
+
+    _estado.update({
+        'ultimo_visto': ultimo_visto.tolist(),
+        'primeiro_visto': primeiro_visto.tolist(),
+        'aparicoes': aparicoes.tolist(),
+        'maior_atraso': maior_atraso.tolist(),
+        'mascaras': {numero: _mascara(dezenas) for numero, dezenas in validos},
+        'ultimo': int(numeros[-1])
+    })
+
+
+def _aplicar(sorteios, completo=False):
+    """Atualiza os atrasos com os concursos alterados no histórico (observador do historico_store)."""
+    with _lock:
+        if completo:
+            _reconstruir(sorteios)
+            return
+        if not _estado['construido']:
+            return
+        for numero, entrada in sorted((int(numero), entrada) for numero, entrada in sorteios.items()):
+            dezenas = _dezenas_validas(entrada)
+            if not dezenas or _estado['mascaras'].get(numero) == _mascara(dezenas):
+                continue
+            if numero > _estado['ultimo']:
+                _aplicar_concurso(numero, dezenas)
+            else:
+                # Concurso antigo inserido ou corrigido: reconstruir na próxima consulta
+                _estado['construido'] = False
+                return
+
+
+historico_store.registrar_observador(_aplicar)
+
+
+def _garantir_construido():
+    """Carrega o histórico (o que calcula os atrasos) e o mantém em dia com concursos novos."""
+    historico_store.atualizar()
+    if not _estado['construido']:
+        ultimo = historico_store.ultimo_numero()
+        if not _estado['construido']:
+            # Histórico carregado antes do registro do observador, ou concurso antigo corrigido
+            _aplicar(historico_store.obter_entradas(1, ultimo or 0), completo=True)
+
+
+def obter_atrasos(ordenar='dezena'):
+    """
+    Obtém o atraso atual, o maior atraso e o intervalo médio entre aparições de cada dezena.
+
+    Args:
+        ordenar: Critério de ordenação (dezena, atraso, maior_atraso ou aparicoes);
+            exceto por dezena, a ordem é decrescente
+
+    Returns:
+        Dicionário com os dados das 60 dezenas e o último concurso considerado
+    """
+    ordenar = ordenar or 'dezena'
+    if ordenar not in ORDENACOES:
+        raise ValueError(f"Ordenação inválida. Use uma de: {', '.join(ORDENACOES)}")
+
+    _garantir_construido()
+    with _lock:
+        ultimo = _estado['ultimo']
+        if not ultimo:
+            raise ValueError("Nenhum sorteio disponível no histórico")
+        dezenas = []
+        for i in range(60):
+            visto = _estado['ultimo_visto'][i]
+            aparicoes = _estado['aparicoes'][i]
+            atraso = ultimo - visto
+            dezenas.append({
+                'dezena': f"{i + 1:02d}",
+                'atraso': atraso,
+                'maior_atraso': max(_estado['maior_atraso'][i], atraso),
+                'ultimo_sorteio': visto or None,
+                'aparicoes': aparicoes,
+                'intervalo_medio': round((visto - _estado['primeiro_visto'][i]) / (aparicoes - 1), 2)
+                if aparicoes > 1 else None
+            })
+
+    if ordenar != 'dezena':
+        dezenas.sort(key=lambda item: -item[ordenar])
+    return {
+        'status': 'success',
+        'ordenacao': ordenar,
+        'dezenas': dezenas,
+        'ultimo_concurso': ultimo
+    }
@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+"""
+Backtest de apostas contra todo o histórico de sorteios.
+
+O histórico em memória é convertido em uma matriz de incidência N×60 (uma linha por
+concurso, 1 nas dezenas sorteadas) e as apostas em uma matriz M×60. Os acertos de todas
+as apostas em todos os concursos saem de uma única multiplicação de matrizes (M×N), da
+qual são tirados o histograma de acertos de cada aposta e o valor acumulado dos prêmios.
+Lotes grandes de apostas são avaliados em partes, para limitar a memória da matriz de acertos.
+"""
+from src.services import historico_store
+from src.services.conferencia_service import codificar_dezenas, PREMIOS_POR_APOSTA, NOMES_FAIXAS
+
+# Dependência opcional: sem numpy, cada aposta é conferida concurso a concurso
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+MAX_APOSTAS_BACKTEST = 100000
+# Apostas avaliadas de cada vez: a matriz de acertos de uma parte ocupa APOSTAS_POR_PARTE × N
+# posições (cerca de 56 MB em float32 com 2.800 sorteios), e partes menores aproveitam melhor o cache
+APOSTAS_POR_PARTE = 5000
+
+
+def _validar_aposta(linha, aposta):
+    """Converte uma aposta em lista de dezenas inteiras, ou levanta ValueError identificando a aposta."""
+    try:
+        if not isinstance(aposta, (list, tuple)):
+            raise ValueError("a aposta deve ser uma lista de dezenas")
+        dezenas = [int(dezena) for dezena in aposta]
+        codificar_dezenas(dezenas)
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Aposta {linha + 1} inválida: {str(e)}")
+    return dezenas
+
+
+def _matrizes_sorteios(inicio, fim):
+    """Monta a matriz de incidência dos sorteios (N×60) e a matriz de prêmios individuais (N×3)."""
+    entradas = sorted(historico_store.obter_entradas(inicio, fim).items())
+    if not entradas:
+        raise ValueError("Nenhum sorteio disponível no histórico para o intervalo informado")
+
+    numeros = [numero for numero, _ in entradas]
+    sorteios = np.zeros((len(entradas), 60), dtype=np.float32)
+    premios = np.zeros((len(entradas), len(NOMES_FAIXAS)), dtype=np.float64)
+    for linha, (_, entrada) in enumerate(entradas):
+        sorteios[linha, [int(dezena) - 1 for dezena in entrada.get('dezenas') or []]] = 1
+        valores = list(entrada.get('premios') or [])[:len(NOMES_FAIXAS)]
+        premios[linha, :len(valores)] = valores
+    return numeros, sorteios, premios
+
+
+def _matriz_apostas(apostas):
+    """Valida as apostas e monta a matriz de incidência M×60 e o tamanho de cada aposta."""
+    linhas, colunas, tamanhos = [], [], []
+    for linha, aposta in enumerate(apostas):
+        dezenas = _validar_aposta(linha, aposta)
+        linhas.extend([linha] * len(dezenas))
+        colunas.extend(dezena - 1 for dezena in dezenas)
+        tamanhos.append(len(dezenas))
+
+    matriz = np.zeros((len(tamanhos), 60), dtype=np.float32)
+    matriz[linhas, colunas] = 1
+    return matriz, np.array(tamanhos, dtype=np.int64)
+
+
+def avaliar_lote(apostas, tamanhos, sorteios, premios):
+    """
+    Avalia um lote de apostas contra todos os sorteios.
+
+    Args:
+        apostas: Matriz M×60 das apostas
+        tamanhos: Quantidade de dezenas de cada aposta (M)
+        sorteios: Matriz N×60 dos sorteios
+        premios: Matriz N×3 dos prêmios individuais (sena, quina, quadra)
+
+    Returns:
+        Tupla (histogramas M×7, prêmios por faixa M×3, valor acumulado M)
+    """
+    acertos = np.rint(apostas @ sorteios.T).astype(np.int8)
+    quantidade = acertos.shape[0]
+
+    histogramas = np.stack([np.count_nonzero(acertos == h, axis=1) for h in range(7)], axis=1)
+
+    # Apenas os pares (aposta, concurso) com 4 ou mais acertos são premiados
+    linhas, colunas = np.nonzero(acertos >= 4)
+    contagem = np.array(PREMIOS_POR_APOSTA, dtype=np.int64)[tamanhos[linhas], acertos[linhas, colunas]]
+    faixas = np.zeros((quantidade, len(NOMES_FAIXAS)), dtype=np.int64)
+    np.add.at(faixas, linhas, contagem)
+    valores = np.bincount(linhas, weights=(contagem * premios[colunas]).sum(axis=1), minlength=quantidade)
+    return histogramas, faixas, valores
+
+
+def _avaliar(apostas, tamanhos, sorteios, premios):
+    """Avalia as apostas em partes de APOSTAS_POR_PARTE, limitando a memória da matriz de acertos."""
+    if len(tamanhos) <= APOSTAS_POR_PARTE:
+        return avaliar_lote(apostas, tamanhos, sorteios, premios)
+
+    fatias = [slice(inicio, inicio + APOSTAS_POR_PARTE) for inicio in range(0, len(tamanhos), APOSTAS_POR_PARTE)]
+    resultados = [avaliar_lote(apostas[fatia], tamanhos[fatia], sorteios, premios) for fatia in fatias]
+    return tuple(np.concatenate(partes) for partes in zip(*resultados))
+
+
+def _avaliar_sem_numpy(apostas, inicio, fim):
+    """Backtest aposta a aposta, com máscaras de bits, quando numpy não está disponível."""
+    mascaras = [codificar_dezenas(_validar_aposta(linha, aposta)) for linha, aposta in enumerate(apostas)]
+    entradas = sorted(historico_store.obter_entradas(inicio, fim).items())
+    if not entradas:
+        raise ValueError("Nenhum sorteio disponível no histórico para o intervalo informado")
+    sorteios = [(codificar_dezenas(entrada.get('dezenas') or [], minimo=6, maximo=6),
+                 (list(entrada.get('premios') or []) + [0.0] * 3)[:3]) for _, entrada in entradas]
+
+    histogramas, faixas, valores = [], [], []
+    for mascara in mascaras:
+        histograma = [0] * 7
+        premios_aposta = [0] * 3
+        valor = 0.0
+        for mascara_sorteio, premios in sorteios:
+            acertos = (mascara & mascara_sorteio).bit_count()
+            histograma[acertos] += 1
+            if acertos >= 4:
+                contagem = PREMIOS_POR_APOSTA[mascara.bit_count()][acertos]
+                premios_aposta = [total + quantidade for total, quantidade in zip(premios_aposta, contagem)]
+                valor += sum(quantidade * premio for quantidade, premio in zip(contagem, premios))
+        histogramas.append(histograma)
+        faixas.append(premios_aposta)
+        valores.append(valor)
+    return [numero for numero, _ in entradas], histogramas, faixas, valores
+
+
+def executar_backtest(apostas, inicio=1, fim=None):
+    """
+    Avalia como um conjunto de apostas teria se saído em todos os concursos de um intervalo.
+
+    Args:
+        apostas: Lista de apostas (listas de 6 a 20 dezenas)
+        inicio: Primeiro concurso (padrão: 1)
+        fim: Último concurso (padrão: o último do histórico)
+
+    Returns:
+        Dicionário com, para cada aposta, o histograma de acertos (índice = acertos),
+        a quantidade de prêmios por faixa e o valor acumulado dos prêmios
+    """
+    apostas = list(apostas or [])
+    if not apostas:
+        raise ValueError("Nenhuma aposta informada")
+    if len(apostas) > MAX_APOSTAS_BACKTEST:
+        raise ValueError(f"O backtest aceita no máximo {MAX_APOSTAS_BACKTEST} apostas")
+    inicio = inicio or 1
+    fim = fim or historico_store.ultimo_numero()
+    if not fim or fim < inicio:
+        raise ValueError("Intervalo de concursos inválido")
+
+    if np is not None:
+        # As apostas são validadas antes de montar a matriz dos sorteios
+        matriz, tamanhos = _matriz_apostas(apostas)
+        numeros, sorteios, premios = _matrizes_sorteios(inicio, fim)
+        histogramas, faixas, valores = _avaliar(matriz, tamanhos, sorteios, premios)
+        histogramas, faixas, valores = histogramas.tolist(), faixas.tolist(), valores.tolist()
+    else:
+        numeros, histogramas, faixas, valores = _avaliar_sem_numpy(apostas, inicio, fim)
+
+    resultados = [
+        {
+            'aposta': indice + 1,
+            'histograma_acertos': histogramas[indice],
+            **{nome: faixas[indice][i] for i, nome in enumerate(NOMES_FAIXAS)},
+            'premio_total': round(valores[indice], 2)
+        }
+        for indice in range(len(apostas))
+    ]
+    return {
+        'status': 'success',
+        'inicio': numeros[0],
+        'fim': numeros[-1],
+        'concursos_analisados': len(numeros),
+        'total_apostas': len(apostas),
+        'premio_total': round(sum(valores), 2),
+        'resultados': resultados
+    }
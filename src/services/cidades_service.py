@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+"""
+Índice geográfico das cidades ganhadoras da sena.
+
+Cada gravação de concurso mescla as suas cidades ganhadoras em um único documento de índice
+(FirebaseService.entradas_cidades), então o ranking de UFs e municípios custa uma leitura,
+sem percorrer os documentos dos concursos. Em memória, o índice vira rankings pré-ordenados
+(geral e por UF) e uma lista ordenada dos nomes normalizados, usada na busca por prefixo.
+A cópia em memória é descartada a cada mudança do histórico e relida na próxima consulta.
+
+Uso:
+    python -m src.services.cidades_service            # simula a reconstrução do índice
+    python -m src.services.cidades_service --executar # recria o índice a partir da coleção concursos
+"""
+import argparse
+import json
+import threading
+import unicodedata
+from bisect import bisect_left
+from heapq import nsmallest
+from src.services import historico_store
+from src.services.firebase_service import FirebaseService, COLECAO_CONCURSOS
+
+TOP_PADRAO = 10
+TOP_MAXIMO = 100
+
+# geracao é incrementada a cada mudança do histórico; o índice em memória vale para a geração em que foi lido
+_indice = {'cidades': None, 'ranking_uf': {}, 'ufs': [], 'nomes': [], 'geracao': 0, 'geracao_lida': None}
+_lock = threading.Lock()
+
+
+def normalizar(texto):
+    """Nome em maiúsculas e sem acentos, para a busca por prefixo."""
+    decomposto = unicodedata.normalize('NFKD', str(texto or ''))
+    return ''.join(caractere for caractere in decomposto if not unicodedata.combining(caractere)).upper().strip()
+
+
+def _invalidar(sorteios, completo=False):
+    """Invalida o índice em memória a cada mudança do histórico (observador do historico_store)."""
+    with _lock:
+        _indice['geracao'] += 1
+
+
+historico_store.registrar_observador(_invalidar)
+
+
+def _chave_ranking(cidade):
+    return (-cidade['ganhadores'], -len(cidade['concursos']), cidade['cidade'])
+
+
+def _construir(entradas):
+    """Monta os rankings e a lista de nomes a partir das entradas do documento de índice."""
+    cidades = []
+    for entrada in entradas.values():
+        concursos = sorted((int(numero), int(ganhadores)) for numero, ganhadores in (entrada.get('concursos') or {}).items())
+        if not concursos:
+            continue
+        cidades.append({
+            'cidade': entrada.get('cidade', ''),
+            'uf': entrada.get('uf', ''),
+            'ganhadores': sum(ganhadores for _, ganhadores in concursos),
+            'concursos': [numero for numero, _ in concursos]
+        })
+    cidades.sort(key=_chave_ranking)
+
+    ranking_uf = {}
+    for posicao, cidade in enumerate(cidades):
+        ranking_uf.setdefault(cidade['uf'], []).append(posicao)
+    ufs = sorted(
+        ({
+            'uf': uf,
+            'ganhadores': sum(cidades[posicao]['ganhadores'] for posicao in posicoes),
+            'cidades': len(posicoes),
+            'concursos': len({numero for posicao in posicoes for numero in cidades[posicao]['concursos']})
+        } for uf, posicoes in ranking_uf.items()),
+        key=lambda item: (-item['ganhadores'], item['uf'])
+    )
+    _indice.update({
+        'cidades': cidades,
+        'ranking_uf': ranking_uf,
+        'ufs': ufs,
+        # (nome normalizado, posição no ranking), ordenada para a busca por prefixo
+        'nomes': sorted((normalizar(cidade['cidade']), posicao) for posicao, cidade in enumerate(cidades))
+    })
+
+
+def _garantir_carregado():
+    """Lê o documento de índice quando não há cópia em memória válida."""
+    historico_store.atualizar()
+    with _lock:
+        if _indice['cidades'] is not None and _indice['geracao_lida'] == _indice['geracao']:
+            return
+        geracao = _indice['geracao']
+    if not FirebaseService.is_available():
+        raise ValueError("Firebase não está disponível")
+    entradas = FirebaseService.ler_indice_cidades()
+    if entradas is None:
+        raise ValueError("Índice de cidades ganhadoras inexistente; execute a reconstrução do índice")
+    with _lock:
+        # Se o histórico mudar durante a leitura, a próxima consulta relê o índice
+        _construir(entradas)
+        _indice['geracao_lida'] = geracao
+
+
+def obter_cidades_ganhadoras(uf=None, busca=None, top=TOP_PADRAO):
+    """
+    Obtém o ranking das UFs e das cidades com mais ganhadores da sena.
+
+    Args:
+        uf: Restringe as cidades a uma UF
+        busca: Prefixo do nome da cidade (sem diferenciar maiúsculas e acentos)
+        top: Quantidade de cidades e de UFs listadas
+
+    Returns:
+        Dicionário com os totais, as UFs e as cidades com mais ganhadores (com os concursos
+        em que cada cidade ganhou)
+    """
+    top = max(1, min(TOP_MAXIMO, top or TOP_PADRAO))
+    uf = (uf or '').strip().upper() or None
+    prefixo = normalizar(busca) if busca else ''
+
+    _garantir_carregado()
+    with _lock:
+        cidades = _indice['cidades']
+        if prefixo:
+            nomes = _indice['nomes']
+            inicio = bisect_left(nomes, (prefixo,))
+            posicoes = []
+            for nome, posicao in nomes[inicio:]:
+                if not nome.startswith(prefixo):
+                    break
+                if uf is None or cidades[posicao]['uf'] == uf:
+                    posicoes.append(posicao)
+            # As posições seguem a ordem do ranking
+            selecionadas = nsmallest(top, posicoes)
+        elif uf is not None:
+            selecionadas = _indice['ranking_uf'].get(uf, [])[:top]
+        else:
+            selecionadas = range(min(top, len(cidades)))
+
+        resultado = {
+            'status': 'success',
+            'total_ganhadores': sum(item['ganhadores'] for item in _indice['ufs']),
+            'total_cidades': len(cidades),
+            'ufs': [dict(item) for item in _indice['ufs'] if uf is None or item['uf'] == uf][:top],
+            'cidades': [
+                {**cidades[posicao], 'concursos': list(cidades[posicao]['concursos']),
+                 'total_concursos': len(cidades[posicao]['concursos'])}
+                for posicao in selecionadas
+            ],
+            'ultimo_concurso': historico_store.ultimo_numero()
+        }
+    return resultado
+
+
+def reconstruir_indice(executar=False):
+    """
+    Recria o índice de cidades ganhadoras lendo apenas os campos numero e cidades_ganhadoras
+    da coleção concursos.
+
+    Args:
+        executar: Se False (padrão), apenas simula e retorna o relatório, sem gravar nada
+
+    Returns:
+        Dicionário com o relatório da reconstrução
+    """
+    firebase_scraper = FirebaseService.get_instance()
+    if not firebase_scraper:
+        raise ValueError("Firebase não está disponível")
+
+    cidades = {}
+    documentos = 0
+    for doc in firebase_scraper.db.collection(COLECAO_CONCURSOS).select(['numero', 'cidades_ganhadoras']).stream():
+        documentos += 1
+        dados = doc.to_dict() or {}
+        if not dados.get('numero'):
+            continue
+        for chave, entrada in FirebaseService.entradas_cidades(dados['numero'], dados.get('cidades_ganhadoras')).items():
+            existente = cidades.setdefault(chave, {'uf': entrada['uf'], 'cidade': entrada['cidade'], 'concursos': {}})
+            existente['concursos'].update(entrada['concursos'])
+
+    if executar:
+        FirebaseService.gravar_indice_cidades(cidades)
+        with _lock:
+            _indice['geracao'] += 1
+
+    return {
+        'modo': 'execucao' if executar else 'simulacao',
+        'documentos_lidos': documentos,
+        'cidades': len(cidades),
+        'ganhadores': sum(sum(entrada['concursos'].values()) for entrada in cidades.values())
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reconstrói o índice de cidades ganhadoras da sena")
+    parser.add_argument('--executar', action='store_true', help="grava o índice (padrão: apenas simula)")
+    args = parser.parse_args()
+
+    relatorio = reconstruir_indice(executar=args.executar)
+    print(json.dumps(relatorio, indent=2, ensure_ascii=False))
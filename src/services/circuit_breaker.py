@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+"""
+Circuit breaker para chamadas a serviços externos (API da Caixa).
+
+Depois de uma sequência de falhas o circuito abre e as chamadas falham imediatamente,
+sem esperar o timeout da requisição. Passado o tempo de abertura, uma única chamada de
+teste é liberada (meio aberto): se tiver sucesso o circuito fecha, senão volta a abrir.
+"""
+import math
+import threading
+import time
+from collections import deque
+
+
+class CircuitoAbertoError(Exception):
+    """Erro lançado quando o circuito está aberto e a chamada não é permitida."""
+    pass
+
+
+class CircuitBreaker:
+    FECHADO = 'fechado'
+    ABERTO = 'aberto'
+    MEIO_ABERTO = 'meio_aberto'
+
+    def __init__(self, nome, limite_falhas=5, tempo_abertura=30.0, janela_latencias=500):
+        """
+        Args:
+            nome: Nome do serviço protegido (usado nas mensagens e no estado exposto)
+            limite_falhas: Falhas consecutivas necessárias para abrir o circuito
+            tempo_abertura: Segundos em que o circuito fica aberto antes de liberar um teste
+            janela_latencias: Quantidade de latências recentes mantidas para os percentis
+        """
+        self.nome = nome
+        self.limite_falhas = limite_falhas
+        self.tempo_abertura = tempo_abertura
+        self._estado = self.FECHADO
+        self._falhas_consecutivas = 0
+        self._aberto_em = 0.0
+        self._teste_em_andamento = False
+        self._latencias = deque(maxlen=janela_latencias)
+        self._totais = {'sucessos': 0, 'falhas': 0, 'rejeitadas': 0}
+        self._lock = threading.Lock()
+
+    def _atualizar_estado(self):
+        """Passa de aberto para meio aberto quando o tempo de abertura expira (chamar com o lock)."""
+        if self._estado == self.ABERTO and time.monotonic() - self._aberto_em >= self.tempo_abertura:
+            self._estado = self.MEIO_ABERTO
+            self._teste_em_andamento = False
+
+    @property
+    def estado(self):
+        with self._lock:
+            self._atualizar_estado()
+            return self._estado
+
+    def segundos_para_teste(self):
+        """Retorna quantos segundos faltam para o circuito liberar uma chamada de teste."""
+        with self._lock:
+            if self._estado != self.ABERTO:
+                return 0.0
+            return max(0.0, self.tempo_abertura - (time.monotonic() - self._aberto_em))
+
+    def permite_requisicao(self):
+        """
+        Verifica se uma chamada pode ser feita agora.
+
+        Returns:
+            bool: True se o circuito está fechado, ou se é a chamada de teste do estado meio aberto
+        """
+        with self._lock:
+            self._atualizar_estado()
+            if self._estado == self.FECHADO:
+                return True
+            if self._estado == self.MEIO_ABERTO and not self._teste_em_andamento:
+                self._teste_em_andamento = True
+                return True
+            self._totais['rejeitadas'] += 1
+            return False
+
+    def registrar_sucesso(self, latencia):
+        """Registra uma chamada bem-sucedida e fecha o circuito."""
+        with self._lock:
+            self._latencias.append(latencia)
+            self._totais['sucessos'] += 1
+            self._falhas_consecutivas = 0
+            self._estado = self.FECHADO
+            self._teste_em_andamento = False
+
+    def registrar_falha(self, latencia=None):
+        """Registra uma falha e abre o circuito se o limite for atingido ou se o teste falhar."""
+        with self._lock:
+            if latencia is not None:
+                self._latencias.append(latencia)
+            self._totais['falhas'] += 1
+            self._falhas_consecutivas += 1
+            if self._estado == self.MEIO_ABERTO or self._falhas_consecutivas >= self.limite_falhas:
+                if self._estado != self.ABERTO:
+                    print(f"Circuito '{self.nome}' aberto após {self._falhas_consecutivas} falha(s) consecutiva(s)")
+                self._estado = self.ABERTO
+                self._aberto_em = time.monotonic()
+                self._teste_em_andamento = False
+
+    def verificar(self):
+        """
+        Garante que a chamada é permitida.
+
+        Raises:
+            CircuitoAbertoError: Se o circuito estiver aberto
+        """
+        if not self.permite_requisicao():
+            raise CircuitoAbertoError(
+                f"Serviço '{self.nome}' indisponível (circuito aberto), "
+                f"nova tentativa em {self.segundos_para_teste():.0f}s"
+            )
+
+    def percentis_latencia(self, percentis=(50, 90, 99)):
+        """
+        Calcula percentis das latências recentes (método do posto mais próximo).
+
+        Args:
+            percentis: Percentis a calcular
+
+        Returns:
+            Dicionário {'p50': segundos, ...} com None quando não há amostras
+        """
+        with self._lock:
+            amostras = sorted(self._latencias)
+
+        resultado = {}
+        for percentil in percentis:
+            if not amostras:
+                resultado[f"p{percentil}"] = None
+                continue
+            posicao = max(1, math.ceil(percentil / 100 * len(amostras)))
+            resultado[f"p{percentil}"] = round(amostras[posicao - 1], 4)
+        return resultado
+
+    def obter_estado(self):
+        """Retorna o estado do circuito e as métricas de latência para exposição."""
+        estado = self.estado
+        with self._lock:
+            dados = {
+                'servico': self.nome,
+                'estado': estado,
+                'falhas_consecutivas': self._falhas_consecutivas,
+                'limite_falhas': self.limite_falhas,
+                'tempo_abertura': self.tempo_abertura,
+                'totais': dict(self._totais),
+                'amostras_latencia': len(self._latencias)
+            }
+        dados['segundos_para_teste'] = round(self.segundos_para_teste(), 1)
+        dados['latencia'] = self.percentis_latencia()
+        return dados
@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+"""
+Índice de cobertura dos concursos salvos e reparo das lacunas.
+
+O índice é um bitset (o bit n indica que o concurso n está na coleção concursos) guardado
+em um único documento e atualizado a cada gravação de concurso. Com ele, as lacunas do
+histórico são calculadas em memória com uma leitura, e o reparo baixa da API da Caixa
+apenas os concursos que faltam, pelo download em lote da MegasenaAPI.
+
+Uso:
+    python -m src.services.cobertura_service                          # lista as lacunas
+    python -m src.services.cobertura_service --executar               # baixa e salva os concursos faltantes
+    python -m src.services.cobertura_service --reconstruir --executar # recria o índice a partir da coleção concursos
+    python -m src.services.cobertura_service --ultimo 2900 --executar # considera o histórico até o concurso 2900
+"""
+import argparse
+import json
+from datetime import datetime
+from src.megasena_api import MegasenaAPI
+from src.services import http_cache
+from src.services.firebase_service import FirebaseService, COLECAO_CONCURSOS
+
+# Concursos baixados pelo reparo que são gravados juntos, em uma transação
+CONCURSOS_POR_GRAVACAO = 100
+
+def bitset_de(numeros):
+    """Monta o bitset de um conjunto de números de concursos."""
+    bits = 0
+    for numero in numeros:
+        bits |= 1 << int(numero)
+    return bits
+
+
+def lacunas(bits, ultimo):
+    """
+    Calcula os intervalos de concursos ausentes do bitset entre 1 e o último concurso.
+
+    O custo é proporcional ao número de lacunas, não ao tamanho do histórico.
+
+    Args:
+        bits: Bitset de cobertura
+        ultimo: Último concurso considerado
+
+    Returns:
+        Lista de tuplas (inicio, fim) em ordem crescente
+    """
+    if ultimo < 1:
+        return []
+    # Bits ausentes entre 1 e ultimo (o bit 0 não corresponde a um concurso)
+    faltando = ~bits & ((1 << (ultimo + 1)) - 2)
+    intervalos = []
+    while faltando:
+        inicio = (faltando & -faltando).bit_length() - 1
+        sequencia = faltando >> inicio
+        tamanho = (~sequencia & (sequencia + 1)).bit_length() - 1
+        intervalos.append((inicio, inicio + tamanho - 1))
+        faltando &= ~(((1 << tamanho) - 1) << inicio)
+    return intervalos
+
+
+def ultimo_concurso(bits):
+    """Último concurso a considerar: o do cache HTTP, se conhecido, ou o maior número salvo."""
+    conhecido = http_cache.ultimo_concurso_conhecido()
+    return max(conhecido or 0, bits.bit_length() - 1, 0)
+
+
+def reconstruir_cobertura(executar=False):
+    """
+    Recria o índice de cobertura lendo apenas o campo numero da coleção concursos.
+
+    Args:
+        executar: Se False (padrão), apenas simula e retorna o relatório, sem gravar nada
+
+    Returns:
+        Dicionário com o relatório da reconstrução
+    """
+    firebase_scraper = FirebaseService.get_instance()
+    if not firebase_scraper:
+        raise ValueError("Firebase não está disponível")
+
+    numeros = [doc.to_dict().get('numero') for doc in
+               firebase_scraper.db.collection(COLECAO_CONCURSOS).select(['numero']).stream()]
+    bits = bitset_de(numero for numero in numeros if numero)
+    if executar:
+        bits = FirebaseService.incorporar_cobertura(bits)
+
+    return {
+        'modo': 'execucao' if executar else 'simulacao',
+        'documentos_lidos': len(numeros),
+        'concursos': bits.bit_count(),
+        'lacunas': lacunas(bits, ultimo_concurso(bits))
+    }
+
+
+def reparar_lacunas(executar=False, ultimo=None, max_paralelo=None):
+    """
+    Baixa e salva apenas os concursos ausentes do índice de cobertura.
+
+    Args:
+        executar: Se False (padrão), apenas lista as lacunas, sem baixar nada
+        ultimo: Último concurso considerado (padrão: o último conhecido)
+        max_paralelo: Número máximo de downloads simultâneos
+
+    Returns:
+        Dicionário com o relatório do reparo
+    """
+    if not FirebaseService.is_available():
+        raise ValueError("Firebase não está disponível")
+
+    bits = FirebaseService.ler_cobertura()
+    if bits is None:
+        print("Índice de cobertura inexistente, reconstruindo a partir da coleção concursos")
+        reconstruir_cobertura(executar=True)
+        bits = FirebaseService.ler_cobertura() or 0
+
+    ultimo = int(ultimo) if ultimo else ultimo_concurso(bits)
+    intervalos = lacunas(bits, ultimo)
+    faltantes = [numero for inicio, fim in intervalos for numero in range(inicio, fim + 1)]
+    relatorio = {
+        'modo': 'execucao' if executar else 'simulacao',
+        'ultimo_concurso': ultimo,
+        'lacunas': intervalos,
+        'faltantes': len(faltantes)
+    }
+    if not executar or not faltantes:
+        return relatorio
+
+    megasena_api = MegasenaAPI()
+    salvos = 0
+    erros = []
+    baixados = []
+
+    def _gravar():
+        # Os concursos baixados são gravados em grupos: cada transação lê o contador de
+        # sequência uma vez e numera todos os concursos que grava
+        nonlocal salvos
+        try:
+            FirebaseService.salvar_concursos(
+                [conteudo for _, conteudo in baixados],
+                metadados={
+                    'fonte': 'api_caixa',
+                    'reparo_lacunas': True,
+                    'data_importacao': datetime.now().isoformat()
+                }
+            )
+            salvos += len(baixados)
+        except Exception as e:
+            for numero, _ in baixados:
+                print(f"Reparo de lacunas: erro no concurso {numero}: {str(e)}")
+                erros.append({'concurso': numero, 'erro': str(e)})
+        baixados.clear()
+
+    for numero, dados, erro in megasena_api.obter_concursos_em_lote(faltantes, max_paralelo):
+        if erro is None:
+            try:
+                baixados.append((numero, megasena_api.formatar_resultado(dados)))
+                if len(baixados) >= CONCURSOS_POR_GRAVACAO:
+                    _gravar()
+                continue
+            except Exception as e:
+                erro = str(e)
+        print(f"Reparo de lacunas: erro no concurso {numero}: {erro}")
+        erros.append({'concurso': numero, 'erro': erro})
+    if baixados:
+        _gravar()
+
+    # Fundir os números gravados no bitset compacto
+    bits = FirebaseService.incorporar_cobertura()
+    relatorio.update({
+        'salvos': salvos,
+        'com_erro': len(erros),
+        'erros': erros,
+        'lacunas_restantes': lacunas(bits, ultimo)
+    })
+    return relatorio
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Lista e repara as lacunas do histórico de concursos")
+    parser.add_argument('--executar', action='store_true', help="grava as alterações (padrão: apenas simula)")
+    parser.add_argument('--reconstruir', action='store_true', help="recria o índice de cobertura a partir da coleção concursos")
+    parser.add_argument('--ultimo', type=int, help="último concurso considerado (padrão: o último conhecido)")
+    parser.add_argument('--paralelo', type=int, help="número máximo de downloads simultâneos")
+    args = parser.parse_args()
+
+    if args.reconstruir:
+        relatorio = reconstruir_cobertura(executar=args.executar)
+    else:
+        relatorio = reparar_lacunas(executar=args.executar, ultimo=args.ultimo, max_paralelo=args.paralelo)
+    print(json.dumps(relatorio, indent=2, ensure_ascii=False))
@@ -0,0 +1,340 @@
+# -*- coding: utf-8 -*-
+"""
+Compactação offline da coleção scraping_results.
+
+Os concursos foram salvos ao longo do tempo com IDs aleatórios e em formatos diferentes
+(resposta bruta da API, formato de formatar_resultado, formato reduzido de
+ultimos_sorteios e saída do scraping), com o número em conteudo.concurso ou em
+metadados.concurso. A compactação percorre a coleção uma vez, escolhe o registro mais
+completo de cada concurso, grava-o normalizado na coleção concursos (quando ela ainda
+não tem o concurso) e exclui os registros de concursos de scraping_results em lotes.
+
+Outros documentos (estatísticas, status, saídas de scraping sem concurso) não são alterados.
+
+Também reconstrói os blocos de concursos_blocos a partir da coleção concursos, para os
+concursos gravados antes da existência dos blocos, e numera com a sequência de alterações
+os concursos gravados antes dela.
+
+Uso:
+    python -m src.services.compactacao_service                     # simulação (apenas relatório)
+    python -m src.services.compactacao_service --executar          # grava e exclui
+    python -m src.services.compactacao_service --blocos --executar # reconstrói os blocos
+    python -m src.services.compactacao_service --sequencias --executar # numera concursos antigos
+"""
+import argparse
+import json
+from datetime import datetime
+from src.megasena_api import MegasenaAPI
+from src.services.firebase_service import FirebaseService, COLECAO_CONCURSOS, COLECAO_BLOCOS, TAMANHO_BLOCO
+
+COLECAO_RESULTADOS = 'scraping_results'
+# Limite de operações por batch do Firestore é 500; deixamos margem
+TAMANHO_BATCH = 400
+
+# Riqueza de cada formato de registro (maior é mais completo): a resposta bruta da API tem
+# precedência sobre o resultado já formatado, para que o vencedor não dependa da ordem de leitura
+RIQUEZA_API = 4
+RIQUEZA_FORMATADO = 3
+RIQUEZA_REDUZIDO = 1
+RIQUEZA_SCRAPING = 0
+
+
+def _numero_concurso(dados):
+    """Extrai o número do concurso de um documento, em qualquer dos formatos conhecidos."""
+    conteudo = dados.get('conteudo') or {}
+    metadados = dados.get('metadados') or {}
+    if not isinstance(conteudo, dict):
+        conteudo = {}
+
+    for valor in (conteudo.get('concurso'), conteudo.get('numero'), metadados.get('concurso'), conteudo.get('sorteio')):
+        try:
+            numero = int(valor)
+        except (ValueError, TypeError):
+            continue
+        if numero > 0:
+            return numero
+    return None
+
+
+def _normalizar_dezenas(dezenas):
+    """Converte as dezenas para strings de dois dígitos em ordem crescente."""
+    try:
+        return [f"{int(dezena):02d}" for dezena in sorted(dezenas, key=int)]
+    except (ValueError, TypeError):
+        return []
+
+
+def _normalizar_data(data):
+    """Converte datas nos formatos AAAA-MM-DD ou DD/MM/AAAA para AAAA-MM-DD."""
+    if not data:
+        return None
+    for formato in ("%Y-%m-%d", "%d/%m/%Y"):
+        try:
+            return datetime.strptime(str(data)[:10], formato).strftime("%Y-%m-%d")
+        except ValueError:
+            continue
+    return None
+
+
+def normalizar_registro(numero, conteudo, megasena_api=None):
+    """
+    Normaliza o conteúdo de um registro de concurso para o formato de formatar_resultado.
+
+    Args:
+        numero: Número do concurso
+        conteudo: Conteúdo do documento, em qualquer dos formatos conhecidos
+        megasena_api: Instância da MegasenaAPI usada para formatar respostas brutas
+
+    Returns:
+        Tupla (conteúdo normalizado, riqueza), ou (None, -1) se o registro não é um concurso
+    """
+    if not isinstance(conteudo, dict):
+        return None, -1
+
+    if 'listaDezenas' in conteudo:
+        # Resposta bruta da API da Caixa
+        normalizado = (megasena_api or MegasenaAPI()).formatar_resultado(conteudo)
+        riqueza = RIQUEZA_API
+    elif 'dezenas' in conteudo:
+        normalizado = dict(conteudo)
+        if 'premiacao' in conteudo:
+            riqueza = RIQUEZA_FORMATADO
+        else:
+            # Formato reduzido de ultimos_sorteios (concurso, data, dezenas, prêmio acumulado)
+            riqueza = RIQUEZA_REDUZIDO
+            if 'premio_acumulado' in normalizado:
+                normalizado['valor_acumulado_proximo_concurso'] = normalizado.pop('premio_acumulado')
+    elif 'numeros' in conteudo:
+        # Saída do scraping da página da Caixa
+        normalizado = {'data_sorteio': conteudo.get('data'), 'dezenas': conteudo.get('numeros', [])}
+        riqueza = RIQUEZA_SCRAPING
+    else:
+        return None, -1
+
+    normalizado['concurso'] = numero
+    normalizado['dezenas'] = _normalizar_dezenas(normalizado.get('dezenas') or [])
+    normalizado['data_sorteio'] = _normalizar_data(normalizado.get('data_sorteio'))
+    if len(normalizado['dezenas']) != 6:
+        return None, -1
+    return normalizado, riqueza
+
+
+def _preenchidos(conteudo):
+    """Quantidade de campos preenchidos, usada para desempatar registros de mesma riqueza."""
+    return sum(1 for valor in conteudo.values() if valor not in (None, '', [], {}))
+
+
+def compactar_resultados(executar=False):
+    """
+    Compacta a coleção scraping_results, movendo um registro normalizado por concurso
+    para a coleção concursos.
+
+    Args:
+        executar: Se False (padrão), apenas simula e retorna o relatório, sem gravar nada
+
+    Returns:
+        Dicionário com o relatório da compactação
+    """
+    firebase_scraper = FirebaseService.get_instance()
+    if not firebase_scraper:
+        raise ValueError("Firebase não está disponível")
+    db = firebase_scraper.db
+    colecao = db.collection(COLECAO_RESULTADOS)
+    colecao_concursos = db.collection(COLECAO_CONCURSOS)
+    megasena_api = MegasenaAPI()
+
+    # Concursos já migrados (gravados completos pela API ou pela importação) não são regravados
+    ja_migrados = {doc.to_dict().get('numero') for doc in colecao_concursos.select(['numero']).stream()}
+
+    documentos_lidos = 0
+    ignorados = 0
+    # numero -> {'id', 'riqueza', 'preenchidos', 'conteudo', 'metadados'}
+    melhores = {}
+    # numero -> IDs de todos os documentos do concurso
+    documentos_por_concurso = {}
+
+    for doc in colecao.stream():
+        documentos_lidos += 1
+        dados = doc.to_dict() or {}
+        numero = _numero_concurso(dados)
+        if numero is None:
+            ignorados += 1
+            continue
+
+        try:
+            conteudo, riqueza = normalizar_registro(numero, dados.get('conteudo'), megasena_api)
+        except Exception as e:
+            print(f"Erro ao normalizar o documento {doc.id}: {str(e)}")
+            conteudo, riqueza = None, -1
+        if conteudo is None:
+            ignorados += 1
+            continue
+
+        documentos_por_concurso.setdefault(numero, []).append(doc.id)
+        candidato = {
+            'id': doc.id,
+            'riqueza': riqueza,
+            'preenchidos': _preenchidos(conteudo),
+            'conteudo': conteudo,
+            'metadados': dados.get('metadados') or {}
+        }
+        atual = melhores.get(numero)
+        if atual is None or (candidato['riqueza'], candidato['preenchidos']) > (atual['riqueza'], atual['preenchidos']):
+            melhores[numero] = candidato
+
+    escritas = []
+    exclusoes = []
+    for numero, melhor in melhores.items():
+        if numero not in ja_migrados:
+            metadados = dict(melhor['metadados'])
+            metadados.pop('concurso', None)
+            metadados.update({
+                'compactado_em': datetime.now().isoformat(),
+                'documento_original': melhor['id']
+            })
+            escritas.append((str(numero), FirebaseService._documento_concurso(
+                FirebaseService._sanitize_data_for_firestore(melhor['conteudo']),
+                FirebaseService._sanitize_data_for_firestore(metadados)
+            )))
+        exclusoes.extend(documentos_por_concurso[numero])
+
+    documentos_concursos = sum(len(ids) for ids in documentos_por_concurso.values())
+    relatorio = {
+        'modo': 'execucao' if executar else 'simulacao',
+        'documentos_lidos': documentos_lidos,
+        'documentos_ignorados': ignorados,
+        'concursos': len(melhores),
+        'concursos_ja_migrados': len(ja_migrados),
+        'documentos_de_concursos': documentos_concursos,
+        'documentos_redundantes': documentos_concursos - len(melhores),
+        'escritas': len(escritas),
+        'exclusoes': len(exclusoes),
+        # Consultas de concursos deixam de varrer estes documentos de scraping_results
+        'leituras_economizadas_por_varredura': documentos_concursos
+    }
+
+    if not executar:
+        return relatorio
+
+    # Gravar os concursos antes de excluir, para nunca perder o único registro de um concurso
+    operacoes = [('set', doc_id, dados) for doc_id, dados in escritas]
+    operacoes += [('delete', doc_id, None) for doc_id in exclusoes]
+    for inicio in range(0, len(operacoes), TAMANHO_BATCH):
+        batch = db.batch()
+        for operacao, doc_id, dados in operacoes[inicio:inicio + TAMANHO_BATCH]:
+            if operacao == 'set':
+                batch.set(colecao_concursos.document(doc_id), dados)
+            else:
+                batch.delete(colecao.document(doc_id))
+        batch.commit()
+        print(f"Compactação: {min(inicio + TAMANHO_BATCH, len(operacoes))}/{len(operacoes)} operações gravadas")
+
+    return relatorio
+
+
+def reconstruir_blocos(executar=False):
+    """
+    Reconstrói os blocos de sorteios (concursos_blocos) a partir da coleção concursos.
+
+    Args:
+        executar: Se False (padrão), apenas simula e retorna o relatório, sem gravar nada
+
+    Returns:
+        Dicionário com o relatório da reconstrução
+    """
+    firebase_scraper = FirebaseService.get_instance()
+    if not firebase_scraper:
+        raise ValueError("Firebase não está disponível")
+    db = firebase_scraper.db
+
+    blocos = {}
+    documentos_lidos = 0
+    for doc in db.collection(COLECAO_CONCURSOS).stream():
+        documentos_lidos += 1
+        documento = doc.to_dict() or {}
+        numero = documento.get('numero')
+        if not numero:
+            continue
+        bloco = FirebaseService.bloco_do_concurso(numero)
+        blocos.setdefault(bloco, {})[str(numero)] = FirebaseService._entrada_bloco(documento)
+
+    relatorio = {
+        'modo': 'execucao' if executar else 'simulacao',
+        'documentos_lidos': documentos_lidos,
+        'blocos': len(blocos),
+        # Ler o histórico completo passa a custar uma leitura por bloco
+        'leituras_economizadas_por_varredura': documentos_lidos - len(blocos)
+    }
+    if not executar:
+        return relatorio
+
+    indices = sorted(blocos)
+    for inicio in range(0, len(indices), TAMANHO_BATCH):
+        batch = db.batch()
+        for bloco in indices[inicio:inicio + TAMANHO_BATCH]:
+            batch.set(db.collection(COLECAO_BLOCOS).document(str(bloco)), {
+                'bloco': bloco,
+                'inicio': bloco * TAMANHO_BLOCO + 1,
+                'fim': (bloco + 1) * TAMANHO_BLOCO,
+                'sorteios': blocos[bloco]
+            })
+        batch.commit()
+    print(f"{len(blocos)} blocos de sorteios gravados")
+
+    return relatorio
+
+
+def numerar_concursos(executar=False):
+    """
+    Atribui números de sequência aos concursos gravados antes da existência da sequência,
+    em ordem crescente de número, para que entrem na sincronização incremental.
+
+    Args:
+        executar: Se False (padrão), apenas simula e retorna o relatório, sem gravar nada
+
+    Returns:
+        Dicionário com o relatório da numeração
+    """
+    firebase_scraper = FirebaseService.get_instance()
+    if not firebase_scraper:
+        raise ValueError("Firebase não está disponível")
+    colecao_concursos = firebase_scraper.db.collection(COLECAO_CONCURSOS)
+
+    documentos_lidos = 0
+    sem_sequencia = []
+    for doc in colecao_concursos.select(['numero', 'sequencia']).stream():
+        documentos_lidos += 1
+        documento = doc.to_dict() or {}
+        if documento.get('sequencia') is None and documento.get('numero'):
+            sem_sequencia.append(documento['numero'])
+    sem_sequencia.sort()
+
+    relatorio = {
+        'modo': 'execucao' if executar else 'simulacao',
+        'documentos_lidos': documentos_lidos,
+        'sem_sequencia': len(sem_sequencia)
+    }
+    if not executar or not sem_sequencia:
+        return relatorio
+
+    primeira, ultima = FirebaseService.numerar_concursos(sem_sequencia)
+    print(f"{len(sem_sequencia)} concursos numerados a partir da sequência {primeira}")
+
+    relatorio['sequencias'] = [primeira, ultima]
+    return relatorio
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compacta os concursos da coleção scraping_results")
+    parser.add_argument('--executar', action='store_true', help="grava as alterações (padrão: apenas simula)")
+    parser.add_argument('--blocos', action='store_true', help="reconstrói os blocos de sorteios a partir da coleção concursos")
+    parser.add_argument('--sequencias', action='store_true', help="numera os concursos sem sequência de alterações")
+    args = parser.parse_args()
+
+    if args.blocos:
+        relatorio = reconstruir_blocos(executar=args.executar)
+    elif args.sequencias:
+        relatorio = numerar_concursos(executar=args.executar)
+    else:
+        relatorio = compactar_resultados(executar=args.executar)
+    print(json.dumps(relatorio, indent=2, ensure_ascii=False))
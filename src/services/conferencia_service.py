@@ -0,0 +1,276 @@
+# -*- coding: utf-8 -*-
+"""
+Conferência em massa de apostas contra os resultados dos concursos.
+
+Cada aposta (6 a 20 dezenas) e cada sorteio são codificados como um inteiro de 60 bits
+(o bit d-1 indica a dezena d). Os acertos de uma aposta são o popcount do AND entre as
+duas máscaras, e a quantidade de senas, quinas e quadras de uma aposta múltipla vem de
+uma tabela pré-calculada indexada por (dezenas apostadas, acertos). As apostas são
+processadas em lotes com numpy, quando disponível.
+"""
+import re
+from math import comb
+from src.megasena_api import MegasenaAPI
+from src.services import historico_store
+from src.services.firebase_service import FAIXAS_PREMIACAO
+
+# Dependência opcional: sem numpy, os lotes são conferidos aposta a aposta
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+MIN_DEZENAS_APOSTA = 6
+MAX_DEZENAS_APOSTA = 20
+# Apostas conferidas por lote e limites da conferência
+TAMANHO_LOTE = 100000
+MAX_CONCURSOS_CONFERENCIA = 100
+MAX_PREMIADAS_PADRAO = 1000
+MAX_ERROS_REGISTRADOS = 50
+
+# Nomes das faixas, na ordem de FAIXAS_PREMIACAO
+NOMES_FAIXAS = ('sena', 'quina', 'quadra')
+
+# PREMIOS_POR_APOSTA[k][h]: quantidade de prêmios (sena, quina, quadra) de uma aposta de
+# k dezenas com h acertos, contando as apostas simples de 6 dezenas contidas nela
+PREMIOS_POR_APOSTA = [
+    [
+        [comb(h, 6 - j) * comb(k - h, j) if h <= k else 0 for j in range(len(FAIXAS_PREMIACAO))]
+        for h in range(7)
+    ]
+    for k in range(MAX_DEZENAS_APOSTA + 1)
+]
+
+_SEPARADORES = re.compile(r'[\s,;\-]+')
+
+
+def codificar_dezenas(dezenas, minimo=MIN_DEZENAS_APOSTA, maximo=MAX_DEZENAS_APOSTA):
+    """
+    Codifica uma lista de dezenas como máscara de 60 bits.
+
+    Args:
+        dezenas: Dezenas (inteiros ou strings) de 1 a 60, sem repetição
+        minimo: Quantidade mínima de dezenas
+        maximo: Quantidade máxima de dezenas
+
+    Returns:
+        Inteiro com o bit d-1 ligado para cada dezena d
+
+    Raises:
+        ValueError: Se houver dezena inválida, repetida ou quantidade fora dos limites
+    """
+    mascara = 0
+    quantidade = 0
+    for dezena in dezenas:
+        numero = int(dezena)
+        if not 1 <= numero <= 60:
+            raise ValueError(f"Dezena inválida: {dezena}")
+        bit = 1 << (numero - 1)
+        if mascara & bit:
+            raise ValueError(f"Dezena repetida: {dezena}")
+        mascara |= bit
+        quantidade += 1
+    if not minimo <= quantidade <= maximo:
+        raise ValueError(f"A aposta deve ter de {minimo} a {maximo} dezenas")
+    return mascara
+
+
+def _dezenas_da_linha(linha):
+    """Extrai as dezenas de uma linha de texto (separadas por espaço, vírgula, ponto e vírgula ou hífen)."""
+    if isinstance(linha, bytes):
+        linha = linha.decode('utf-8', errors='replace')
+    return [parte for parte in _SEPARADORES.split(linha.strip()) if parte]
+
+
+def _codificar_apostas(apostas, erros, contagem):
+    """
+    Codifica as apostas (linhas de texto ou listas de dezenas), ignorando linhas vazias ou
+    de comentário. Gera tuplas (posição da aposta, máscara) e registra as inválidas.
+    """
+    for posicao, aposta in enumerate(apostas, start=1):
+        if isinstance(aposta, (str, bytes)):
+            dezenas = _dezenas_da_linha(aposta)
+            if not dezenas or dezenas[0].startswith('#'):
+                continue
+        else:
+            dezenas = aposta
+        try:
+            mascara = codificar_dezenas(dezenas)
+        except (ValueError, TypeError) as e:
+            contagem['invalidas'] += 1
+            if len(erros) < MAX_ERROS_REGISTRADOS:
+                erros.append({'aposta': posicao, 'erro': str(e)})
+            continue
+        contagem['apostas'] += 1
+        yield posicao, mascara
+
+
+def _lotes(apostas, tamanho_lote):
+    """Agrupa as apostas codificadas em lotes (posições, máscaras)."""
+    posicoes, mascaras = [], []
+    for posicao, mascara in apostas:
+        posicoes.append(posicao)
+        mascaras.append(mascara)
+        if len(mascaras) >= tamanho_lote:
+            yield posicoes, mascaras
+            posicoes, mascaras = [], []
+    if mascaras:
+        yield posicoes, mascaras
+
+
+def _popcount(valores):
+    """Conta os bits ligados de cada elemento de um array uint64."""
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(valores).astype(np.int64)
+    # Contagem paralela de bits (SWAR) para versões do numpy sem bitwise_count
+    valores = valores - ((valores >> np.uint64(1)) & np.uint64(0x5555555555555555))
+    valores = (valores & np.uint64(0x3333333333333333)) + ((valores >> np.uint64(2)) & np.uint64(0x3333333333333333))
+    valores = (valores + (valores >> np.uint64(4))) & np.uint64(0x0F0F0F0F0F0F0F0F)
+    return ((valores * np.uint64(0x0101010101010101)) >> np.uint64(56)).astype(np.int64)
+
+
+def _sorteio_da_entrada(numero, entrada):
+    """Máscara e prêmios individuais de um concurso a partir da entrada compacta do bloco."""
+    premios = list(entrada.get('premios') or [])
+    return {
+        'concurso': numero,
+        'mascara': codificar_dezenas(entrada.get('dezenas') or [], minimo=6, maximo=6),
+        'premios': (premios + [0.0] * len(FAIXAS_PREMIACAO))[:len(FAIXAS_PREMIACAO)]
+    }
+
+
+def _sorteio_do_resultado(resultado):
+    """Máscara e prêmios individuais de um concurso a partir de um resultado formatado."""
+    premiacao = resultado.get('premiacao') or {}
+    return {
+        'concurso': resultado.get('concurso'),
+        'mascara': codificar_dezenas(resultado.get('dezenas') or [], minimo=6, maximo=6),
+        'premios': [(premiacao.get(faixa) or {}).get('premio_individual', 0.0) or 0.0 for faixa in FAIXAS_PREMIACAO]
+    }
+
+
+def obter_sorteios(inicio, fim):
+    """
+    Obtém as máscaras e prêmios dos concursos de um intervalo, do histórico em memória
+    e, para os que faltarem, da MegasenaAPI.
+
+    Raises:
+        ValueError: Se o intervalo for inválido ou maior que MAX_CONCURSOS_CONFERENCIA
+    """
+    if inicio < 1 or fim < inicio:
+        raise ValueError("Intervalo de concursos inválido")
+    if fim - inicio + 1 > MAX_CONCURSOS_CONFERENCIA:
+        raise ValueError(f"A conferência aceita no máximo {MAX_CONCURSOS_CONFERENCIA} concursos")
+
+    try:
+        entradas = historico_store.obter_entradas(inicio, fim)
+    except Exception as e:
+        print(f"Erro ao obter sorteios do histórico em memória: {str(e)}")
+        entradas = {}
+
+    sorteios = []
+    megasena_api = None
+    for numero in range(inicio, fim + 1):
+        if numero in entradas:
+            sorteios.append(_sorteio_da_entrada(numero, entradas[numero]))
+            continue
+        megasena_api = megasena_api or MegasenaAPI()
+        sorteios.append(_sorteio_do_resultado(megasena_api.obter_resultado_formatado(numero)))
+    return sorteios
+
+
+def _conferir_lote_numpy(posicoes, mascaras, sorteios, resumo, premiadas, max_premiadas):
+    """Confere um lote de apostas com operações vetorizadas sobre arrays uint64."""
+    apostas = np.array(mascaras, dtype=np.uint64)
+    tamanhos = _popcount(apostas)
+    tabela = np.array(PREMIOS_POR_APOSTA, dtype=np.int64)
+    for sorteio in sorteios:
+        acertos = _popcount(apostas & np.uint64(sorteio['mascara']))
+        faixas = tabela[tamanhos, acertos]
+        valores = faixas @ np.array(sorteio['premios'], dtype=np.float64)
+
+        indices_premiadas = np.nonzero(acertos >= 4)[0]
+        totais = resumo[sorteio['concurso']]
+        totais['apostas_premiadas'] += len(indices_premiadas)
+        for i, nome in enumerate(NOMES_FAIXAS):
+            totais[nome] += int(faixas[:, i].sum())
+        totais['premio_total'] += float(valores.sum())
+
+        for indice in indices_premiadas:
+            if len(premiadas) >= max_premiadas:
+                break
+            premiadas.append(_premiada(posicoes[indice], sorteio['concurso'], int(acertos[indice]),
+                                       faixas[indice].tolist(), float(valores[indice])))
+
+
+def _conferir_lote_python(posicoes, mascaras, sorteios, resumo, premiadas, max_premiadas):
+    """Confere um lote de apostas uma a uma (sem numpy)."""
+    for sorteio in sorteios:
+        totais = resumo[sorteio['concurso']]
+        for posicao, mascara in zip(posicoes, mascaras):
+            acertos = (mascara & sorteio['mascara']).bit_count()
+            if acertos < 4:
+                continue
+            faixas = PREMIOS_POR_APOSTA[mascara.bit_count()][acertos]
+            valor = sum(quantidade * premio for quantidade, premio in zip(faixas, sorteio['premios']))
+            for i, nome in enumerate(NOMES_FAIXAS):
+                totais[nome] += faixas[i]
+            totais['premio_total'] += valor
+            totais['apostas_premiadas'] += 1
+            if len(premiadas) < max_premiadas:
+                premiadas.append(_premiada(posicao, sorteio['concurso'], acertos, faixas, valor))
+
+
+def _premiada(posicao, concurso, acertos, faixas, valor):
+    """Monta o registro de uma aposta premiada em um concurso."""
+    return {
+        'aposta': posicao,
+        'concurso': concurso,
+        'acertos': acertos,
+        **{nome: int(faixas[i]) for i, nome in enumerate(NOMES_FAIXAS)},
+        'premio': round(valor, 2)
+    }
+
+
+def conferir_apostas(apostas, inicio, fim=None, max_premiadas=MAX_PREMIADAS_PADRAO, tamanho_lote=TAMANHO_LOTE):
+    """
+    Confere apostas contra um concurso ou um intervalo de concursos.
+
+    Args:
+        apostas: Iterável de apostas: linhas de texto (ex.: um stream de upload) ou listas de dezenas
+        inicio: Primeiro concurso
+        fim: Último concurso (padrão: apenas o concurso inicial)
+        max_premiadas: Número máximo de apostas premiadas listadas na resposta
+        tamanho_lote: Quantidade de apostas conferidas por lote
+
+    Returns:
+        Dicionário com os totais por concurso e as apostas premiadas (posição na entrada,
+        concurso, acertos, prêmios por faixa e valor)
+    """
+    sorteios = obter_sorteios(inicio, fim if fim is not None else inicio)
+    resumo = {
+        sorteio['concurso']: {'apostas_premiadas': 0, **{nome: 0 for nome in NOMES_FAIXAS}, 'premio_total': 0.0}
+        for sorteio in sorteios
+    }
+    premiadas = []
+    erros = []
+    contagem = {'apostas': 0, 'invalidas': 0}
+    conferir_lote = _conferir_lote_numpy if np is not None else _conferir_lote_python
+
+    for posicoes, mascaras in _lotes(_codificar_apostas(apostas, erros, contagem), tamanho_lote):
+        conferir_lote(posicoes, mascaras, sorteios, resumo, premiadas, max_premiadas)
+
+    total_premiadas = sum(totais['apostas_premiadas'] for totais in resumo.values())
+    return {
+        'status': 'success',
+        'concursos': [sorteio['concurso'] for sorteio in sorteios],
+        'total_apostas': contagem['apostas'],
+        'apostas_invalidas': contagem['invalidas'],
+        'erros': erros,
+        'resumo': [{'concurso': numero, **totais, 'premio_total': round(totais['premio_total'], 2)}
+                   for numero, totais in resumo.items()],
+        'premio_total': round(sum(totais['premio_total'] for totais in resumo.values()), 2),
+        'apostas_premiadas': total_premiadas,
+        'premiadas': premiadas,
+        'premiadas_truncadas': total_premiadas > len(premiadas)
+    }
@@ -0,0 +1,226 @@
+# -*- coding: utf-8 -*-
+"""
+Estatísticas de coocorrência de pares e trios de dezenas.
+
+O histórico em memória é mantido como uma matriz de incidência (uma linha por concurso,
+60 colunas) e, para os trios, como os 20 índices combinatórios dos trios de cada sorteio.
+A contagem de pares de uma janela é incidênciaᵀ·incidência; a de trios, uma contagem dos
+índices. Para que janelas arbitrárias não recontem o histórico inteiro, são guardados
+snapshots cumulativos a cada TAMANHO_SNAPSHOT concursos: a contagem até o concurso n é o
+snapshot anterior mais no máximo TAMANHO_SNAPSHOT - 1 linhas, e a de uma janela é a
+diferença entre duas contagens cumulativas.
+
+O motor é atualizado incrementalmente por um observador do historico_store: um concurso
+novo ou corrigido invalida apenas os snapshots a partir do seu bloco.
+"""
+import threading
+from itertools import combinations
+from src.services import historico_store
+
+# Dependência opcional: sem numpy, as contagens são feitas sorteio a sorteio na janela pedida
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+TAMANHO_SNAPSHOT = 100
+TOP_PADRAO = 10
+TOP_MAXIMO = 100
+TOTAL_TRIOS = 34220  # C(60, 3)
+
+_estado = {
+    'incidencia': None,   # matriz (capacidade × 60) uint8; a linha n é o concurso n
+    'trios': None,        # matriz (capacidade × 20) int32 com os índices dos trios de cada concurso
+    'sorteios': {},       # numero -> dezenas, para o cálculo sem numpy
+    'ultimo': 0,
+    'snapshots': [],      # snapshots[b] = (pares, trios) cumulativos até o concurso b * TAMANHO_SNAPSHOT
+    'construido': False
+}
+_lock = threading.Lock()
+_tabelas = {}
+
+
+def _tabelas_trios():
+    """Tabelas de conversão entre trios de dezenas (base 0) e índices combinatórios."""
+    if not _tabelas:
+        trios = np.array(list(combinations(range(60), 3)), dtype=np.int32)
+        indice = np.full((60, 60, 60), -1, dtype=np.int32)
+        indice[trios[:, 0], trios[:, 1], trios[:, 2]] = np.arange(len(trios), dtype=np.int32)
+        _tabelas['trios'] = trios
+        _tabelas['indice'] = indice
+        _tabelas['posicoes'] = np.array(list(combinations(range(6), 3)), dtype=np.int32)
+    return _tabelas
+
+
+def _garantir_capacidade(numero):
+    capacidade = 0 if _estado['incidencia'] is None else _estado['incidencia'].shape[0]
+    if numero < capacidade:
+        return
+    nova = max(numero + 1, capacidade * 2, 4096)
+    incidencia = np.zeros((nova, 60), dtype=np.uint8)
+    trios = np.zeros((nova, 20), dtype=np.int32)
+    if capacidade:
+        incidencia[:capacidade] = _estado['incidencia']
+        trios[:capacidade] = _estado['trios']
+    _estado['incidencia'] = incidencia
+    _estado['trios'] = trios
+
+
+def _aplicar(sorteios, completo=False):
+    """Atualiza o motor com os concursos alterados no histórico (observador do historico_store)."""
+    with _lock:
+        if completo:
+            _estado.update({'incidencia': None, 'trios': None, 'sorteios': {}, 'ultimo': 0,
+                            'snapshots': [], 'construido': True})
+        menor_alterado = None
+        for numero, entrada in sorteios.items():
+            numero = int(numero)
+            dezenas = sorted(int(dezena) for dezena in entrada.get('dezenas') or [])
+            if len(dezenas) != 6:
+                continue
+            _estado['sorteios'][numero] = dezenas
+            _estado['ultimo'] = max(_estado['ultimo'], numero)
+            menor_alterado = numero if menor_alterado is None else min(menor_alterado, numero)
+            if np is None:
+                continue
+            _garantir_capacidade(numero)
+            base_zero = np.array(dezenas, dtype=np.int32) - 1
+            _estado['incidencia'][numero] = 0
+            _estado['incidencia'][numero, base_zero] = 1
+            tabelas = _tabelas_trios()
+            escolhidas = base_zero[tabelas['posicoes']]
+            _estado['trios'][numero] = tabelas['indice'][escolhidas[:, 0], escolhidas[:, 1], escolhidas[:, 2]]
+        if menor_alterado is not None:
+            # Snapshots que incluem o concurso alterado deixam de valer
+            validos = -(-menor_alterado // TAMANHO_SNAPSHOT)
+            del _estado['snapshots'][validos:]
+
+
+historico_store.registrar_observador(_aplicar)
+
+
+def _garantir_construido():
+    """Carrega o histórico (o que constrói o motor) e o mantém em dia com concursos novos."""
+    historico_store.atualizar()
+    if not _estado['construido']:
+        ultimo = historico_store.ultimo_numero()
+        if not _estado['construido']:
+            # O histórico já estava carregado antes do registro do observador
+            _aplicar(historico_store.obter_entradas(1, ultimo or 0), completo=True)
+
+
+def _contagem_linhas(inicio, fim):
+    """Contagens de pares e trios dos concursos inicio..fim (inclusive), direto da matriz."""
+    inicio = max(1, inicio)
+    fim = min(fim, _estado['incidencia'].shape[0] - 1)
+    if fim < inicio:
+        return np.zeros((60, 60), dtype=np.int64), np.zeros(TOTAL_TRIOS, dtype=np.int64)
+    linhas = _estado['incidencia'][inicio:fim + 1].astype(np.int32)
+    presentes = linhas.any(axis=1)
+    pares = (linhas.T @ linhas).astype(np.int64)
+    trios = np.bincount(_estado['trios'][inicio:fim + 1][presentes].ravel(), minlength=TOTAL_TRIOS).astype(np.int64)
+    return pares, trios
+
+
+def _cumulativa(numero):
+    """Contagens de pares e trios dos concursos 1..numero, a partir do snapshot anterior."""
+    if numero < 1 or _estado['incidencia'] is None:
+        return np.zeros((60, 60), dtype=np.int64), np.zeros(TOTAL_TRIOS, dtype=np.int64)
+    bloco = numero // TAMANHO_SNAPSHOT
+    snapshots = _estado['snapshots']
+    if not snapshots:
+        snapshots.append((np.zeros((60, 60), dtype=np.int64), np.zeros(TOTAL_TRIOS, dtype=np.int64)))
+    while len(snapshots) <= bloco:
+        anterior = len(snapshots) - 1
+        pares, trios = _contagem_linhas(anterior * TAMANHO_SNAPSHOT + 1, (anterior + 1) * TAMANHO_SNAPSHOT)
+        snapshots.append((snapshots[anterior][0] + pares, snapshots[anterior][1] + trios))
+    pares, trios = _contagem_linhas(bloco * TAMANHO_SNAPSHOT + 1, numero)
+    return snapshots[bloco][0] + pares, snapshots[bloco][1] + trios
+
+
+def _ranking(valores, rotulos, top, decrescente):
+    """Os `top` itens de maior (ou menor) contagem, desempatados pela ordem das dezenas."""
+    chave = -valores if decrescente else valores
+    if top < len(valores):
+        # argpartition não garante o desempate: considerar todos os empatados no limite
+        limite = chave[np.argpartition(chave, top - 1)[:top]].max()
+        candidatos = np.nonzero(chave <= limite)[0]
+    else:
+        candidatos = np.arange(len(valores))
+    ordem = candidatos[np.lexsort((candidatos, chave[candidatos]))][:top]
+    return [
+        {'dezenas': [f"{int(dezena) + 1:02d}" for dezena in rotulos[i]], 'ocorrencias': int(valores[i])}
+        for i in ordem
+    ]
+
+
+def _contagens_sem_numpy(inicio, fim, tamanho):
+    """Contagens da janela sorteio a sorteio, quando numpy não está disponível."""
+    contagens = {combinacao: 0 for combinacao in combinations(range(60), tamanho)}
+    for numero in range(inicio, fim + 1):
+        dezenas = _estado['sorteios'].get(numero)
+        if dezenas:
+            for combinacao in combinations([dezena - 1 for dezena in dezenas], tamanho):
+                contagens[combinacao] += 1
+    return contagens
+
+
+def obter_coocorrencia(tamanho=2, inicio=None, fim=None, top=TOP_PADRAO, ultimos=None):
+    """
+    Obtém os pares (tamanho=2) ou trios (tamanho=3) de dezenas mais e menos frequentes.
+
+    Args:
+        tamanho: 2 para pares, 3 para trios
+        inicio: Primeiro concurso da janela (padrão: 1)
+        fim: Último concurso da janela (padrão: o último do histórico)
+        top: Quantidade de combinações em cada ranking
+        ultimos: Janela com os últimos N concursos (alternativa a inicio/fim)
+
+    Returns:
+        Dicionário com a janela analisada e os rankings mais_frequentes e menos_frequentes
+    """
+    if tamanho not in (2, 3):
+        raise ValueError("O tamanho deve ser 2 (pares) ou 3 (trios)")
+    top = max(1, min(TOP_MAXIMO, top or TOP_PADRAO))
+
+    _garantir_construido()
+    with _lock:
+        ultimo = _estado['ultimo']
+        fim = min(fim or ultimo, ultimo)
+        inicio = max(1, fim - ultimos + 1 if ultimos else inicio or 1)
+        if not ultimo or fim < inicio:
+            raise ValueError("Intervalo de concursos inválido")
+        analisados = sum(1 for numero in _estado['sorteios'] if inicio <= numero <= fim)
+
+        if np is None:
+            contagens = _contagens_sem_numpy(inicio, fim, tamanho)
+            rotulos = list(contagens)
+            valores = [contagens[rotulo] for rotulo in rotulos]
+            mais = sorted(range(len(rotulos)), key=lambda i: (-valores[i], i))[:top]
+            menos = sorted(range(len(rotulos)), key=lambda i: (valores[i], i))[:top]
+            rankings = [
+                [{'dezenas': [f"{dezena + 1:02d}" for dezena in rotulos[i]], 'ocorrencias': valores[i]} for i in indices]
+                for indices in (mais, menos)
+            ]
+        else:
+            pares_fim, trios_fim = _cumulativa(fim)
+            pares_inicio, trios_inicio = _cumulativa(inicio - 1)
+            if tamanho == 2:
+                linhas, colunas = np.triu_indices(60, 1)
+                valores = (pares_fim - pares_inicio)[linhas, colunas]
+                rotulos = np.stack([linhas, colunas], axis=1)
+            else:
+                valores = trios_fim - trios_inicio
+                rotulos = _tabelas_trios()['trios']
+            rankings = [_ranking(valores, rotulos, top, decrescente) for decrescente in (True, False)]
+
+    return {
+        'status': 'success',
+        'tamanho': tamanho,
+        'inicio': inicio,
+        'fim': fim,
+        'concursos_analisados': analisados,
+        'mais_frequentes': rankings[0],
+        'menos_frequentes': rankings[1],
+        'ultimo_concurso': ultimo
+    }
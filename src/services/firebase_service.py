@@ -1,7 +1,7 @@
 # -*- coding: utf-8 -*-
 import os
 import json
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 from google.cloud import firestore
 from google.api_core.datetime_helpers import DatetimeWithNanoseconds
 
@@ -44,6 +44,38 @@ class FirestoreEncoder(json.JSONEncoder):
                     
         return super().default(obj)
 
+# Coleção dedicada aos resultados dos concursos, com ID do documento igual ao número
+COLECAO_CONCURSOS = 'concursos'
+
+# Campos do resultado formatado copiados para o documento do concurso
+CAMPOS_CONCURSO = (
+    'data_sorteio', 'data_proximo_concurso', 'dezenas', 'dezenas_ordem_sorteio', 'premiacao',
+    'cidades_ganhadoras', 'acumulado', 'valor_arrecadado', 'valor_estimado_proximo_concurso',
+    'valor_acumulado_proximo_concurso', 'local_sorteio', 'local_gps'
+)
+
+# Blocos com os sorteios de TAMANHO_BLOCO concursos consecutivos em um único documento,
+# para que o histórico completo seja lido com poucas dezenas de leituras
+COLECAO_BLOCOS = 'concursos_blocos'
+TAMANHO_BLOCO = 100
+# Faixas de premiação guardadas nos blocos, na ordem dos arrays ganhadores/premios
+FAIXAS_PREMIACAO = ('6 acertos', '5 acertos', '4 acertos')
+
+# Índice de cobertura: bitset dos números dos concursos salvos em um único documento.
+# Cada gravação acrescenta o número em 'recentes' (ArrayUnion, sem leitura) e
+# incorporar_cobertura os funde periodicamente no bitset compacto 'bits'
+COLECAO_INDICES = 'indices'
+DOCUMENTO_COBERTURA = 'cobertura_concursos'
+# Contador da sequência de alterações da coleção concursos: cada gravação recebe o próximo
+# número (campo sequencia), e réplicas sincronizam pedindo o que mudou após o último visto
+DOCUMENTO_SEQUENCIA = 'sequencia_concursos'
+# Concursos gravados por transação: uma transação aceita até 500 gravações, e cada grupo grava
+# também o contador, os blocos e os índices de cobertura e de cidades
+MAX_CONCURSOS_POR_TRANSACAO = 400
+# Índice das cidades ganhadoras da sena: mapa "UF|CIDADE" -> {uf, cidade, concursos: {numero: ganhadores}},
+# mesclado a cada gravação de concurso (regravar um concurso apenas sobrescreve a sua entrada)
+DOCUMENTO_CIDADES = 'cidades_ganhadoras'
+
 class FirebaseService:
     _instance = None
     
@@ -103,8 +135,13 @@ class FirebaseService:
                 def __init__(self):
                     self.db = db
                 
-                def salvar_resultado(self, url, conteudo, metadados=None):
-                    """Salva um resultado no Firestore."""
+                def salvar_resultado(self, url, conteudo, metadados=None, chave_idempotencia=None):
+                    """
+                    Salva um resultado no Firestore.
+                    
+                    Com uma chave de idempotência, o documento recebe um ID derivado dela e é
+                    criado atomicamente: se já existir, nada é gravado e o documento existente é informado.
+                    """
                     try:
                         # Adicionar timestamp à metadados
                         if metadados is None:
@@ -120,8 +157,22 @@ class FirebaseService:
                         }
                         
                         # Salvar no Firestore
-                        doc_ref = self.db.collection('scraping_results').document()
-                        doc_ref.set(doc_data)
+                        if chave_idempotencia:
+                            from google.api_core.exceptions import Conflict
+                            
+                            doc_ref = self.db.collection('scraping_results').document(chave_idempotencia)
+                            try:
+                                doc_ref.create(doc_data)
+                            except Conflict:
+                                return {
+                                    'status': 'success',
+                                    'id': doc_ref.id,
+                                    'duplicado': True,
+                                    'message': 'Resultado já existente para a chave de idempotência'
+                                }
+                        else:
+                            doc_ref = self.db.collection('scraping_results').document()
+                            doc_ref.set(doc_data)
                         
                         return {
                             'status': 'success',
@@ -182,14 +233,8 @@ class FirebaseService:
                         bool: True se o concurso já existe, False caso contrário
                     """
                     try:
-                        from google.cloud.firestore_v1.base_query import FieldFilter
-                        
-                        collection_ref = self.db.collection('scraping_results')
-                        query = collection_ref.where(filter=FieldFilter('metadados.concurso', '==', num_concurso))
-                        
-                        # Verificar se existe pelo menos um documento
-                        docs = query.limit(1).get()
-                        return len(docs) > 0
+                        # O ID do documento é o número do concurso: uma leitura direta basta
+                        return self.db.collection(COLECAO_CONCURSOS).document(str(int(num_concurso))).get().exists
                         
                     except Exception as e:
                         print(f"Erro ao verificar se concurso {num_concurso} já existe: {str(e)}")
@@ -267,13 +312,11 @@ class FirebaseService:
                                 dados = megasena_api.obter_resultado_formatado(num_concurso)
                                 
                                 # Salvar no Firestore
-                                resultado = self.salvar_resultado(
-                                    url=f"megasena/concursos/{num_concurso}",
-                                    conteudo=dados,
+                                resultado = FirebaseService.salvar_concurso(
+                                    dados,
                                     metadados={
                                         'fonte': 'api_caixa',
                                         'importacao_automatica': True,
-                                        'concurso': num_concurso,
                                         'data_importacao': datetime.now().isoformat()
                                     }
                                 )
@@ -283,10 +326,6 @@ class FirebaseService:
                                     'id': resultado.get('id')
                                 })
                                 
-                                # Aguardar um pouco para não sobrecarregar a API
-                                import time
-                                time.sleep(0.5)
-                                
                             except Exception as e:
                                 print(f"Erro ao importar concurso {num_concurso}: {str(e)}")
                                 concursos_com_erro.append({
@@ -313,45 +352,9 @@ class FirebaseService:
                     Obtém o histórico de concursos da Megasena ordenados por data de sorteio decrescente.
                     """
                     # Reutilizar o método buscar_historico_concursos_ordenado do FirebaseService
-                    try:
-                        from src.services.firebase_service import FirebaseService
-                        resultados = FirebaseService.buscar_historico_concursos_ordenado(limite)
-                        
-                        if resultados:
-                            print(f"Encontrados {len(resultados)} concursos pela função obter_historico_megasena")
-                            return resultados
-                        
-                        # Se não encontrou nada, usar a busca direta
-                        print("Tentando busca direta por concursos no Firestore")
-                        from google.cloud.firestore_v1.base_query import FieldFilter
-                        
-                        # Criar a query para buscar documentos onde conteudo.concurso existe
-                        collection_ref = self.db.collection('scraping_results')
-                        
-                        # Primeiro, verificamos se o campo conteudo.concurso existe
-                        query = collection_ref.where(filter=FieldFilter('metadados.fonte', '==', 'api_caixa'))
-                        
-                        # Limitar o número de resultados
-                        query = query.limit(limite)
-                        
-                        # Executar a query
-                        docs = query.get()
-                        
-                        # Processar os resultados
-                        resultados = []
-                        for doc in docs:
-                            data = doc.to_dict()
-                            resultados.append({
-                                'id': doc.id,
-                                'conteudo': data.get('conteudo', {}),
-                                'metadados': data.get('metadados', {})
-                            })
-                        
-                        print(f"Encontrados {len(resultados)} concursos com busca alternativa")
-                        return resultados
-                    except Exception as e:
-                        print(f"Erro ao buscar histórico de concursos: {str(e)}")
-                        return []
+                    resultados = FirebaseService.buscar_historico_concursos_ordenado(limite)
+                    print(f"Encontrados {len(resultados)} concursos pela função obter_historico_megasena")
+                    return resultados
             
             # Criar e retornar a instância
             firebase_scraper = FirebaseScraper()
@@ -428,8 +431,8 @@ class FirebaseService:
         return str(data)
     
     @staticmethod
-    def salvar_resultado(url, conteudo, metadados=None):
-        """Salva um resultado no Firestore."""
+    def salvar_resultado(url, conteudo, metadados=None, chave_idempotencia=None):
+        """Salva um resultado no Firestore (sem duplicar, se houver chave de idempotência)."""
         firebase_scraper = FirebaseService.get_instance()
         if not firebase_scraper:
             raise ValueError("Firebase não está disponível")
@@ -439,17 +442,649 @@ class FirebaseService:
         metadados_sanitizados = FirebaseService._sanitize_data_for_firestore(metadados) if metadados else None
         
         try:
-            return firebase_scraper.salvar_resultado(url, conteudo_sanitizado, metadados_sanitizados)
+            return firebase_scraper.salvar_resultado(url, conteudo_sanitizado, metadados_sanitizados, chave_idempotencia)
         except Exception as e:
             print(f"Erro ao salvar resultado: {str(e)}")
             # Tentar serializar para JSON e depois deserializar como último recurso
             try:
                 json_str = json.dumps(conteudo, cls=FirestoreEncoder)
                 conteudo_json = json.loads(json_str)
-                return firebase_scraper.salvar_resultado(url, conteudo_json, metadados_sanitizados)
+                return firebase_scraper.salvar_resultado(url, conteudo_json, metadados_sanitizados, chave_idempotencia)
             except Exception as e2:
                 raise ValueError(f"Erro ao salvar dados no Firestore após sanitização: {str(e2)}")
     
+    @staticmethod
+    def _documento_concurso(conteudo, metadados=None):
+        """
+        Converte um resultado formatado (formatar_resultado) no documento da coleção concursos.
+        
+        O número, a data e as dezenas (ordenadas, com dois dígitos) ficam no nível superior,
+        onde são indexados.
+        """
+        documento = {campo: conteudo.get(campo) for campo in CAMPOS_CONCURSO if campo in conteudo}
+        documento['numero'] = int(conteudo.get('concurso') or conteudo.get('numero'))
+        documento['dezenas'] = sorted(f"{int(dezena):02d}" for dezena in conteudo.get('dezenas') or [])
+        documento['metadados'] = dict(metadados or {})
+        documento['metadados']['atualizado_em'] = datetime.now().isoformat()
+        return documento
+    
+    @staticmethod
+    def _conteudo_concurso(documento):
+        """Converte um documento da coleção concursos de volta no formato de formatar_resultado."""
+        conteudo = {campo: documento.get(campo) for campo in CAMPOS_CONCURSO if campo in documento}
+        conteudo['concurso'] = documento.get('numero')
+        return conteudo
+    
+    @staticmethod
+    def bloco_do_concurso(numero_concurso):
+        """Retorna o índice do bloco (documento de concursos_blocos) que contém o concurso."""
+        return (int(numero_concurso) - 1) // TAMANHO_BLOCO
+    
+    @staticmethod
+    def _entrada_bloco(documento):
+        """
+        Monta a entrada compacta de um concurso dentro do bloco: data, dezenas como inteiros
+        e arrays de ganhadores e prêmios alinhados com FAIXAS_PREMIACAO.
+        """
+        premiacao = documento.get('premiacao') or {}
+        return {
+            'data': documento.get('data_sorteio'),
+            'dezenas': [int(dezena) for dezena in documento.get('dezenas') or []],
+            'ganhadores': [(premiacao.get(faixa) or {}).get('ganhadores', 0) for faixa in FAIXAS_PREMIACAO],
+            'premios': [(premiacao.get(faixa) or {}).get('premio_individual', 0.0) for faixa in FAIXAS_PREMIACAO],
+            'acumulado': documento.get('acumulado', False),
+            'arrecadado': documento.get('valor_arrecadado', 0.0),
+            'acumulado_proximo': documento.get('valor_acumulado_proximo_concurso', 0.0),
+            'estimativa_proximo': documento.get('valor_estimado_proximo_concurso', 0.0)
+        }
+    
+    @staticmethod
+    def buscar_blocos(bloco_inicial=None, bloco_final=None):
+        """
+        Lê os blocos de sorteios, todos ou apenas os de um intervalo de índices.
+        
+        Args:
+            bloco_inicial: Primeiro bloco a ler (padrão: o primeiro)
+            bloco_final: Último bloco a ler (padrão: o último)
+            
+        Returns:
+            Dicionário {numero do concurso: entrada compacta}
+        """
+        from google.cloud.firestore_v1.base_query import FieldFilter
+        
+        firebase_scraper = FirebaseService.get_instance()
+        if not firebase_scraper:
+            raise ValueError("Firebase não está disponível")
+        
+        query = firebase_scraper.db.collection(COLECAO_BLOCOS)
+        if bloco_inicial is not None:
+            query = query.where(filter=FieldFilter('bloco', '>=', int(bloco_inicial)))
+        if bloco_final is not None:
+            query = query.where(filter=FieldFilter('bloco', '<=', int(bloco_final)))
+        
+        sorteios = {}
+        for doc in query.stream():
+            for numero, entrada in (doc.to_dict().get('sorteios') or {}).items():
+                sorteios[int(numero)] = entrada
+        return sorteios
+    
+    @staticmethod
+    def _colecao_concursos():
+        firebase_scraper = FirebaseService.get_instance()
+        if not firebase_scraper:
+            raise ValueError("Firebase não está disponível")
+        return firebase_scraper.db.collection(COLECAO_CONCURSOS)
+    
+    @staticmethod
+    def salvar_concurso(conteudo, metadados=None):
+        """
+        Salva o resultado de um concurso na coleção concursos e no seu bloco de sorteios.
+        
+        O ID do documento é o número do concurso, então salvar o mesmo concurso
+        novamente apenas o sobrescreve, sem duplicar (ver salvar_concursos).
+        
+        Args:
+            conteudo: Resultado formatado do concurso (formatar_resultado)
+            metadados: Informações sobre a origem do dado (fonte, importação etc.)
+            
+        Returns:
+            Dicionário com o status, o ID do documento e a sequência atribuída
+        """
+        return FirebaseService.salvar_concursos([conteudo], metadados)[0]
+    
+    @staticmethod
+    def salvar_concursos(conteudos, metadados=None):
+        """
+        Salva vários concursos na coleção concursos, nos seus blocos de sorteios e nos índices.
+        
+        Os concursos são gravados em transações de até MAX_CONCURSOS_POR_TRANSACAO. Cada
+        transação lê o contador de sequência uma única vez e grava, junto com ele, os documentos
+        dos concursos (com sequências consecutivas e o horário de atualização do servidor), as
+        entradas dos concursos nos blocos, mescladas (merge) sem ler os blocos antes, os números
+        no índice de cobertura e as cidades ganhadoras no índice de cidades.
+        
+        Como a sequência é atribuída na mesma transação que grava os documentos, a ordem das
+        sequências é a ordem em que as gravações se tornam visíveis: buscar_alteracoes nunca
+        retorna uma sequência enquanto outra menor ainda pode ser gravada. Importações e reparos
+        gravam um lote inteiro por transação, e não uma transação por concurso.
+        
+        Args:
+            conteudos: Resultados formatados dos concursos (formatar_resultado)
+            metadados: Informações sobre a origem dos dados (fonte, importação etc.)
+            
+        Returns:
+            Lista com o status, o ID do documento e a sequência de cada concurso, na ordem
+            recebida (um concurso repetido é gravado uma vez, com o último conteúdo)
+        """
+        metadados = FirebaseService._sanitize_data_for_firestore(metadados) if metadados else None
+        documentos = {}
+        for conteudo in conteudos:
+            documento = FirebaseService._documento_concurso(FirebaseService._sanitize_data_for_firestore(conteudo), metadados)
+            documentos.pop(documento['numero'], None)
+            documentos[documento['numero']] = documento
+        documentos = list(documentos.values())
+        
+        db = FirebaseService.get_instance().db
+        colecao = db.collection(COLECAO_CONCURSOS)
+        sequencia_ref = db.collection(COLECAO_INDICES).document(DOCUMENTO_SEQUENCIA)
+        
+        resultados = []
+        for inicio in range(0, len(documentos), MAX_CONCURSOS_POR_TRANSACAO):
+            grupo = documentos[inicio:inicio + MAX_CONCURSOS_POR_TRANSACAO]
+            
+            # Entradas dos blocos e do índice de cidades agrupadas: uma gravação por documento
+            entradas, blocos, cidades = {}, {}, {}
+            for documento in grupo:
+                numero = documento['numero']
+                entradas[numero] = FirebaseService._entrada_bloco(documento)
+                blocos.setdefault(FirebaseService.bloco_do_concurso(numero), {})[str(numero)] = entradas[numero]
+                for chave, entrada in FirebaseService.entradas_cidades(numero, documento.get('cidades_ganhadoras')).items():
+                    existente = cidades.setdefault(chave, {'uf': entrada['uf'], 'cidade': entrada['cidade'], 'concursos': {}})
+                    existente['concursos'].update(entrada['concursos'])
+            
+            @firestore.transactional
+            def _salvar(transaction):
+                contador = sequencia_ref.get(transaction=transaction)
+                primeira = ((contador.to_dict() or {}).get('valor') or 0) + 1
+                transaction.set(sequencia_ref, {'valor': primeira + len(grupo) - 1})
+                for deslocamento, documento in enumerate(grupo):
+                    transaction.set(colecao.document(str(documento['numero'])), {
+                        **documento,
+                        'sequencia': primeira + deslocamento,
+                        'atualizado_em': firestore.SERVER_TIMESTAMP
+                    })
+                for bloco, sorteios in blocos.items():
+                    transaction.set(db.collection(COLECAO_BLOCOS).document(str(bloco)), {
+                        'bloco': bloco,
+                        'inicio': bloco * TAMANHO_BLOCO + 1,
+                        'fim': (bloco + 1) * TAMANHO_BLOCO,
+                        'sorteios': sorteios
+                    }, merge=True)
+                transaction.set(FirebaseService._ref_cobertura(), {'recentes': firestore.ArrayUnion(list(entradas))}, merge=True)
+                if cidades:
+                    transaction.set(FirebaseService._ref_cidades(), {'cidades': cidades}, merge=True)
+                return primeira
+            
+            primeira = _salvar(db.transaction())
+            
+            # Manter o histórico em memória deste processo atualizado
+            from src.services import historico_store
+            historico_store.atualizar_concursos(entradas)
+            
+            resultados.extend({
+                'status': 'success',
+                'id': str(documento['numero']),
+                'sequencia': primeira + deslocamento,
+                'message': 'Concurso salvo com sucesso'
+            } for deslocamento, documento in enumerate(grupo))
+        return resultados
+    
+    @staticmethod
+    def buscar_concurso(numero_concurso):
+        """
+        Busca um concurso pelo número, com a leitura direta de um único documento.
+        
+        Args:
+            numero_concurso: Número do concurso
+            
+        Returns:
+            Resultado formatado do concurso ou None se não existir
+        """
+        doc = FirebaseService._colecao_concursos().document(str(int(numero_concurso))).get()
+        if not doc.exists:
+            return None
+        return FirebaseService._conteudo_concurso(doc.to_dict())
+    
+    @staticmethod
+    def buscar_ultimos_concursos(limite=10):
+        """
+        Busca os concursos mais recentes, ordenados pelo número de forma decrescente.
+        
+        Args:
+            limite: Número máximo de concursos
+            
+        Returns:
+            Lista de resultados formatados
+        """
+        query = (FirebaseService._colecao_concursos()
+                 .order_by('numero', direction=firestore.Query.DESCENDING)
+                 .limit(limite))
+        return [FirebaseService._conteudo_concurso(doc.to_dict()) for doc in query.stream()]
+    
+    @staticmethod
+    def buscar_historico_paginado(quantidade, antes_de=None, campos=None, com_metadados=False):
+        """
+        Busca uma página do histórico, do concurso mais recente para o mais antigo.
+        
+        A página seguinte começa depois do último número retornado (start_after no campo
+        indexado numero), então o custo de cada página não depende da sua profundidade.
+        
+        Args:
+            quantidade: Tamanho da página
+            antes_de: Número do último concurso da página anterior (None para a primeira página)
+            campos: Campos do resultado a retornar (select); None retorna o documento completo
+            com_metadados: Se True, retorna também os metadados gravados com cada concurso
+            
+        Returns:
+            Lista de resultados formatados, apenas com os campos pedidos (ou de tuplas
+            (resultado, metadados) com com_metadados)
+        """
+        query = FirebaseService._colecao_concursos().order_by('numero', direction=firestore.Query.DESCENDING)
+        if antes_de is not None:
+            query = query.start_after({'numero': int(antes_de)})
+        if campos:
+            # O campo numero é sempre lido, pois identifica o concurso e forma o cursor
+            query = query.select(['numero'] + [campo for campo in campos if campo in CAMPOS_CONCURSO])
+        
+        resultados = []
+        for doc in query.limit(quantidade).stream():
+            documento = doc.to_dict()
+            conteudo = FirebaseService._conteudo_concurso(documento)
+            if campos:
+                conteudo = {campo: conteudo.get(campo) for campo in ['concurso'] + list(campos) if campo in conteudo}
+            if com_metadados:
+                conteudo = (conteudo, {**(documento.get('metadados') or {}), 'concurso': conteudo['concurso']})
+            resultados.append(conteudo)
+        return resultados
+    
+    @staticmethod
+    def buscar_concursos_intervalo(inicio, fim):
+        """
+        Busca os concursos de um intervalo de números, em ordem crescente.
+        
+        Args:
+            inicio: Primeiro concurso do intervalo
+            fim: Último concurso do intervalo
+            
+        Returns:
+            Lista de resultados formatados
+        """
+        from google.cloud.firestore_v1.base_query import FieldFilter
+        
+        query = (FirebaseService._colecao_concursos()
+                 .where(filter=FieldFilter('numero', '>=', int(inicio)))
+                 .where(filter=FieldFilter('numero', '<=', int(fim)))
+                 .order_by('numero'))
+        return [FirebaseService._conteudo_concurso(doc.to_dict()) for doc in query.stream()]
+    
+    @staticmethod
+    def numeros_concursos_existentes(inicio, fim):
+        """
+        Retorna os números dos concursos já salvos em um intervalo, lendo apenas o campo numero.
+        
+        Args:
+            inicio: Primeiro concurso do intervalo
+            fim: Último concurso do intervalo
+            
+        Returns:
+            Conjunto com os números dos concursos existentes
+        """
+        from google.cloud.firestore_v1.base_query import FieldFilter
+        
+        query = (FirebaseService._colecao_concursos()
+                 .where(filter=FieldFilter('numero', '>=', int(inicio)))
+                 .where(filter=FieldFilter('numero', '<=', int(fim)))
+                 .select(['numero']))
+        return {doc.to_dict().get('numero') for doc in query.stream()}
+    
+    @staticmethod
+    def buscar_alteracoes(desde=0, limite=500):
+        """
+        Busca os concursos gravados ou alterados depois de uma marca d'água (sincronização
+        incremental de réplicas), com uma consulta de intervalo no campo indexado sequencia.
+        
+        As sequências são atribuídas na mesma transação que grava os concursos
+        (salvar_concursos, numerar_concursos), então uma marca d'água nunca passa por uma
+        sequência que ainda será gravada.
+        
+        Args:
+            desde: Última sequência já recebida pela réplica (0 para começar do início)
+            limite: Número máximo de concursos retornados
+            
+        Returns:
+            Dicionário com os concursos alterados (em ordem de sequência), a nova marca
+            d'água e se há mais alterações a buscar
+        """
+        from google.cloud.firestore_v1.base_query import FieldFilter
+        
+        query = (FirebaseService._colecao_concursos()
+                 .where(filter=FieldFilter('sequencia', '>', int(desde)))
+                 .order_by('sequencia')
+                 .limit(limite + 1))
+        documentos = [doc.to_dict() for doc in query.stream()]
+        tem_mais = len(documentos) > limite
+        documentos = documentos[:limite]
+        
+        concursos = []
+        for documento in documentos:
+            conteudo = FirebaseService._conteudo_concurso(documento)
+            conteudo['sequencia'] = documento.get('sequencia')
+            conteudo['atualizado_em'] = documento.get('atualizado_em')
+            concursos.append(conteudo)
+        
+        return {
+            'concursos': concursos,
+            'watermark': documentos[-1]['sequencia'] if documentos else int(desde),
+            'tem_mais': tem_mais
+        }
+    
+    @staticmethod
+    def numerar_concursos(numeros):
+        """
+        Atribui números de sequência a concursos já gravados (ex.: os gravados antes da
+        existência da sequência), em transações que leem o contador uma única vez e
+        atualizam os documentos junto com ele.
+        
+        Args:
+            numeros: Números dos concursos, na ordem em que recebem as sequências
+            
+        Returns:
+            Tupla (primeira, última) das sequências atribuídas, ou None se não houver concursos
+        """
+        firebase_scraper = FirebaseService.get_instance()
+        if not firebase_scraper:
+            raise ValueError("Firebase não está disponível")
+        
+        colecao = firebase_scraper.db.collection(COLECAO_CONCURSOS)
+        sequencia_ref = firebase_scraper.db.collection(COLECAO_INDICES).document(DOCUMENTO_SEQUENCIA)
+        numeros = list(numeros)
+        intervalo = None
+        for inicio in range(0, len(numeros), MAX_CONCURSOS_POR_TRANSACAO):
+            grupo = numeros[inicio:inicio + MAX_CONCURSOS_POR_TRANSACAO]
+            
+            @firestore.transactional
+            def _numerar(transaction):
+                contador = sequencia_ref.get(transaction=transaction)
+                primeira = ((contador.to_dict() or {}).get('valor') or 0) + 1
+                transaction.set(sequencia_ref, {'valor': primeira + len(grupo) - 1})
+                for deslocamento, numero in enumerate(grupo):
+                    transaction.update(colecao.document(str(numero)), {
+                        'sequencia': primeira + deslocamento,
+                        'atualizado_em': firestore.SERVER_TIMESTAMP
+                    })
+                return primeira
+            
+            primeira = _numerar(firebase_scraper.db.transaction())
+            intervalo = (intervalo[0] if intervalo else primeira, primeira + len(grupo) - 1)
+        return intervalo
+    
+    @staticmethod
+    def agregar(query, somas=None):
+        """
+        Conta os documentos de uma consulta e soma campos numéricos no servidor (count/sum),
+        sem transferir os documentos.
+        
+        Se o Firestore (ou o emulador) não suportar consultas de agregação, os documentos
+        são lidos e agregados em memória, apenas com os campos somados.
+        
+        Args:
+            query: Consulta do Firestore
+            somas: Dicionário {alias: campo} dos campos a somar (campos aninhados com ponto)
+            
+        Returns:
+            Dicionário com 'total' (quantidade de documentos) e um valor por alias de soma
+        """
+        somas = somas or {}
+        try:
+            agregacao = query.count(alias='total')
+            for alias, campo in somas.items():
+                agregacao = agregacao.sum(campo, alias=alias)
+            resultado = {'total': 0, **{alias: 0 for alias in somas}}
+            for linha in agregacao.get():
+                for item in linha:
+                    resultado[item.alias] = item.value or 0
+            return resultado
+        except Exception as e:
+            print(f"Agregação no servidor indisponível, agregando em memória: {str(e)}")
+        
+        resultado = {'total': 0, **{alias: 0 for alias in somas}}
+        for doc in query.select(list(somas.values())).stream():
+            dados = doc.to_dict() or {}
+            resultado['total'] += 1
+            for alias, campo in somas.items():
+                valor = dados
+                for parte in campo.split('.'):
+                    valor = valor.get(parte) if isinstance(valor, dict) else None
+                if isinstance(valor, (int, float)) and not isinstance(valor, bool):
+                    resultado[alias] += valor
+        return resultado
+    
+    @staticmethod
+    def contar_concursos(inicio=None, fim=None):
+        """
+        Conta os concursos salvos, opcionalmente em um intervalo de números,
+        com uma consulta de agregação (uma leitura a cada 1000 concursos contados).
+        
+        Args:
+            inicio: Primeiro concurso do intervalo (None para não limitar)
+            fim: Último concurso do intervalo (None para não limitar)
+            
+        Returns:
+            Quantidade de concursos salvos
+        """
+        from google.cloud.firestore_v1.base_query import FieldFilter
+        
+        query = FirebaseService._colecao_concursos()
+        if inicio is not None:
+            query = query.where(filter=FieldFilter('numero', '>=', int(inicio)))
+        if fim is not None:
+            query = query.where(filter=FieldFilter('numero', '<=', int(fim)))
+        return int(FirebaseService.agregar(query)['total'])
+    
+    @staticmethod
+    def buscar_concursos_com_dezena(dezena, limite=10):
+        """
+        Busca os concursos mais recentes em que uma dezena foi sorteada
+        (usa o índice composto dezenas + numero).
+        
+        Args:
+            dezena: Dezena sorteada (1 a 60)
+            limite: Número máximo de concursos
+            
+        Returns:
+            Lista de resultados formatados, do mais recente para o mais antigo
+        """
+        from google.cloud.firestore_v1.base_query import FieldFilter
+        
+        query = (FirebaseService._colecao_concursos()
+                 .where(filter=FieldFilter('dezenas', 'array_contains', f"{int(dezena):02d}"))
+                 .order_by('numero', direction=firestore.Query.DESCENDING)
+                 .limit(limite))
+        return [FirebaseService._conteudo_concurso(doc.to_dict()) for doc in query.stream()]
+    
+    @staticmethod
+    def _ref_cidades():
+        """Referência do documento do índice de cidades ganhadoras."""
+        return FirebaseService.get_instance().db.collection(COLECAO_INDICES).document(DOCUMENTO_CIDADES)
+    
+    @staticmethod
+    def entradas_cidades(numero, cidades_ganhadoras):
+        """
+        Monta as entradas do índice de cidades para as cidades ganhadoras de um concurso.
+        
+        Args:
+            numero: Número do concurso
+            cidades_ganhadoras: Lista de {cidade, uf, ganhadores} (formatar_resultado)
+            
+        Returns:
+            Dicionário {"UF|CIDADE": {uf, cidade, concursos: {numero: ganhadores}}}
+        """
+        entradas = {}
+        for item in cidades_ganhadoras or []:
+            cidade = str(item.get('cidade') or '').strip()
+            uf = str(item.get('uf') or '').strip().upper()
+            if not cidade and not uf:
+                continue
+            chave = f"{uf}|{cidade.upper()}"
+            entrada = entradas.setdefault(chave, {'uf': uf, 'cidade': cidade, 'concursos': {str(numero): 0}})
+            # Uma cidade listada tem ao menos um ganhador, mesmo sem a quantidade informada
+            entrada['concursos'][str(numero)] += max(1, int(item.get('ganhadores') or 0))
+        return entradas
+    
+    @staticmethod
+    def ler_indice_cidades():
+        """
+        Lê o índice de cidades ganhadoras com uma única leitura.
+        
+        Returns:
+            Dicionário {"UF|CIDADE": {uf, cidade, concursos}} ou None se o índice ainda não foi criado
+        """
+        doc = FirebaseService._ref_cidades().get()
+        if not doc.exists:
+            return None
+        return (doc.to_dict() or {}).get('cidades') or {}
+    
+    @staticmethod
+    def gravar_indice_cidades(cidades):
+        """Substitui o índice de cidades ganhadoras (usado na reconstrução a partir da coleção concursos)."""
+        FirebaseService._ref_cidades().set({
+            'cidades': cidades,
+            'atualizado_em': datetime.now().isoformat()
+        })
+    
+    @staticmethod
+    def _ref_cobertura():
+        """Referência do documento do índice de cobertura."""
+        return FirebaseService.get_instance().db.collection(COLECAO_INDICES).document(DOCUMENTO_COBERTURA)
+    
+    @staticmethod
+    def _bitset_cobertura(documento):
+        """Combina o bitset compacto e os números recentes de um documento de cobertura."""
+        bits = int.from_bytes(bytes(documento.get('bits') or b''), 'little')
+        for numero in documento.get('recentes') or []:
+            bits |= 1 << int(numero)
+        return bits
+    
+    @staticmethod
+    def ler_cobertura():
+        """
+        Lê o índice de cobertura com uma única leitura.
+        
+        Returns:
+            Inteiro usado como bitset (o bit n indica que o concurso n está salvo),
+            ou None se o índice ainda não foi criado
+        """
+        doc = FirebaseService._ref_cobertura().get()
+        if not doc.exists:
+            return None
+        return FirebaseService._bitset_cobertura(doc.to_dict() or {})
+    
+    @staticmethod
+    def incorporar_cobertura(bits_adicionais=0):
+        """
+        Funde transacionalmente os números recentes (e bits adicionais) no bitset compacto.
+        
+        Args:
+            bits_adicionais: Bitset com concursos a marcar como salvos (ex.: de uma reconstrução)
+            
+        Returns:
+            Bitset resultante
+        """
+        firebase_scraper = FirebaseService.get_instance()
+        if not firebase_scraper:
+            raise ValueError("Firebase não está disponível")
+        
+        doc_ref = FirebaseService._ref_cobertura()
+        
+        @firestore.transactional
+        def _incorporar(transaction):
+            snapshot = doc_ref.get(transaction=transaction)
+            bits = FirebaseService._bitset_cobertura(snapshot.to_dict() or {})
+            bits |= int(bits_adicionais)
+            transaction.set(doc_ref, {
+                'bits': bits.to_bytes((bits.bit_length() + 7) // 8, 'little'),
+                'recentes': [],
+                'total': bits.bit_count(),
+                'ultimo_concurso': max(0, bits.bit_length() - 1),
+                'atualizado_em': datetime.now().isoformat()
+            })
+            return bits
+        
+        return _incorporar(firebase_scraper.db.transaction())
+    
+    @staticmethod
+    def adquirir_lease(chave, dono, duracao_segundos=120):
+        """
+        Adquire (ou renova) transacionalmente um lease de curta duração.
+        
+        Args:
+            chave: Identificador do recurso protegido (ex.: 'importacao-<id>')
+            dono: Identificador de quem está adquirindo o lease
+            duracao_segundos: Validade do lease; depois disso outro dono pode assumi-lo
+            
+        Returns:
+            bool: True se o lease pertence ao dono ao fim da transação
+        """
+        firebase_scraper = FirebaseService.get_instance()
+        if not firebase_scraper:
+            raise ValueError("Firebase não está disponível")
+        
+        doc_ref = firebase_scraper.db.collection('leases').document(chave)
+        
+        @firestore.transactional
+        def _adquirir(transaction):
+            snapshot = doc_ref.get(transaction=transaction)
+            agora = datetime.now(timezone.utc)
+            if snapshot.exists:
+                atual = snapshot.to_dict()
+                expira_em = atual.get('expira_em')
+                if atual.get('dono') != dono and expira_em is not None and expira_em > agora:
+                    return False
+            transaction.set(doc_ref, {
+                'dono': dono,
+                'adquirido_em': agora,
+                'expira_em': agora + timedelta(seconds=duracao_segundos)
+            })
+            return True
+        
+        return _adquirir(firebase_scraper.db.transaction())
+    
+    @staticmethod
+    def liberar_lease(chave, dono):
+        """
+        Libera um lease, se ele ainda pertencer ao dono informado.
+        
+        Args:
+            chave: Identificador do recurso protegido
+            dono: Identificador do dono do lease
+        """
+        firebase_scraper = FirebaseService.get_instance()
+        if not firebase_scraper:
+            return
+        
+        doc_ref = firebase_scraper.db.collection('leases').document(chave)
+        
+        @firestore.transactional
+        def _liberar(transaction):
+            snapshot = doc_ref.get(transaction=transaction)
+            if snapshot.exists and snapshot.to_dict().get('dono') == dono:
+                transaction.delete(doc_ref)
+        
+        try:
+            _liberar(firebase_scraper.db.transaction())
+        except Exception as e:
+            print(f"Erro ao liberar lease {chave}: {str(e)}")
+    
     @staticmethod
     def atualizar_status(status, metadados=None):
         """Atualiza o status de uma operação no Firestore."""
@@ -530,9 +1165,8 @@ class FirebaseService:
     @staticmethod
     def buscar_historico_concursos_ordenado(limite=10):
         """
-        Busca o histórico de concursos da Megasena no Firestore,
-        filtrando por documentos onde conteudo.concurso existe
-        e ordenando por conteudo.data_sorteio de forma decrescente.
+        Busca o histórico de concursos da Megasena na coleção concursos,
+        do mais recente para o mais antigo (ordenado no servidor pelo número indexado).
         
         Args:
             limite: Número máximo de resultados a retornar
@@ -540,48 +1174,19 @@ class FirebaseService:
         Returns:
             Lista de dicionários com os dados dos concursos
         """
-        firebase_scraper = FirebaseService.get_instance()
-        if not firebase_scraper:
+        if not FirebaseService.get_instance():
             return []
             
         try:
-            # Verificar se o firebase_scraper tem um cliente Firestore
-            if not hasattr(firebase_scraper, 'db') or firebase_scraper.db is None:
-                print("FirebaseScraper não possui um cliente Firestore válido")
-                return []
-            
-            # Usar a nova sintaxe recomendada para evitar o warning
-            from google.cloud.firestore_v1.base_query import FieldFilter
-            
-            # Criar a query para filtrar por conteudo.concurso existir e ordenar por data_sorteio
-            # Não é possível verificar diretamente se um campo existe no Firestore,
-            # então vamos filtrar por documentos onde conteudo.concurso não é nulo
-            collection_ref = firebase_scraper.db.collection('scraping_results')
-            
-            # Primeiro, verificamos se o campo conteudo.concurso existe e não é nulo
-            query = collection_ref.where(filter=FieldFilter('conteudo.concurso', '>', 0))
-            
-            # Ordenar por data_sorteio de forma decrescente
-            # Nota: o Firestore só permite ordenar por campos que estão nos filtros ou são simples
-            query = query.order_by('conteudo.data_sorteio', direction=firestore.Query.DESCENDING)
-            
-            # Limitar o número de resultados
-            query = query.limit(limite)
-            
-            # Executar a query
-            docs = query.get()
-            
-            # Processar os resultados
             resultados = []
-            for doc in docs:
-                data = doc.to_dict()
+            for conteudo in FirebaseService.buscar_ultimos_concursos(limite):
                 resultados.append({
-                    'id': doc.id,
-                    'conteudo': data.get('conteudo', {}),
-                    'metadados': data.get('metadados', {})
+                    'id': str(conteudo['concurso']),
+                    'conteudo': conteudo,
+                    'metadados': {'concurso': conteudo['concurso']}
                 })
             
-            print(f"Encontrados {len(resultados)} concursos ordenados por data de sorteio")
+            print(f"Encontrados {len(resultados)} concursos ordenados por número")
             return resultados
         except Exception as e:
             print(f"Erro ao buscar histórico de concursos ordenado: {str(e)}")
@@ -0,0 +1,244 @@
+# -*- coding: utf-8 -*-
+"""
+Histórico de sorteios em memória, carregado dos blocos de concursos_blocos.
+
+Cada bloco guarda 100 concursos, então o histórico completo custa algumas dezenas de
+leituras e é compartilhado por todas as threads do processo. Concursos salvos neste
+processo entram no histórico imediatamente; concursos novos salvos por outros processos
+são buscados relendo apenas o último bloco, no máximo a cada INTERVALO_ATUALIZACAO segundos.
+
+Com o listener do Firestore ativo (snapshot_listener), os blocos e o último concurso são
+empurrados para cá assim que mudam, e o histórico não precisa ser relido.
+"""
+import threading
+import time
+from src.services import http_cache
+from src.services.firebase_service import FirebaseService, FAIXAS_PREMIACAO
+
+# Intervalo mínimo entre releituras do último bloco em busca de concursos novos
+INTERVALO_ATUALIZACAO = 30
+
+_sorteios = {}
+_estado = {'carregado': False, 'atualizado_em': 0.0, 'ao_vivo': False, 'ultimo': None}
+_lock = threading.Lock()
+# Serializa a primeira carga: requisições simultâneas em um processo novo esperam uma única leitura dos blocos
+_lock_carga = threading.Lock()
+# Funções chamadas a cada mudança do histórico (índices derivados mantidos incrementalmente)
+_observadores = []
+
+
+def registrar_observador(funcao):
+    """
+    Registra uma função chamada a cada mudança do histórico em memória.
+
+    Args:
+        funcao: Chamada como funcao(sorteios, completo), onde sorteios é um dicionário
+            {numero: entrada} dos concursos alterados e completo indica que o histórico
+            foi recarregado por inteiro (sorteios contém todos os concursos)
+    """
+    if funcao not in _observadores:
+        _observadores.append(funcao)
+
+
+def _notificar(sorteios, completo=False):
+    """Avisa os observadores sobre concursos alterados (fora do lock do histórico)."""
+    for funcao in list(_observadores):
+        try:
+            funcao(sorteios, completo)
+        except Exception as e:
+            print(f"Erro ao notificar observador do histórico: {str(e)}")
+
+
+def _carregar():
+    """Lê todos os blocos do Firestore e substitui o histórico em memória."""
+    sorteios = FirebaseService.buscar_blocos()
+    with _lock:
+        _sorteios.clear()
+        _sorteios.update(sorteios)
+        _estado['carregado'] = True
+        _estado['atualizado_em'] = time.monotonic()
+    print(f"Histórico em memória carregado com {len(sorteios)} concursos")
+    _notificar(sorteios, completo=True)
+
+
+def _atualizar_ultimos_blocos(fim):
+    """Relê os blocos entre o último concurso em memória e o concurso pedido."""
+    with _lock:
+        ultimo = max(_sorteios) if _sorteios else 1
+        _estado['atualizado_em'] = time.monotonic()
+    sorteios = FirebaseService.buscar_blocos(FirebaseService.bloco_do_concurso(ultimo),
+                                             FirebaseService.bloco_do_concurso(fim))
+    with _lock:
+        _sorteios.update(sorteios)
+    _notificar(sorteios)
+
+
+def _garantir_carregado(fim=None):
+    """Carrega o histórico na primeira utilização e busca concursos novos quando necessário."""
+    if not FirebaseService.is_available():
+        return
+    if not _estado['carregado']:
+        with _lock_carga:
+            if not _estado['carregado']:
+                _carregar()
+        return
+    if fim is None or _estado['ao_vivo']:
+        return
+    with _lock:
+        expirado = time.monotonic() - _estado['atualizado_em'] >= INTERVALO_ATUALIZACAO
+        falta = expirado and (not _sorteios or fim > max(_sorteios))
+    if falta:
+        _atualizar_ultimos_blocos(fim)
+
+
+def atualizar():
+    """Carrega o histórico, se necessário, e busca os concursos novos já conhecidos pelo cache HTTP."""
+    _garantir_carregado(http_cache.ultimo_concurso_conhecido())
+
+
+def atualizar_concurso(numero, entrada):
+    """
+    Insere ou atualiza um concurso no histórico em memória.
+
+    Args:
+        numero: Número do concurso
+        entrada: Entrada compacta do bloco (FirebaseService._entrada_bloco)
+    """
+    atualizar_concursos({numero: entrada})
+
+
+def atualizar_concursos(entradas):
+    """
+    Insere ou atualiza vários concursos no histórico em memória, com uma única notificação.
+
+    Args:
+        entradas: Dicionário {numero: entrada compacta do bloco}
+    """
+    alterados = {int(numero): entrada for numero, entrada in entradas.items()}
+    with _lock:
+        _sorteios.update(alterados)
+    if alterados:
+        _notificar(alterados)
+
+
+def aplicar_sorteios(sorteios, completo=False):
+    """
+    Aplica as entradas de um bloco recebidas do listener do Firestore.
+
+    Args:
+        sorteios: Dicionário {numero (str ou int): entrada compacta}
+        completo: True quando os blocos recebidos formam o histórico completo (snapshot inicial)
+    """
+    alterados = {int(numero): entrada for numero, entrada in (sorteios or {}).items()}
+    with _lock:
+        _sorteios.update(alterados)
+        _estado['atualizado_em'] = time.monotonic()
+        if completo:
+            _estado['carregado'] = True
+    if alterados:
+        _notificar(alterados)
+
+
+def definir_ao_vivo(ao_vivo):
+    """Indica se o listener do Firestore está conectado e mantendo o histórico atualizado."""
+    with _lock:
+        _estado['ao_vivo'] = bool(ao_vivo)
+        if not ao_vivo:
+            _estado['ultimo'] = None
+
+
+def registrar_ultimo(conteudo):
+    """Memoriza o resultado completo do último concurso, recebido do listener."""
+    with _lock:
+        _estado['ultimo'] = conteudo
+
+
+def ultimo_concurso():
+    """
+    Retorna o resultado completo do último concurso mantido pelo listener,
+    ou None se o listener não estiver ativo.
+    """
+    with _lock:
+        return _estado['ultimo'] if _estado['ao_vivo'] else None
+
+
+def expandir(numero, entrada):
+    """
+    Converte uma entrada compacta no formato de formatar_resultado (sem os campos que
+    não são guardados nos blocos, como cidades ganhadoras).
+    """
+    ganhadores = entrada.get('ganhadores') or []
+    premios = entrada.get('premios') or []
+    return {
+        'concurso': numero,
+        'data_sorteio': entrada.get('data'),
+        'dezenas': [f"{dezena:02d}" for dezena in entrada.get('dezenas') or []],
+        'premiacao': {
+            faixa: {
+                'ganhadores': ganhadores[i] if i < len(ganhadores) else 0,
+                'premio_individual': premios[i] if i < len(premios) else 0.0
+            }
+            for i, faixa in enumerate(FAIXAS_PREMIACAO)
+        },
+        'acumulado': entrada.get('acumulado', False),
+        'valor_arrecadado': entrada.get('arrecadado', 0.0),
+        'valor_acumulado_proximo_concurso': entrada.get('acumulado_proximo', 0.0),
+        'valor_estimado_proximo_concurso': entrada.get('estimativa_proximo', 0.0)
+    }
+
+
+def obter_entradas(inicio, fim):
+    """
+    Obtém as entradas compactas de um intervalo de concursos.
+
+    Args:
+        inicio: Primeiro concurso
+        fim: Último concurso
+
+    Returns:
+        Dicionário {numero: entrada} apenas com os concursos disponíveis
+    """
+    _garantir_carregado(fim)
+    with _lock:
+        return {numero: _sorteios[numero] for numero in range(inicio, fim + 1) if numero in _sorteios}
+
+
+def obter_sorteios(inicio, fim):
+    """
+    Obtém os sorteios de um intervalo de concursos, expandidos e em ordem crescente.
+
+    Returns:
+        Lista de resultados (formato de formatar_resultado, sem os campos não guardados nos blocos)
+    """
+    return [expandir(numero, entrada) for numero, entrada in sorted(obter_entradas(inicio, fim).items())]
+
+
+def obter_ultimos(quantidade, antes_de=None):
+    """
+    Obtém os últimos sorteios do histórico em memória, do mais recente para o mais antigo.
+
+    Args:
+        quantidade: Número de sorteios
+        antes_de: Retorna apenas concursos com número menor que este (paginação)
+
+    Returns:
+        Lista de resultados expandidos
+    """
+    _garantir_carregado(http_cache.ultimo_concurso_conhecido())
+    with _lock:
+        numeros = sorted((numero for numero in _sorteios if antes_de is None or numero < antes_de), reverse=True)
+        return [expandir(numero, _sorteios[numero]) for numero in numeros[:quantidade]]
+
+
+def disponivel():
+    """Indica se há sorteios no histórico em memória."""
+    _garantir_carregado()
+    with _lock:
+        return bool(_sorteios)
+
+
+def ultimo_numero():
+    """Retorna o número do concurso mais recente em memória, ou None."""
+    _garantir_carregado(http_cache.ultimo_concurso_conhecido())
+    with _lock:
+        return max(_sorteios) if _sorteios else None
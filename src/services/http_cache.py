@@ -0,0 +1,302 @@
+# -*- coding: utf-8 -*-
+"""
+Cabeçalhos de cache HTTP (Cache-Control, ETag, Last-Modified) e GET condicional
+para os endpoints de leitura, compartilhados entre a API Flask e o Firebase Functions.
+
+Concursos consolidados nunca mudam, então recebem ETag fixa e cache imutável de longa
+duração, e o 304 é respondido sem consultar o Firestore. Os demais recursos (o concurso
+atual, cujo rateio ainda pode ser publicado, e os que dependem do último concurso:
+estatísticas, últimos sorteios, histórico) recebem max-age curto, ajustado ao calendário
+de sorteios, e uma ETag que inclui um hash do conteúdo, então qualquer alteração dos
+dados (rateio publicado, lacuna reparada, concurso antigo corrigido) gera uma ETag nova.
+"""
+import hashlib
+import json
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+# Incrementar sempre que o formato das respostas mudar, para invalidar as ETags antigas
+VERSAO_CONTEUDO = 1
+
+# Sorteios da Mega-Sena: terças, quintas e sábados às 20h (horário de Brasília)
+FUSO_SORTEIO = timezone(timedelta(hours=-3))
+DIAS_SORTEIO = (1, 3, 5)
+HORA_SORTEIO = 20
+# Período após o sorteio em que o resultado e o rateio ainda estão sendo publicados
+DURACAO_APURACAO = timedelta(hours=4)
+
+MAX_AGE_IMUTAVEL = 365 * 24 * 3600
+MAX_AGE_RECENTE_MAXIMO = 3600
+MAX_AGE_APURACAO = 60
+
+# Último concurso conhecido pelo processo, usado para responder 304 sem consultar o Firestore
+_ultimo_conhecido = {'numero': None, 'expira_em': 0.0}
+_lock = threading.Lock()
+
+
+def _agora():
+    return datetime.now(FUSO_SORTEIO)
+
+
+def proximo_sorteio(agora=None):
+    """
+    Calcula a data e hora do próximo sorteio a partir de um instante.
+
+    Args:
+        agora: Instante de referência (padrão: agora, no fuso de Brasília)
+
+    Returns:
+        datetime do próximo sorteio
+    """
+    agora = agora or _agora()
+    for dias in range(8):
+        candidato = (agora + timedelta(days=dias)).replace(hour=HORA_SORTEIO, minute=0, second=0, microsecond=0)
+        if candidato.weekday() in DIAS_SORTEIO and candidato > agora:
+            return candidato
+    return agora + timedelta(days=1)
+
+
+def em_apuracao(agora=None):
+    """Indica se o instante está dentro da janela de publicação de um sorteio."""
+    agora = agora or _agora()
+    inicio = agora.replace(hour=HORA_SORTEIO, minute=0, second=0, microsecond=0)
+    if agora < inicio:
+        inicio -= timedelta(days=1)
+    return inicio.weekday() in DIAS_SORTEIO and agora < inicio + DURACAO_APURACAO
+
+
+def max_age_recente(agora=None):
+    """
+    Calcula o max-age para recursos que dependem do último concurso.
+
+    Durante a apuração de um sorteio o max-age é curto; fora dela, dura até o
+    próximo sorteio, limitado a MAX_AGE_RECENTE_MAXIMO.
+
+    Args:
+        agora: Instante de referência
+
+    Returns:
+        max-age em segundos
+    """
+    agora = agora or _agora()
+    if em_apuracao(agora):
+        return MAX_AGE_APURACAO
+    restante = int((proximo_sorteio(agora) - agora).total_seconds())
+    return max(MAX_AGE_APURACAO, min(MAX_AGE_RECENTE_MAXIMO, restante))
+
+
+def registrar_ultimo_concurso(numero):
+    """Memoriza o último concurso conhecido até o fim do max-age atual."""
+    try:
+        numero = int(numero)
+    except (ValueError, TypeError):
+        return
+    with _lock:
+        agora = time.time()
+        atual = _ultimo_conhecido['numero']
+        # Um número menor só substitui o memorizado depois que ele expira
+        if atual is not None and numero < atual and agora < _ultimo_conhecido['expira_em']:
+            return
+        _ultimo_conhecido['numero'] = numero
+        _ultimo_conhecido['expira_em'] = agora + max_age_recente()
+
+
+def ultimo_concurso_conhecido():
+    """Retorna o último concurso memorizado, ou None se a informação expirou."""
+    with _lock:
+        if _ultimo_conhecido['numero'] is None or time.time() >= _ultimo_conhecido['expira_em']:
+            return None
+        return _ultimo_conhecido['numero']
+
+
+def _resumo_conteudo(dados):
+    """Hash curto e determinístico dos dados de uma resposta."""
+    corpo = json.dumps(dados, sort_keys=True, default=str, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha256(corpo.encode('utf-8')).hexdigest()[:16]
+
+
+def gerar_etag(recurso, numero, parametros=None, dados=None):
+    """
+    Gera uma ETag forte para um recurso a partir do número do concurso e da versão do conteúdo.
+
+    Args:
+        recurso: Nome do recurso (ex.: 'concurso', 'estatisticas')
+        numero: Número do concurso que determina o conteúdo
+        parametros: Parâmetros da consulta que alteram o conteúdo (ex.: ultimos=10)
+        dados: Dados da resposta, para recursos que ainda podem mudar com o mesmo número
+            de concurso (a ETag passa a incluir um hash do conteúdo)
+
+    Returns:
+        ETag entre aspas
+    """
+    partes = [f"megasena-{recurso}-{numero}"]
+    for chave in sorted(parametros or {}):
+        partes.append(f"{chave}{parametros[chave]}")
+    if dados is not None:
+        partes.append(_resumo_conteudo(dados))
+    partes.append(f"v{VERSAO_CONTEUDO}")
+    return '"' + '-'.join(partes) + '"'
+
+
+def etag_corresponde(if_none_match, etag):
+    """
+    Verifica se o cabeçalho If-None-Match corresponde à ETag (comparação fraca, RFC 9110).
+
+    Args:
+        if_none_match: Valor do cabeçalho If-None-Match
+        etag: ETag atual do recurso
+
+    Returns:
+        bool: True se o cliente já possui a versão atual
+    """
+    if not if_none_match or not etag:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+
+    def _normalizar(valor):
+        valor = valor.strip()
+        return valor[2:] if valor.startswith('W/') else valor
+
+    return any(_normalizar(valor) == _normalizar(etag) for valor in if_none_match.split(','))
+
+
+def _last_modified(data_sorteio):
+    """Converte a data do sorteio (AAAA-MM-DD) no formato HTTP do Last-Modified."""
+    if not data_sorteio:
+        return None
+    try:
+        data = datetime.strptime(str(data_sorteio)[:10], "%Y-%m-%d")
+    except ValueError:
+        return None
+    data = data.replace(hour=HORA_SORTEIO, tzinfo=FUSO_SORTEIO) + DURACAO_APURACAO
+    return format_datetime(data.astimezone(timezone.utc), usegmt=True)
+
+
+def _concurso_consolidado(numero, data_sorteio=None):
+    """
+    Indica se um concurso já está consolidado (não terá mais o rateio alterado).
+
+    O concurso atual e os sorteados há menos de um dia ainda podem ser atualizados pela Caixa.
+    """
+    ultimo = ultimo_concurso_conhecido()
+    if ultimo is not None and numero is not None and int(numero) >= ultimo:
+        return False
+    if data_sorteio:
+        try:
+            data = datetime.strptime(str(data_sorteio)[:10], "%Y-%m-%d").replace(tzinfo=FUSO_SORTEIO)
+        except ValueError:
+            return True
+        return _agora() - data > timedelta(days=1) + timedelta(hours=HORA_SORTEIO) + DURACAO_APURACAO
+    return True
+
+
+def _cache_control(numero, concurso_fixo, data_sorteio=None):
+    """Escolhe o Cache-Control: imutável para concursos passados, curto para os recentes."""
+    if concurso_fixo and _concurso_consolidado(numero, data_sorteio):
+        return f"public, max-age={MAX_AGE_IMUTAVEL}, immutable"
+    return f"public, max-age={max_age_recente()}"
+
+
+def etag_antecipada(recurso, concurso=None, parametros=None):
+    """
+    Calcula a ETag de um recurso antes de processar a requisição, quando isso é possível
+    sem consultar o Firestore: apenas para um concurso fixo já consolidado, cuja ETag
+    depende só do número. Os demais recursos têm a ETag calculada a partir dos dados.
+
+    Args:
+        recurso: Nome do recurso
+        concurso: Número do concurso fixo pedido pelo cliente, ou None para recursos do último concurso
+        parametros: Parâmetros da consulta que alteram o conteúdo
+
+    Returns:
+        ETag ou None se o recurso ainda pode mudar (ou o último concurso não é conhecido)
+    """
+    # Sem o último concurso conhecido, não há como saber se o concurso pedido é o atual
+    if concurso is None or ultimo_concurso_conhecido() is None or not _concurso_consolidado(concurso):
+        return None
+    return gerar_etag(recurso, concurso, parametros)
+
+
+def cabecalhos_cache(recurso, numero, concurso_fixo=False, parametros=None, data_sorteio=None, dados=None,
+                     registrar_ultimo=True):
+    """
+    Monta os cabeçalhos de cache de uma resposta de leitura.
+
+    Args:
+        recurso: Nome do recurso
+        numero: Número do concurso que determina o conteúdo da resposta
+        concurso_fixo: True se o cliente pediu um concurso específico (conteúdo imutável)
+        parametros: Parâmetros da consulta que alteram o conteúdo
+        data_sorteio: Data do sorteio (AAAA-MM-DD), usada no Last-Modified
+        dados: Dados da resposta; exceto para concursos consolidados, a ETag inclui um hash deles
+        registrar_ultimo: False se o número não é o do último concurso (ex.: páginas do histórico
+            após um cursor), para não ser memorizado como tal
+
+    Returns:
+        Dicionário de cabeçalhos (vazio se o número do concurso é desconhecido)
+    """
+    if numero is None:
+        return {}
+
+    if registrar_ultimo and not concurso_fixo:
+        registrar_ultimo_concurso(numero)
+
+    consolidado = concurso_fixo and _concurso_consolidado(numero, data_sorteio)
+    headers = {
+        'ETag': gerar_etag(recurso, numero, parametros, None if consolidado else dados),
+        'Cache-Control': _cache_control(numero, concurso_fixo, data_sorteio)
+    }
+    last_modified = _last_modified(data_sorteio)
+    if last_modified:
+        headers['Last-Modified'] = last_modified
+    return headers
+
+
+def cabecalhos_nao_modificado(etag, numero=None, concurso_fixo=False):
+    """Monta os cabeçalhos de uma resposta 304 Not Modified."""
+    return {'ETag': etag, 'Cache-Control': _cache_control(numero, concurso_fixo)}
+
+
+def inteiro_ou_padrao(valor, padrao=None):
+    """Converte um parâmetro de consulta em inteiro positivo, ou retorna o padrão."""
+    try:
+        valor = int(valor)
+    except (ValueError, TypeError):
+        return padrao
+    return valor if valor > 0 else padrao
+
+
+def numero_da_resposta(recurso, dados):
+    """
+    Extrai o número do concurso que determina o conteúdo de uma resposta de leitura.
+
+    Args:
+        recurso: Nome do recurso ('concurso', 'estatisticas', 'ultimos_sorteios', 'historico'
+            ou outro recurso cuja resposta traz o campo ultimo_concurso)
+        dados: Dados retornados pelo serviço
+
+    Returns:
+        Número do concurso ou None se não for possível determiná-lo
+    """
+    if not isinstance(dados, dict):
+        return None
+
+    if recurso == 'concurso':
+        return dados.get('concurso')
+    if recurso == 'estatisticas':
+        return (dados.get('periodo') or {}).get('ultimo_concurso')
+    if recurso == 'ultimos_sorteios':
+        numeros = [sorteio.get('concurso') or 0 for sorteio in dados.get('sorteios', [])]
+        return max(numeros) if numeros else None
+    if recurso == 'historico':
+        resultados = dados.get('resultados')
+        if not isinstance(resultados, list):
+            return None
+        numeros = [(resultado.get('conteudo') or {}).get('concurso') or 0 for resultado in resultados
+                   if isinstance(resultado, dict)]
+        return max(numeros) if numeros else None
+    # Demais recursos (análises do histórico) informam o último concurso considerado
+    return dados.get('ultimo_concurso')
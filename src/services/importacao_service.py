@@ -0,0 +1,498 @@
+# -*- coding: utf-8 -*-
+"""
+Importação em segundo plano do histórico da Megasena.
+
+O intervalo de concursos é dividido em lotes. Ao fim de cada lote, a marca d'água
+(último concurso contíguo concluído) é gravada no documento da importação no Firestore,
+de modo que uma importação interrompida é retomada a partir dela, sem repetir o que já
+foi feito. A existência dos concursos é verificada com uma única consulta por lote,
+na coleção concursos.
+
+Cada importação tem um ID derivado da sua chave de idempotência: pedidos repetidos se
+anexam à importação existente em vez de refazer o trabalho. Leases no Firestore garantem
+que uma importação rode em um só processo e que importações sobrepostas não baixem os
+mesmos concursos ao mesmo tempo.
+"""
+import hashlib
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from src.megasena_api import MegasenaAPI
+from src.services.firebase_service import FirebaseService
+
+COLECAO_IMPORTACOES = 'importacoes'
+TAMANHO_LOTE_PADRAO = 50
+TAMANHO_LOTE_MAXIMO = 500
+MAX_ERROS_REGISTRADOS = 50
+# Uma importação "executando" sem atualização há mais que isso é considerada abandonada
+TEMPO_ABANDONO = timedelta(minutes=10)
+# Leases: validade, tamanho dos blocos de concursos protegidos e espera máxima por um bloco ocupado
+DURACAO_LEASE = 300
+TAMANHO_BLOCO_LEASE = 100
+ESPERA_MAXIMA_LEASE = 600
+INTERVALO_ESPERA_LEASE = 5
+# Importações interrompidas são retomadas pelo scheduler com espera exponencial entre as
+# tentativas; depois de MAX_TENTATIVAS interrupções seguidas sem progresso, a importação falha
+MAX_TENTATIVAS = 5
+ESPERA_TENTATIVA = timedelta(minutes=5)
+
+STATUS_PENDENTE = 'pendente'
+STATUS_EXECUTANDO = 'executando'
+STATUS_INTERROMPIDO = 'interrompido'
+STATUS_CONCLUIDO = 'concluido'
+STATUS_FALHOU = 'falhou'
+
+# Threads de importação em execução neste processo, por ID da importação
+_threads = {}
+_lock_threads = threading.Lock()
+
+
+def _db():
+    firebase_scraper = FirebaseService.get_instance()
+    if not firebase_scraper:
+        raise ValueError("Firebase não está disponível")
+    return firebase_scraper.db
+
+
+def _formatar_status(importacao_id, dados):
+    """Monta a resposta de status de uma importação a partir do documento salvo."""
+    inicio, fim = dados.get('inicio'), dados.get('fim')
+    watermark = dados.get('watermark', inicio - 1)
+    total = max(1, fim - inicio + 1)
+    return {
+        'id': importacao_id,
+        'status': dados.get('status'),
+        'inicio': inicio,
+        'fim': fim,
+        'watermark': watermark,
+        'tamanho_lote': dados.get('tamanho_lote'),
+        'progresso': round(100.0 * (watermark - inicio + 1) / total, 1),
+        'importados': dados.get('importados', 0),
+        'ja_existentes': dados.get('ja_existentes', 0),
+        'com_erro': dados.get('com_erro', 0),
+        'erros': dados.get('erros', []),
+        'tentativas': dados.get('tentativas', 0),
+        'proxima_tentativa': dados.get('proxima_tentativa'),
+        'criado_em': dados.get('criado_em'),
+        'atualizado_em': dados.get('atualizado_em')
+    }
+
+
+def _registrar_interrupcao(job):
+    """
+    Conta uma interrupção da importação e agenda a próxima tentativa, com espera exponencial.
+
+    Args:
+        job: Dados da importação, atualizados no lugar
+
+    Returns:
+        Campos a gravar no documento da importação
+    """
+    job['tentativas'] = job.get('tentativas', 0) + 1
+    if job['tentativas'] >= MAX_TENTATIVAS:
+        job['status'] = STATUS_FALHOU
+        job['proxima_tentativa'] = None
+    else:
+        job['status'] = STATUS_INTERROMPIDO
+        espera = ESPERA_TENTATIVA * 2 ** (job['tentativas'] - 1)
+        job['proxima_tentativa'] = (datetime.now() + espera).isoformat()
+    job['atualizado_em'] = datetime.now().isoformat()
+    return {key: job[key] for key in ('status', 'tentativas', 'proxima_tentativa', 'atualizado_em')}
+
+
+def _id_importacao(chave_idempotencia):
+    """Deriva o ID do documento da importação a partir da chave de idempotência."""
+    return hashlib.sha256(f"importacao:{chave_idempotencia}".encode('utf-8')).hexdigest()[:32]
+
+
+def criar_importacao(inicio, fim=None, tamanho_lote=None, chave_idempotencia=None):
+    """
+    Registra uma nova importação no Firestore, sem executá-la.
+
+    Se já existir uma importação com a mesma chave de idempotência (por padrão, o próprio
+    intervalo), ela é retornada em vez de criar outra.
+
+    Args:
+        inicio: Primeiro concurso a importar
+        fim: Último concurso a importar (padrão: último concurso disponível)
+        tamanho_lote: Quantidade de concursos por lote/checkpoint
+        chave_idempotencia: Chave informada pelo cliente para identificar o pedido
+
+    Returns:
+        Dicionário com o status da importação criada ou existente
+    """
+    from google.api_core.exceptions import Conflict
+
+    if fim is None:
+        fim = MegasenaAPI().obter_concurso().get('numero')
+        if not fim:
+            raise ValueError('Não foi possível determinar o último concurso disponível')
+
+    if inicio < 1 or inicio > fim:
+        raise ValueError('Número inicial deve ser positivo e menor ou igual ao número final')
+
+    tamanho_lote = min(TAMANHO_LOTE_MAXIMO, max(1, int(tamanho_lote or TAMANHO_LOTE_PADRAO)))
+    chave_idempotencia = chave_idempotencia or f"{inicio}-{fim}"
+    agora = datetime.now().isoformat()
+    dados = {
+        'inicio': inicio,
+        'fim': fim,
+        'tamanho_lote': tamanho_lote,
+        'chave_idempotencia': chave_idempotencia,
+        'watermark': inicio - 1,
+        'status': STATUS_PENDENTE,
+        'importados': 0,
+        'ja_existentes': 0,
+        'com_erro': 0,
+        'erros': [],
+        'criado_em': agora,
+        'atualizado_em': agora
+    }
+
+    importacao_id = _id_importacao(chave_idempotencia)
+    doc_ref = _db().collection(COLECAO_IMPORTACOES).document(importacao_id)
+    try:
+        # create() falha se o documento já existir, tornando a criação atômica
+        doc_ref.create(dados)
+    except Conflict:
+        print(f"Importação {importacao_id} já existe para a chave '{chave_idempotencia}', anexando")
+        status = obter_status_importacao(importacao_id)
+        status['anexada'] = True
+        return status
+
+    print(f"Importação {importacao_id} criada para os concursos {inicio} a {fim}")
+    return _formatar_status(importacao_id, dados)
+
+
+def _blocos_lease(inicio, fim):
+    """Retorna as chaves de lease dos blocos de concursos que cobrem o intervalo."""
+    primeiro, ultimo = (inicio - 1) // TAMANHO_BLOCO_LEASE, (fim - 1) // TAMANHO_BLOCO_LEASE
+    return [f"concursos-{bloco}" for bloco in range(primeiro, ultimo + 1)]
+
+
+def _adquirir_blocos(chaves, dono, chave_importacao=None):
+    """
+    Adquire os leases de todos os blocos (em ordem, para evitar impasse entre importações),
+    aguardando enquanto algum estiver com outra importação.
+
+    Args:
+        chaves: Chaves de lease dos blocos
+        dono: Identificador do processo que executa a importação
+        chave_importacao: Lease da própria importação, renovado durante a espera para que
+            ela não expire (a espera máxima é maior que a validade do lease)
+
+    Returns:
+        bool: True se todos os leases foram adquiridos dentro da espera máxima
+    """
+    limite = time.monotonic() + ESPERA_MAXIMA_LEASE
+    while True:
+        adquiridos = []
+        for chave in chaves:
+            if not FirebaseService.adquirir_lease(chave, dono, DURACAO_LEASE):
+                break
+            adquiridos.append(chave)
+        if len(adquiridos) == len(chaves):
+            return True
+
+        for chave in adquiridos:
+            FirebaseService.liberar_lease(chave, dono)
+        if time.monotonic() >= limite:
+            return False
+        if chave_importacao and not FirebaseService.adquirir_lease(chave_importacao, dono, DURACAO_LEASE):
+            print(f"Lease {chave_importacao} perdido durante a espera pelos concursos")
+            return False
+        print(f"Concursos em importação por outro processo ({chaves[len(adquiridos)]}), aguardando...")
+        time.sleep(INTERVALO_ESPERA_LEASE)
+
+
+def obter_status_importacao(importacao_id):
+    """
+    Obtém o status de uma importação.
+
+    Args:
+        importacao_id: ID da importação
+
+    Returns:
+        Dicionário com o status ou None se a importação não existir
+    """
+    doc = _db().collection(COLECAO_IMPORTACOES).document(importacao_id).get()
+    if not doc.exists:
+        return None
+    return _formatar_status(doc.id, doc.to_dict())
+
+
+def executar_importacao(importacao_id, max_lotes=None):
+    """
+    Executa (ou retoma) uma importação de forma síncrona, a partir da marca d'água salva.
+
+    A execução para no primeiro erro, deixando a marca d'água no último concurso
+    contíguo importado, para que a próxima execução tente novamente a partir dele.
+
+    Args:
+        importacao_id: ID da importação
+        max_lotes: Número máximo de lotes a processar nesta execução (None processa todos)
+
+    Returns:
+        Dicionário com o status da importação ao fim da execução
+    """
+    doc_ref = _db().collection(COLECAO_IMPORTACOES).document(importacao_id)
+    doc = doc_ref.get()
+    if not doc.exists:
+        raise ValueError(f'Importação {importacao_id} não encontrada')
+
+    job = doc.to_dict()
+    if job.get('status') == STATUS_CONCLUIDO:
+        return _formatar_status(importacao_id, job)
+
+    # Apenas um processo executa a importação por vez; os demais apenas se anexam a ela
+    dono = uuid.uuid4().hex
+    chave_lease = f"importacao-{importacao_id}"
+    if not FirebaseService.adquirir_lease(chave_lease, dono, DURACAO_LEASE):
+        print(f"Importação {importacao_id} já está em execução em outro processo")
+        return _formatar_status(importacao_id, job)
+
+    try:
+        return _executar_lotes(doc_ref, importacao_id, job, dono, chave_lease, max_lotes)
+    finally:
+        FirebaseService.liberar_lease(chave_lease, dono)
+
+
+def _executar_lotes(doc_ref, importacao_id, job, dono, chave_lease, max_lotes):
+    """Processa os lotes de uma importação cujo lease já foi adquirido."""
+    megasena_api = MegasenaAPI()
+    fim = job['fim']
+    tamanho_lote = job.get('tamanho_lote') or TAMANHO_LOTE_PADRAO
+    proximo = max(job['inicio'], job.get('watermark', job['inicio'] - 1) + 1)
+
+    job['status'] = STATUS_EXECUTANDO
+    job['atualizado_em'] = datetime.now().isoformat()
+    doc_ref.update({'status': job['status'], 'atualizado_em': job['atualizado_em']})
+    print(f"Importação {importacao_id}: processando a partir do concurso {proximo} até {fim}")
+
+    lotes_processados = 0
+    while proximo <= fim:
+        fim_lote = min(fim, proximo + tamanho_lote - 1)
+
+        # Renovar o lease da importação e reservar os blocos de concursos do lote
+        blocos = _blocos_lease(proximo, fim_lote)
+        if not FirebaseService.adquirir_lease(chave_lease, dono, DURACAO_LEASE) or not _adquirir_blocos(blocos, dono, chave_lease):
+            print(f"Importação {importacao_id}: não foi possível reservar os concursos {proximo} a {fim_lote}")
+            doc_ref.update(_registrar_interrupcao(job))
+            break
+
+        try:
+            # Lotes já completos são detectados com uma contagem, sem ler os números um a um
+            if FirebaseService.contar_concursos(proximo, fim_lote) == fim_lote - proximo + 1:
+                existentes = set(range(proximo, fim_lote + 1))
+            else:
+                existentes = FirebaseService.numeros_concursos_existentes(proximo, fim_lote)
+            faltantes = [numero for numero in range(proximo, fim_lote + 1) if numero not in existentes]
+
+            erros_lote = []
+            baixados = []
+            for numero, dados, erro in megasena_api.obter_concursos_em_lote(faltantes):
+                if erro is None:
+                    try:
+                        baixados.append((numero, megasena_api.formatar_resultado(dados)))
+                        continue
+                    except Exception as e:
+                        erro = str(e)
+                erros_lote.append((numero, erro))
+
+            # Os concursos baixados do lote são gravados juntos: cada transação lê o contador de
+            # sequência uma vez e numera todos os concursos que grava
+            if baixados:
+                try:
+                    FirebaseService.salvar_concursos(
+                        [conteudo for _, conteudo in baixados],
+                        metadados={
+                            'fonte': 'api_caixa',
+                            'importacao_automatica': True,
+                            'importacao_id': importacao_id,
+                            'data_importacao': datetime.now().isoformat()
+                        }
+                    )
+                    job['importados'] += len(baixados)
+                except Exception as e:
+                    erros_lote.extend((numero, str(e)) for numero, _ in baixados)
+
+            for numero, erro in sorted(erros_lote):
+                print(f"Importação {importacao_id}: erro no concurso {numero}: {erro}")
+                job['com_erro'] += 1
+                job['erros'] = (job['erros'] + [{'concurso': numero, 'erro': erro}])[-MAX_ERROS_REGISTRADOS:]
+            primeiro_erro = min(numero for numero, _ in erros_lote) if erros_lote else None
+            watermark = primeiro_erro - 1 if primeiro_erro is not None else fim_lote
+        finally:
+            for chave in blocos:
+                FirebaseService.liberar_lease(chave, dono)
+
+        job['ja_existentes'] += len(existentes)
+        job['watermark'] = watermark
+        job['atualizado_em'] = datetime.now().isoformat()
+        if primeiro_erro is not None:
+            _registrar_interrupcao(job)
+        else:
+            # Um lote concluído sem erros zera a contagem de interrupções seguidas
+            job['tentativas'] = 0
+            job['proxima_tentativa'] = None
+            if fim_lote >= fim:
+                job['status'] = STATUS_CONCLUIDO
+
+        # Checkpoint do lote
+        doc_ref.update({
+            'watermark': job['watermark'],
+            'status': job['status'],
+            'importados': job['importados'],
+            'ja_existentes': job['ja_existentes'],
+            'com_erro': job['com_erro'],
+            'erros': job['erros'],
+            'tentativas': job['tentativas'],
+            'proxima_tentativa': job['proxima_tentativa'],
+            'atualizado_em': job['atualizado_em']
+        })
+
+        if primeiro_erro is not None:
+            break
+        if job['status'] == STATUS_CONCLUIDO:
+            # Fundir no bitset de cobertura os concursos gravados pela importação
+            try:
+                FirebaseService.incorporar_cobertura()
+            except Exception as e:
+                print(f"Importação {importacao_id}: erro ao atualizar o índice de cobertura: {str(e)}")
+
+        proximo = fim_lote + 1
+        lotes_processados += 1
+        if max_lotes and lotes_processados >= max_lotes:
+            break
+
+    return _formatar_status(importacao_id, job)
+
+
+def _registrar_falha(importacao_id):
+    """Registra como interrupção uma exceção que encerrou a execução de uma importação."""
+    try:
+        doc_ref = _db().collection(COLECAO_IMPORTACOES).document(importacao_id)
+        doc = doc_ref.get()
+        if doc.exists:
+            doc_ref.update(_registrar_interrupcao(doc.to_dict()))
+    except Exception as e:
+        print(f"Erro ao registrar falha da importação {importacao_id}: {str(e)}")
+
+
+def _executar_em_segundo_plano(importacao_id):
+    try:
+        executar_importacao(importacao_id)
+    except Exception as e:
+        print(f"Erro na importação {importacao_id}: {str(e)}")
+        _registrar_falha(importacao_id)
+    finally:
+        with _lock_threads:
+            _threads.pop(importacao_id, None)
+
+
+def disparar_importacao(importacao_id):
+    """
+    Executa a importação em uma thread, se ela ainda não estiver em execução neste processo.
+
+    Args:
+        importacao_id: ID da importação
+
+    Returns:
+        bool: True se uma nova thread foi iniciada
+    """
+    with _lock_threads:
+        thread = _threads.get(importacao_id)
+        if thread is not None and thread.is_alive():
+            return False
+        thread = threading.Thread(
+            target=_executar_em_segundo_plano,
+            args=(importacao_id,),
+            name=f'importacao_{importacao_id}',
+            daemon=True
+        )
+        _threads[importacao_id] = thread
+        thread.start()
+        return True
+
+
+def iniciar_importacao(inicio, fim=None, tamanho_lote=None, importacao_id=None, chave_idempotencia=None):
+    """
+    Cria uma importação (ou retoma/anexa-se a uma existente) e a executa em segundo plano.
+
+    Args:
+        inicio: Primeiro concurso a importar
+        fim: Último concurso a importar (padrão: último concurso disponível)
+        tamanho_lote: Quantidade de concursos por lote/checkpoint
+        importacao_id: ID de uma importação existente a retomar
+        chave_idempotencia: Chave que identifica pedidos repetidos (padrão: o intervalo)
+
+    Returns:
+        Dicionário com o status da importação
+    """
+    if importacao_id:
+        status = obter_status_importacao(importacao_id)
+        if status is None:
+            raise ValueError(f'Importação {importacao_id} não encontrada')
+    else:
+        status = criar_importacao(inicio, fim, tamanho_lote, chave_idempotencia)
+
+    if status['status'] != STATUS_CONCLUIDO:
+        disparar_importacao(status['id'])
+    return status
+
+
+def _abandonada(dados):
+    """Indica se uma importação marcada como em execução parou de registrar progresso."""
+    try:
+        atualizado_em = datetime.fromisoformat(dados.get('atualizado_em'))
+    except (TypeError, ValueError):
+        return True
+    return datetime.now() - atualizado_em > TEMPO_ABANDONO
+
+
+def _aguardando_tentativa(dados):
+    """Indica se uma importação interrompida ainda aguarda o horário da próxima tentativa."""
+    try:
+        proxima_tentativa = datetime.fromisoformat(dados.get('proxima_tentativa'))
+    except (TypeError, ValueError):
+        return False
+    return datetime.now() < proxima_tentativa
+
+
+def retomar_importacoes_pendentes(max_lotes=None):
+    """
+    Retoma, de forma síncrona, as importações pendentes, interrompidas ou abandonadas.
+    Usado pelo scheduler para avançar importações longas no Cloud Functions, onde threads
+    em segundo plano não continuam após a resposta. Importações interrompidas só são
+    retomadas depois de proxima_tentativa; as que falharam (STATUS_FALHOU) não são retomadas.
+
+    Args:
+        max_lotes: Número máximo de lotes por importação nesta execução
+
+    Returns:
+        Lista com o status de cada importação retomada
+    """
+    from google.cloud.firestore_v1.base_query import FieldFilter
+
+    query = _db().collection(COLECAO_IMPORTACOES).where(
+        filter=FieldFilter('status', 'in', [STATUS_PENDENTE, STATUS_INTERROMPIDO, STATUS_EXECUTANDO])
+    )
+
+    retomadas = []
+    for doc in query.stream():
+        dados = doc.to_dict()
+        if dados.get('status') == STATUS_EXECUTANDO and not _abandonada(dados):
+            continue
+        if dados.get('status') == STATUS_INTERROMPIDO and _aguardando_tentativa(dados):
+            continue
+        with _lock_threads:
+            thread = _threads.get(doc.id)
+            if thread is not None and thread.is_alive():
+                continue
+        try:
+            retomadas.append(executar_importacao(doc.id, max_lotes=max_lotes))
+        except Exception as e:
+            print(f"Erro ao retomar importação {doc.id}: {str(e)}")
+            _registrar_falha(doc.id)
+    return retomadas
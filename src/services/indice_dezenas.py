@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+"""
+Índice invertido em memória: de cada dezena para o bitset dos concursos em que ela saiu.
+
+O índice é derivado do histórico em memória (historico_store) e mantido incrementalmente
+por um observador, sem reler o Firestore. Buscas por combinações de dezenas intersectam
+os bitsets; buscas com mínimo de acertos ("pelo menos 4 destas 6") somam os bitsets com
+um contador bit a bit (bit-sliced), então o custo de uma busca depende apenas da
+quantidade de dezenas pedidas, com operações sobre inteiros de alguns milhares de bits.
+"""
+import re
+import threading
+from src.services import historico_store
+
+MAX_DEZENAS_BUSCA = 20
+LIMITE_PADRAO = 50
+LIMITE_MAXIMO = 1000
+
+# _indice['dezenas'][d]: bitset dos concursos com a dezena d (bit n = concurso n)
+# _indice['mascaras'][n]: máscara de 60 bits das dezenas do concurso n (bit d-1 = dezena d)
+_indice = {'dezenas': [0] * 61, 'mascaras': {}, 'ultimo': None, 'construido': False}
+_lock = threading.Lock()
+
+
+def _mascara(dezenas):
+    mascara = 0
+    for dezena in dezenas or []:
+        mascara |= 1 << (int(dezena) - 1)
+    return mascara
+
+
+def _aplicar(sorteios, completo=False):
+    """Atualiza o índice com os concursos alterados no histórico (observador do historico_store)."""
+    with _lock:
+        if completo:
+            _indice['dezenas'] = [0] * 61
+            _indice['mascaras'] = {}
+            _indice['ultimo'] = None
+            _indice['construido'] = True
+        dezenas = _indice['dezenas']
+        mascaras = _indice['mascaras']
+        for numero, entrada in sorteios.items():
+            numero = int(numero)
+            bit = 1 << numero
+            # Um concurso regravado pode ter tido as dezenas corrigidas: remover as antigas
+            anterior = mascaras.get(numero, 0)
+            while anterior:
+                menor = anterior & -anterior
+                dezenas[menor.bit_length()] &= ~bit
+                anterior ^= menor
+            mascara = _mascara(entrada.get('dezenas'))
+            mascaras[numero] = mascara
+            _indice['ultimo'] = max(_indice['ultimo'] or 0, numero)
+            restante = mascara
+            while restante:
+                menor = restante & -restante
+                dezenas[menor.bit_length()] |= bit
+                restante ^= menor
+
+
+historico_store.registrar_observador(_aplicar)
+
+
+def _garantir_construido():
+    """Carrega o histórico (o que constrói o índice) e o mantém em dia com concursos novos."""
+    historico_store.atualizar()
+    if not _indice['construido']:
+        ultimo = historico_store.ultimo_numero()
+        if not _indice['construido']:
+            # O histórico já estava carregado antes do registro do observador
+            _aplicar(historico_store.obter_entradas(1, ultimo or 0), completo=True)
+
+
+def validar_dezenas(dezenas):
+    """
+    Converte o parâmetro dezenas ("04,27,53", "4+27+53" ou lista) em uma lista ordenada de dezenas.
+
+    Raises:
+        ValueError: Se houver dezena inválida, repetida ou quantidade fora dos limites
+    """
+    if isinstance(dezenas, str):
+        dezenas = [parte for parte in re.split(r'[\s,;+\-]+', dezenas) if parte]
+    try:
+        dezenas = [int(dezena) for dezena in dezenas or []]
+    except (ValueError, TypeError):
+        raise ValueError("Dezenas inválidas")
+    if not 1 <= len(dezenas) <= MAX_DEZENAS_BUSCA:
+        raise ValueError(f"Informe de 1 a {MAX_DEZENAS_BUSCA} dezenas")
+    if len(set(dezenas)) != len(dezenas) or any(not 1 <= dezena <= 60 for dezena in dezenas):
+        raise ValueError("As dezenas devem ser distintas e estar entre 1 e 60")
+    return sorted(dezenas)
+
+
+def _pelo_menos(bitsets, minimo):
+    """
+    Bitset dos concursos presentes em pelo menos `minimo` dos bitsets, com um contador
+    bit a bit: planos[i] guarda o bit i da contagem de cada concurso.
+    """
+    planos = []
+    for bitset in bitsets:
+        transporte = bitset
+        for i in range(len(planos)):
+            planos[i], transporte = planos[i] ^ transporte, planos[i] & transporte
+            if not transporte:
+                break
+        if transporte:
+            planos.append(transporte)
+
+    if minimo >= 1 << len(planos):
+        return 0
+    # Comparação contagem >= minimo, do bit mais significativo para o menos
+    universo = 0
+    for bitset in bitsets:
+        universo |= bitset
+    maior = 0
+    igual = universo
+    for i in reversed(range(len(planos))):
+        if (minimo >> i) & 1:
+            igual &= planos[i]
+        else:
+            maior |= igual & planos[i]
+            igual &= ~planos[i]
+    return maior | igual
+
+
+def buscar_concursos(dezenas, minimo=None, limite=LIMITE_PADRAO):
+    """
+    Busca os concursos que contêm as dezenas informadas (todas, ou pelo menos `minimo`).
+
+    Args:
+        dezenas: Dezenas buscadas ("04,27,53" ou lista de inteiros)
+        minimo: Quantidade mínima de dezenas em comum (padrão: todas)
+        limite: Número máximo de concursos listados, do mais recente para o mais antigo
+
+    Returns:
+        Dicionário com o total de concursos encontrados e a lista dos mais recentes,
+        com os acertos e as dezenas de cada um
+    """
+    dezenas = validar_dezenas(dezenas)
+    minimo = len(dezenas) if minimo is None else int(minimo)
+    if not 1 <= minimo <= len(dezenas):
+        raise ValueError(f"O mínimo deve estar entre 1 e {len(dezenas)}")
+    limite = max(1, min(LIMITE_MAXIMO, limite or LIMITE_PADRAO))
+
+    _garantir_construido()
+    with _lock:
+        bitsets = [_indice['dezenas'][dezena] for dezena in dezenas]
+        mascaras = _indice['mascaras']
+        if minimo == len(dezenas):
+            encontrados = bitsets[0]
+            for bitset in bitsets[1:]:
+                encontrados &= bitset
+        else:
+            encontrados = _pelo_menos(bitsets, minimo)
+
+        consulta = _mascara(dezenas)
+        total = encontrados.bit_count()
+        concursos = []
+        restantes = encontrados
+        while restantes and len(concursos) < limite:
+            numero = restantes.bit_length() - 1
+            restantes ^= 1 << numero
+            mascara = mascaras.get(numero, 0)
+            concursos.append({
+                'concurso': numero,
+                'acertos': (mascara & consulta).bit_count(),
+                'dezenas': [f"{dezena:02d}" for dezena in range(1, 61) if mascara >> (dezena - 1) & 1]
+            })
+        ultimo_concurso = _indice['ultimo']
+
+    return {
+        'status': 'success',
+        'dezenas': [f"{dezena:02d}" for dezena in dezenas],
+        'minimo': minimo,
+        'total': total,
+        'concursos': concursos,
+        'ultimo_concurso': ultimo_concurso
+    }
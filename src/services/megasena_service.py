@@ -1,11 +1,29 @@
 # -*- coding: utf-8 -*-
 from src.scrap import getResultMegasenaScrapping
 from src.megasena_api import MegasenaAPI
+import base64
+import binascii
 import json
 from datetime import datetime
 from google.cloud import firestore
 from google.api_core.datetime_helpers import DatetimeWithNanoseconds
-from src.services.firebase_service import FirebaseService, FirestoreEncoder
+from src.services.firebase_service import FirebaseService, FirestoreEncoder, CAMPOS_CONCURSO
+from src.services.importacao_service import iniciar_importacao, obter_status_importacao
+from src.services import historico_store, http_cache, cobertura_service, conferencia_service, backtest_service, indice_dezenas, coocorrencia_service, atrasos_service, perfis_service, tendencias_service, series_service, cidades_service
+
+# Campos que podem ser pedidos no histórico (parâmetro fields)
+CAMPOS_HISTORICO = ('concurso',) + CAMPOS_CONCURSO
+# Campos disponíveis no histórico em memória (blocos); pedidos só com eles não leem o Firestore
+CAMPOS_HISTORICO_MEMORIA = (
+    'concurso', 'data_sorteio', 'dezenas', 'premiacao', 'acumulado', 'valor_arrecadado',
+    'valor_acumulado_proximo_concurso', 'valor_estimado_proximo_concurso'
+)
+PAGE_SIZE_MAXIMO = 100
+# Tamanho padrão e máximo de cada resposta da sincronização incremental
+SYNC_LIMITE_PADRAO = 500
+SYNC_LIMITE_MAXIMO = 1000
+# Quantidade máxima de janelas por requisição de estatísticas
+MAX_JANELAS_ESTATISTICAS = 10
 
 def obter_resultado_via_scraping():
     """Obtém o resultado da Megasena via scraping."""
@@ -50,17 +68,7 @@ def obter_resultado_api(concurso=None):
     else:
         resultado = megasena_api.obter_ultimo_resultado()
     
-    # Salvar resultado no Firebase, se disponível
-    if FirebaseService.is_available():
-        try:
-            FirebaseService.salvar_resultado(
-                url=f"https://servicebus2.caixa.gov.br/portaldeloterias/api/megasena/{concurso if concurso else ''}",
-                conteudo=resultado,
-                metadados={'fonte': 'api_caixa', 'endpoint': '/megasena/api'}
-            )
-        except Exception as e:
-            print(f"Erro ao salvar resultado no Firebase: {str(e)}")
-    
+    # Concursos obtidos da API da Caixa já são salvos na coleção concursos pelo MegasenaAPI
     return resultado
 
 def obter_estatisticas(ultimos_n=10):
@@ -92,6 +100,40 @@ def obter_estatisticas(ultimos_n=10):
     
     return estatisticas
 
+def validar_janelas(janelas):
+    """
+    Converte o parâmetro janelas ("10,50,100,500", "10+50" ou lista) em uma lista ordenada
+    de janelas distintas.
+    
+    Raises:
+        ValueError: Se houver janela inválida ou mais de MAX_JANELAS_ESTATISTICAS janelas
+    """
+    if isinstance(janelas, str):
+        janelas = [parte for parte in janelas.replace('+', ',').split(',') if parte.strip()]
+    try:
+        janelas = sorted({int(janela) for janela in janelas or []})
+    except (ValueError, TypeError):
+        raise ValueError("Janelas inválidas")
+    if not janelas or janelas[0] <= 0:
+        raise ValueError("Informe ao menos uma janela com número positivo de concursos")
+    if len(janelas) > MAX_JANELAS_ESTATISTICAS:
+        raise ValueError(f"Informe no máximo {MAX_JANELAS_ESTATISTICAS} janelas")
+    return janelas
+
+def obter_estatisticas_janelas(janelas):
+    """
+    Obtém as estatísticas de várias janelas de concursos em uma única passada.
+    
+    Args:
+        janelas: Lista de janelas já validada por validar_janelas
+    """
+    return MegasenaAPI().obter_estatisticas_janelas(janelas)
+
+def obter_estado_upstream():
+    """Obtém o estado do circuit breaker e as latências da API da Caixa."""
+    megasena_api = MegasenaAPI()
+    return megasena_api.obter_estado_upstream()
+
 def executar_scraping(url=None, opcoes=None):
     """Executa um scraping e salva no Firebase."""
     if not FirebaseService.is_available():
@@ -106,8 +148,8 @@ def executar_scraping(url=None, opcoes=None):
     
     return resultado
 
-def importar_concursos_megasena(inicio=2800, fim=None):
-    """Importa vários concursos da Megasena e armazena no Firebase."""
+def importar_concursos_megasena(inicio=2800, fim=None, tamanho_lote=None, importacao_id=None, chave_idempotencia=None):
+    """Inicia (ou retoma) em segundo plano a importação de concursos da Megasena para o Firebase."""
     if not FirebaseService.is_available():
         raise Exception('Firebase não está disponível neste ambiente')
     
@@ -116,26 +158,306 @@ def importar_concursos_megasena(inicio=2800, fim=None):
         inicio = int(inicio)
         if fim is not None:
             fim = int(fim)
+        if tamanho_lote is not None:
+            tamanho_lote = int(tamanho_lote)
     except ValueError:
         raise ValueError('Parâmetros inválidos (devem ser números)')
     
-    # Executar importação
-    resultado = FirebaseService.importar_concursos_megasena(inicio, fim)
+    # Criar a importação e executá-la em segundo plano
+    resultado = iniciar_importacao(inicio, fim, tamanho_lote, importacao_id, chave_idempotencia)
     
     return resultado
 
-def obter_historico_megasena(limite=10):
-    """Obtém o histórico de resultados da Megasena armazenados no Firebase."""
+def obter_status_importacao_megasena(importacao_id):
+    """Obtém o progresso de uma importação de concursos da Megasena."""
+    if not FirebaseService.is_available():
+        raise Exception('Firebase não está disponível neste ambiente')
+    
+    if not importacao_id:
+        raise ValueError('ID da importação não informado')
+    
+    return obter_status_importacao(importacao_id)
+
+def obter_cobertura_megasena():
+    """
+    Obtém quantos concursos estão salvos na coleção concursos em relação ao último concurso.
+    
+    Com o índice de cobertura, a quantidade e as lacunas vêm de uma única leitura. Sem ele,
+    a quantidade vem de uma consulta de agregação (count), sem ler os documentos. O último
+    concurso vem do cache HTTP quando conhecido, ou do concurso mais recente salvo.
+    """
+    if not FirebaseService.is_available():
+        raise Exception('Firebase não está disponível neste ambiente')
+    
+    bits = FirebaseService.ler_cobertura()
+    if bits is not None:
+        ultimo_concurso = cobertura_service.ultimo_concurso(bits)
+        intervalos = cobertura_service.lacunas(bits, ultimo_concurso)
+        armazenados = ultimo_concurso - sum(fim - inicio + 1 for inicio, fim in intervalos)
+    else:
+        ultimo_concurso = http_cache.ultimo_concurso_conhecido()
+        if ultimo_concurso is None:
+            ultimos = FirebaseService.buscar_ultimos_concursos(limite=1)
+            ultimo_concurso = ultimos[0].get('concurso') if ultimos else 0
+        armazenados = FirebaseService.contar_concursos(1, ultimo_concurso) if ultimo_concurso else 0
+        intervalos = None
+    
+    return {
+        'status': 'success',
+        'ultimo_concurso': ultimo_concurso,
+        'armazenados': armazenados,
+        'faltantes': max(0, ultimo_concurso - armazenados),
+        'percentual': round(armazenados / ultimo_concurso * 100, 2) if ultimo_concurso else 0.0,
+        # Intervalos [inicio, fim] ausentes; None quando o índice de cobertura ainda não existe
+        'lacunas': [list(intervalo) for intervalo in intervalos] if intervalos is not None else None
+    }
+
+def sincronizar_concursos(desde=0, limite=SYNC_LIMITE_PADRAO):
+    """
+    Obtém os concursos gravados ou alterados depois de uma marca d'água, para que réplicas
+    (caches, bancos locais, arquivos exportados) se atualizem sem reler o histórico.
+    
+    Args:
+        desde: Última sequência recebida (valor de watermark da resposta anterior)
+        limite: Número máximo de concursos na resposta
+    """
+    if not FirebaseService.is_available():
+        raise Exception('Firebase não está disponível neste ambiente')
+    
+    try:
+        desde = int(desde or 0)
+    except (ValueError, TypeError):
+        raise ValueError("Parâmetro desde inválido")
+    if desde < 0:
+        raise ValueError("Parâmetro desde inválido")
+    limite = max(1, min(SYNC_LIMITE_MAXIMO, limite or SYNC_LIMITE_PADRAO))
+    
+    alteracoes = FirebaseService.buscar_alteracoes(desde, limite)
+    return {
+        'status': 'success',
+        'desde': desde,
+        'total': len(alteracoes['concursos']),
+        **alteracoes
+    }
+
+def conferir_apostas_megasena(apostas, concurso=None, inicio=None, fim=None, max_premiadas=None):
+    """
+    Confere um lote de apostas contra um concurso ou um intervalo de concursos.
+    
+    Args:
+        apostas: Iterável de apostas (linhas de texto de um upload ou listas de dezenas)
+        concurso: Concurso a conferir (padrão: o último concurso)
+        inicio: Primeiro concurso de um intervalo (alternativa a concurso)
+        fim: Último concurso do intervalo
+        max_premiadas: Número máximo de apostas premiadas listadas
+    """
+    if inicio is None:
+        inicio = concurso
+    if inicio is None:
+        inicio = MegasenaAPI().obter_ultimo_resultado().get('concurso')
+    if fim is None:
+        fim = inicio
+    
+    return conferencia_service.conferir_apostas(
+        apostas, int(inicio), int(fim),
+        max_premiadas=max_premiadas or conferencia_service.MAX_PREMIADAS_PADRAO
+    )
+
+def executar_backtest_megasena(apostas, inicio=None, fim=None):
+    """
+    Avalia como um conjunto de apostas teria se saído no histórico de concursos.
+    
+    Args:
+        apostas: Lista de apostas (listas de 6 a 20 dezenas)
+        inicio: Primeiro concurso (padrão: 1)
+        fim: Último concurso (padrão: o último do histórico)
+    """
+    if not isinstance(apostas, list):
+        raise ValueError("Informe as apostas como uma lista de listas de dezenas")
+    return backtest_service.executar_backtest(apostas, inicio or 1, fim)
+
+def parametros_busca(dezenas, minimo=None, limite=None):
+    """
+    Valida os parâmetros da busca por dezenas e retorna os que alteram o conteúdo da
+    resposta (usados na ETag).
+    """
+    return {
+        # Sem vírgulas, que separam as ETags no If-None-Match
+        'dezenas': '+'.join(str(dezena) for dezena in indice_dezenas.validar_dezenas(dezenas)),
+        'minimo': minimo,
+        'limite': limite
+    }
+
+def buscar_concursos_megasena(dezenas, minimo=None, limite=None):
+    """
+    Busca os concursos que contêm uma combinação de dezenas, pelo índice invertido em memória.
+    
+    Args:
+        dezenas: Dezenas buscadas ("04,27,53", "4+27+53" ou lista)
+        minimo: Quantidade mínima de dezenas em comum (padrão: todas)
+        limite: Número máximo de concursos listados
+    """
+    return indice_dezenas.buscar_concursos(dezenas, minimo, limite)
+
+def obter_coocorrencia_megasena(tamanho=2, ultimos=None, inicio=None, fim=None, top=None):
+    """
+    Obtém os pares ou trios de dezenas mais e menos frequentes em uma janela de concursos.
+    
+    Args:
+        tamanho: 2 para pares, 3 para trios
+        ultimos: Janela com os últimos N concursos (padrão: todo o histórico)
+        inicio: Primeiro concurso da janela (alternativa a ultimos)
+        fim: Último concurso da janela
+        top: Quantidade de combinações em cada ranking
+    """
+    return coocorrencia_service.obter_coocorrencia(tamanho or 2, inicio, fim, top, ultimos)
+
+def obter_atrasos_megasena(ordenar=None):
+    """
+    Obtém o atraso atual, o maior atraso e o intervalo médio entre aparições de cada dezena.
+    
+    Args:
+        ordenar: Critério de ordenação (dezena, atraso, maior_atraso ou aparicoes)
+    """
+    return atrasos_service.obter_atrasos(ordenar)
+
+def obter_perfis_megasena(ultimos=None, inicio=None, fim=None):
+    """
+    Obtém os histogramas de pares/ímpares, faixas de soma, décadas e quadrantes de uma janela de concursos.
+    
+    Args:
+        ultimos: Janela com os últimos N concursos (padrão: todo o histórico)
+        inicio: Primeiro concurso da janela (alternativa a ultimos)
+        fim: Último concurso da janela
+    """
+    return perfis_service.obter_perfis(ultimos, inicio, fim)
+
+def obter_tendencias_megasena(janela=None, pontos=None):
+    """
+    Obtém a frequência de cada dezena em janelas móveis ao longo do histórico.
+    
+    Args:
+        janela: Quantidade de concursos de cada janela
+        pontos: Quantidade máxima de pontos da série
+    """
+    return tendencias_service.obter_tendencias(janela, pontos)
+
+def obter_series_megasena(campo=None, pontos=None, agrupar=None, ultimos=None, inicio=None, fim=None):
+    """
+    Obtém a série temporal de arrecadação, estimativas ou prêmios dos concursos, reduzida para gráficos.
+    
+    Args:
+        campo: Campo da série (ex.: valor_arrecadado, valor_estimado_proximo_concurso, premio_sena)
+        pontos: Quantidade máxima de pontos da série
+        agrupar: 'mes' ou 'ano' para incluir os agregados por período
+        ultimos: Janela com os últimos N concursos (padrão: todo o histórico)
+        inicio: Primeiro concurso da janela (alternativa a ultimos)
+        fim: Último concurso da janela
+    """
+    return series_service.obter_series(campo, pontos, agrupar, ultimos, inicio, fim)
+
+def obter_cidades_ganhadoras_megasena(uf=None, busca=None, top=None):
+    """
+    Obtém o ranking das UFs e das cidades com mais ganhadores da sena.
+    
+    Args:
+        uf: Restringe as cidades a uma UF
+        busca: Prefixo do nome da cidade (sem diferenciar maiúsculas e acentos)
+        top: Quantidade de cidades e de UFs listadas
+    """
+    return cidades_service.obter_cidades_ganhadoras(uf, busca, top)
+
+def codificar_cursor(numero):
+    """Gera o cursor opaco de paginação do histórico a partir do último concurso da página."""
+    return base64.urlsafe_b64encode(f"n:{int(numero)}".encode('ascii')).decode('ascii').rstrip('=')
+
+def decodificar_cursor(cursor):
+    """
+    Extrai o número do concurso de um cursor de paginação do histórico.
+    
+    Raises:
+        ValueError: Se o cursor for inválido
+    """
+    if not cursor:
+        return None
+    try:
+        valor = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode('ascii')
+        prefixo, numero = valor.split(':', 1)
+        numero = int(numero)
+    except (ValueError, UnicodeDecodeError, binascii.Error):
+        raise ValueError('Cursor de paginação inválido')
+    if prefixo != 'n' or numero < 1:
+        raise ValueError('Cursor de paginação inválido')
+    return numero
+
+def validar_campos_historico(fields):
+    """
+    Converte o parâmetro fields (lista separada por vírgulas) nos campos do histórico.
+    
+    Returns:
+        Lista ordenada de campos, ou None se nenhum campo foi pedido
+        
+    Raises:
+        ValueError: Se algum campo não existir
+    """
+    if not fields:
+        return None
+    campos = sorted({campo.strip() for campo in fields.split(',') if campo.strip()})
+    invalidos = [campo for campo in campos if campo not in CAMPOS_HISTORICO]
+    if invalidos:
+        raise ValueError(f"Campos inválidos: {', '.join(invalidos)}. Campos disponíveis: {', '.join(CAMPOS_HISTORICO)}")
+    return campos or None
+
+def parametros_historico(page_size, campos=None):
+    """Parâmetros do histórico que alteram o conteúdo da resposta (usados na ETag)."""
+    parametros = {'page_size': min(PAGE_SIZE_MAXIMO, page_size)}
+    if campos:
+        # Sem vírgulas, que separam as ETags no If-None-Match
+        parametros['fields'] = '+'.join(campos)
+    return parametros
+
+def obter_historico_megasena(limite=10, cursor=None, campos=None):
+    """
+    Obtém uma página do histórico de resultados da Megasena armazenados no Firebase.
+    
+    Args:
+        limite: Tamanho da página (page_size)
+        cursor: Cursor opaco retornado em proximo_cursor pela página anterior
+        campos: Campos a retornar (validar_campos_historico); None retorna os campos padrão
+        
+    Returns:
+        Dicionário com os resultados da página e o cursor da próxima página
+    """
     if not FirebaseService.is_available():
         raise ValueError("Firebase não está disponível")
     
     # Obter os resultados e validar o limite
     try:
-        limite = int(limite)
-    except ValueError:
+        limite = min(PAGE_SIZE_MAXIMO, max(1, int(limite)))
+    except (ValueError, TypeError):
         limite = 10
-        
-    resultados = FirebaseService.obter_historico_megasena(limite)
+    antes_de = decodificar_cursor(cursor)
+    
+    # Pedidos apenas com campos guardados nos blocos são servidos do histórico em memória,
+    # sem leituras; os demais vêm do Firestore, lendo apenas os campos pedidos. Sem fields,
+    # a resposta mantém o formato completo (documento e metadados), lido do Firestore
+    if campos and set(campos) <= set(CAMPOS_HISTORICO_MEMORIA) and historico_store.disponivel():
+        paginas = [
+            ({campo: conteudo.get(campo) for campo in ['concurso'] + campos}, {'concurso': conteudo['concurso']})
+            for conteudo in historico_store.obter_ultimos(limite + 1, antes_de)
+        ]
+    elif campos:
+        paginas = [(conteudo, {'concurso': conteudo['concurso']})
+                   for conteudo in FirebaseService.buscar_historico_paginado(limite + 1, antes_de, campos)]
+    else:
+        paginas = FirebaseService.buscar_historico_paginado(limite + 1, antes_de, com_metadados=True)
+    
+    # Um resultado além do tamanho da página indica que existe uma próxima página
+    proximo_cursor = codificar_cursor(paginas[limite - 1][0]['concurso']) if len(paginas) > limite else None
+    resultados = [
+        {'id': str(conteudo['concurso']), 'conteudo': conteudo, 'metadados': metadados}
+        for conteudo, metadados in paginas[:limite]
+    ]
     
     # Processar os resultados para garantir que todos os dados são serializáveis
     resultados_processados = []
@@ -180,6 +502,8 @@ def obter_historico_megasena(limite=10):
     return {
         'status': 'success',
         'total': len(resultados_serializaveis),
+        'page_size': limite,
+        'proximo_cursor': proximo_cursor,
         'resultados': resultados_serializaveis
     }
 
@@ -203,53 +527,24 @@ def obter_ultimos_sorteios(ultimos_n=10):
     # Calcular o número do primeiro concurso a analisar
     primeiro_concurso = max(1, numero_ultimo - ultimos_n + 1)
     
-    # Obter concursos já salvos no Firestore (para evitar duplicação)
+    # Obter os concursos já salvos do histórico em memória (blocos do Firestore)
     concursos_existentes = {}
     if FirebaseService.is_available():
         try:
-            # Buscar documentos que possuem o atributo metadados.concurso
-            from google.cloud.firestore_v1.base_query import FieldFilter
-            db = FirebaseService.get_instance().db
-            
-            # Para cada concurso no intervalo desejado, verificar se já existe
-            for num_concurso in range(primeiro_concurso, numero_ultimo + 1):
-                # Buscar por documentos onde metadados.concurso == num_concurso
-                query = db.collection('scraping_results').where(
-                    filter=FieldFilter('metadados.concurso', '==', num_concurso)
-                ).limit(1)
-                
-                docs = list(query.get())
-                if docs:
-                    # Se encontrou o documento, armazena o ID
-                    concursos_existentes[num_concurso] = docs[0].id
-                    print(f"Concurso {num_concurso} já existe no Firestore com ID {docs[0].id}")
+            for conteudo in historico_store.obter_sorteios(primeiro_concurso, numero_ultimo):
+                concursos_existentes[conteudo['concurso']] = conteudo
         except Exception as e:
-            print(f"Erro ao verificar concursos existentes: {str(e)}")
+            print(f"Erro ao buscar concursos existentes: {str(e)}")
     
     # Coletar dados dos concursos
     ultimos_sorteios = []
     for num_concurso in range(primeiro_concurso, numero_ultimo + 1):
         try:
             if num_concurso in concursos_existentes:
-                # Se o concurso já existe, obter do Firestore
-                try:
-                    if FirebaseService.is_available():
-                        doc_ref = db.collection('scraping_results').document(concursos_existentes[num_concurso])
-                        doc = doc_ref.get()
-                        
-                        if doc.exists and 'conteudo' in doc.to_dict():
-                            print(f"Obtendo concurso {num_concurso} do Firestore")
-                            ultimos_sorteios.append(doc.to_dict()['conteudo'])
-                        else:
-                            print(f"Documento do concurso {num_concurso} existe, mas faltam dados. Obtendo da API...")
-                            obter_e_adicionar_concurso(megasena_api, num_concurso, ultimos_sorteios, salvar=False)
-                except Exception as e:
-                    print(f"Erro ao obter concurso {num_concurso} do Firestore: {str(e)}")
-                    # Fallback para API
-                    obter_e_adicionar_concurso(megasena_api, num_concurso, ultimos_sorteios, salvar=False)
+                ultimos_sorteios.append(_resumo_sorteio(concursos_existentes[num_concurso]))
             else:
-                # Se o concurso não existe, obter da API e salvar
-                obter_e_adicionar_concurso(megasena_api, num_concurso, ultimos_sorteios, salvar=True)
+                # Se o concurso não existe, obter da API (que o salva no Firestore)
+                obter_e_adicionar_concurso(megasena_api, num_concurso, ultimos_sorteios)
         except Exception as e:
             print(f"Erro ao processar concurso {num_concurso}: {str(e)}")
     
@@ -263,63 +558,28 @@ def obter_ultimos_sorteios(ultimos_n=10):
         'sorteios': ultimos_sorteios
     }
 
-def obter_e_adicionar_concurso(megasena_api, num_concurso, ultimos_sorteios, salvar=False):
+def _resumo_sorteio(dados):
+    """Extrai de um resultado formatado as informações retornadas em ultimos_sorteios."""
+    return {
+        'concurso': dados.get('concurso'),
+        'data_sorteio': dados.get('data_sorteio'),
+        'dezenas': dados.get('dezenas', []),
+        'premio_acumulado': dados.get('valor_acumulado_proximo_concurso', 0.0)
+    }
+
+def obter_e_adicionar_concurso(megasena_api, num_concurso, ultimos_sorteios):
     """
-    Função auxiliar para obter um concurso da API e opcionalmente salvá-lo.
+    Função auxiliar para obter um concurso e adicioná-lo à lista de sorteios.
+    O MegasenaAPI salva na coleção concursos os concursos obtidos da API da Caixa.
     
     Args:
         megasena_api: Instância da API da Megasena
         num_concurso: Número do concurso a obter
         ultimos_sorteios: Lista onde adicionar o sorteio
-        salvar: Se True, salva o resultado no Firestore
     """
     print(f"Obtendo concurso {num_concurso} da API...")
     try:
         dados = megasena_api.obter_resultado_formatado(num_concurso)
-        
-        # Extrair apenas as informações relevantes
-        sorteio = {
-            'concurso': dados.get('concurso'),
-            'data_sorteio': dados.get('data_sorteio'),
-            'dezenas': dados.get('dezenas', []),
-            'premio_acumulado': dados.get('valor_acumulado_proximo_concurso', 0.0)
-        }
-        
-        # Adicionar o sorteio à lista
-        ultimos_sorteios.append(sorteio)
-        
-        # Salvar no Firestore, se solicitado
-        if salvar and FirebaseService.is_available():
-            print(f"Verificando se o concurso {num_concurso} já existe antes de salvar...")
-            try:
-                from google.cloud.firestore_v1.base_query import FieldFilter
-                db = FirebaseService.get_instance().db
-                
-                # Verificar se o concurso já existe
-                query = db.collection('scraping_results').where(
-                    filter=FieldFilter('metadados.concurso', '==', num_concurso)
-                ).limit(1)
-                
-                docs = list(query.get())
-                if not docs:
-                    # Se não existe, salvar
-                    print(f"Concurso {num_concurso} não existe no Firestore. Salvando...")
-                    doc_id = FirebaseService.salvar_resultado(
-                        url=f"ultimos_sorteios/megasena/{num_concurso}",
-                        conteudo=sorteio,
-                        metadados={
-                            'fonte': 'api_caixa', 
-                            'endpoint': '/megasena/ultimos_sorteios',
-                            'concurso': num_concurso
-                        }
-                    )
-                    print(f"Concurso {num_concurso} salvo com ID {doc_id}")
-                else:
-                    print(f"Concurso {num_concurso} já existe no Firestore com ID {docs[0].id}, não será salvo novamente")
-            except Exception as e:
-                print(f"Erro ao verificar/salvar concurso {num_concurso} no Firestore: {str(e)}")
+        ultimos_sorteios.append(_resumo_sorteio(dados))
     except Exception as e:
         print(f"Erro ao obter concurso {num_concurso} da API: {str(e)}")
-        return None
-    
-    return sorteio 
\ No newline at end of file
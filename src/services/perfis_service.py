@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+"""
+Perfis de distribuição dos sorteios: pares e ímpares, faixas de soma, décadas e quadrantes.
+
+Cada concurso é convertido uma única vez em uma linha de características com codificação
+one-hot (uma coluna por valor possível de cada perfil), a partir das dezenas do histórico
+em memória. Os histogramas de uma janela saem de somas cumulativas dessas linhas:
+histograma(inicio..fim) = cumulativa[fim] - cumulativa[inicio - 1], sem percorrer os sorteios.
+
+As características são mantidas por um observador do historico_store; um concurso novo ou
+corrigido invalida apenas as somas cumulativas a partir dele.
+"""
+import threading
+from src.services import historico_store
+
+# Dependência opcional: sem numpy, os histogramas são calculados sorteio a sorteio na janela pedida
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+LARGURA_FAIXA_SOMA = 20
+# Somas possíveis: de 21 (01 a 06) a 345 (55 a 60)
+FAIXAS_SOMA = 345 // LARGURA_FAIXA_SOMA + 1
+DECADAS = 6
+# O volante tem 6 linhas de 10 dezenas; os quadrantes dividem linhas (01-30 / 31-60) e colunas (1-5 / 6-10)
+QUADRANTES = 4
+
+# Posição de cada perfil na linha de características
+_INICIO_PARES = 0
+_INICIO_SOMA = _INICIO_PARES + 7
+_INICIO_DECADAS = _INICIO_SOMA + FAIXAS_SOMA
+_INICIO_QUADRANTES = _INICIO_DECADAS + DECADAS * 7
+TOTAL_COLUNAS = _INICIO_QUADRANTES + QUADRANTES * 7
+
+_estado = {
+    'caracteristicas': None,  # matriz (capacidade × TOTAL_COLUNAS) uint8; a linha n é o concurso n
+    'cumulativa': None,       # somas cumulativas das linhas 0..k
+    'valida_ate': -1,         # última linha com soma cumulativa válida
+    'sorteios': {},           # numero -> dezenas, para o cálculo sem numpy
+    'ultimo': 0,
+    'construido': False
+}
+_lock = threading.Lock()
+
+
+def _quadrante(dezena):
+    linha, coluna = divmod(dezena - 1, 10)
+    return (linha >= 3) * 2 + (coluna >= 5)
+
+
+def _colunas(dezenas):
+    """Colunas ligadas na linha de características de um sorteio (cálculo escalar)."""
+    decadas = [0] * DECADAS
+    quadrantes = [0] * QUADRANTES
+    for dezena in dezenas:
+        decadas[(dezena - 1) // 10] += 1
+        quadrantes[_quadrante(dezena)] += 1
+    return ([_INICIO_PARES + sum(1 for dezena in dezenas if dezena % 2 == 0),
+             _INICIO_SOMA + sum(dezenas) // LARGURA_FAIXA_SOMA]
+            + [_INICIO_DECADAS + i * 7 + quantidade for i, quantidade in enumerate(decadas)]
+            + [_INICIO_QUADRANTES + i * 7 + quantidade for i, quantidade in enumerate(quadrantes)])
+
+
+def _caracteristicas(dezenas):
+    """
+    Linhas de características de vários sorteios de uma vez.
+
+    Args:
+        dezenas: Matriz N×6 das dezenas sorteadas
+
+    Returns:
+        Matriz N×TOTAL_COLUNAS uint8 com uma coluna ligada por valor de cada perfil
+    """
+    quantidade = dezenas.shape[0]
+    linhas = np.arange(quantidade)
+    resultado = np.zeros((quantidade, TOTAL_COLUNAS), dtype=np.uint8)
+    resultado[linhas, _INICIO_PARES + (dezenas % 2 == 0).sum(axis=1)] = 1
+    resultado[linhas, _INICIO_SOMA + dezenas.sum(axis=1) // LARGURA_FAIXA_SOMA] = 1
+
+    decadas = ((dezenas - 1) // 10)[:, :, None] == np.arange(DECADAS)
+    resultado[linhas[:, None], _INICIO_DECADAS + np.arange(DECADAS) * 7 + decadas.sum(axis=1)] = 1
+
+    linha, coluna = np.divmod(dezenas - 1, 10)
+    quadrantes = ((linha >= 3) * 2 + (coluna >= 5))[:, :, None] == np.arange(QUADRANTES)
+    resultado[linhas[:, None], _INICIO_QUADRANTES + np.arange(QUADRANTES) * 7 + quadrantes.sum(axis=1)] = 1
+    return resultado
+
+
+def _garantir_capacidade(numero):
+    capacidade = 0 if _estado['caracteristicas'] is None else _estado['caracteristicas'].shape[0]
+    if numero < capacidade:
+        return
+    nova = max(numero + 1, capacidade * 2, 4096)
+    caracteristicas = np.zeros((nova, TOTAL_COLUNAS), dtype=np.uint8)
+    if capacidade:
+        caracteristicas[:capacidade] = _estado['caracteristicas']
+    _estado['caracteristicas'] = caracteristicas
+    _estado['cumulativa'] = None
+    _estado['valida_ate'] = -1
+
+
+def _aplicar(sorteios, completo=False):
+    """Atualiza as características com os concursos alterados no histórico (observador do historico_store)."""
+    with _lock:
+        if completo:
+            _estado.update({'caracteristicas': None, 'cumulativa': None, 'valida_ate': -1,
+                            'sorteios': {}, 'ultimo': 0, 'construido': True})
+        numeros, linhas = [], []
+        for numero, entrada in sorteios.items():
+            dezenas = sorted(int(dezena) for dezena in entrada.get('dezenas') or [])
+            if len(dezenas) != 6:
+                continue
+            numero = int(numero)
+            _estado['sorteios'][numero] = dezenas
+            _estado['ultimo'] = max(_estado['ultimo'], numero)
+            numeros.append(numero)
+            linhas.append(dezenas)
+        if not numeros or np is None:
+            return
+        _garantir_capacidade(max(numeros))
+        _estado['caracteristicas'][numeros] = _caracteristicas(np.array(linhas, dtype=np.int64))
+        _estado['valida_ate'] = min(_estado['valida_ate'], min(numeros) - 1)
+
+
+historico_store.registrar_observador(_aplicar)
+
+
+def _garantir_construido():
+    """Carrega o histórico (o que calcula as características) e o mantém em dia com concursos novos."""
+    historico_store.atualizar()
+    if not _estado['construido']:
+        ultimo = historico_store.ultimo_numero()
+        if not _estado['construido']:
+            # O histórico já estava carregado antes do registro do observador
+            _aplicar(historico_store.obter_entradas(1, ultimo or 0), completo=True)
+
+
+def _cumulativa(numero):
+    """Soma das linhas de características dos concursos 1..numero."""
+    if numero < 1:
+        return np.zeros(TOTAL_COLUNAS, dtype=np.int64)
+    caracteristicas = _estado['caracteristicas']
+    if _estado['cumulativa'] is None:
+        _estado['cumulativa'] = np.zeros(caracteristicas.shape, dtype=np.int64)
+    cumulativa = _estado['cumulativa']
+    valida_ate = _estado['valida_ate']
+    if valida_ate < numero:
+        # Recalcular apenas as linhas posteriores à última soma válida
+        inicio = valida_ate + 1
+        np.cumsum(caracteristicas[inicio:numero + 1], axis=0, dtype=np.int64, out=cumulativa[inicio:numero + 1])
+        if inicio > 0:
+            cumulativa[inicio:numero + 1] += cumulativa[inicio - 1]
+        _estado['valida_ate'] = numero
+    return cumulativa[numero]
+
+
+def _contagens_sem_numpy(inicio, fim):
+    contagens = [0] * TOTAL_COLUNAS
+    for numero in range(inicio, fim + 1):
+        dezenas = _estado['sorteios'].get(numero)
+        if dezenas:
+            for coluna in _colunas(dezenas):
+                contagens[coluna] += 1
+    return contagens
+
+
+def obter_perfis(ultimos=None, inicio=None, fim=None):
+    """
+    Obtém os histogramas de pares/ímpares, faixas de soma, décadas e quadrantes de uma janela.
+
+    Args:
+        ultimos: Janela com os últimos N concursos (padrão: todo o histórico)
+        inicio: Primeiro concurso da janela (alternativa a ultimos)
+        fim: Último concurso da janela (padrão: o último do histórico)
+
+    Returns:
+        Dicionário com a janela analisada e a quantidade de concursos em cada valor de cada perfil
+    """
+    _garantir_construido()
+    with _lock:
+        ultimo = _estado['ultimo']
+        fim = min(fim or ultimo, ultimo)
+        inicio = max(1, fim - ultimos + 1 if ultimos else inicio or 1)
+        if not ultimo or fim < inicio:
+            raise ValueError("Intervalo de concursos inválido")
+        if np is None:
+            contagens = _contagens_sem_numpy(inicio, fim)
+        else:
+            contagens = (_cumulativa(fim) - _cumulativa(inicio - 1)).tolist()
+
+    def distribuicao(inicio_perfil, indice):
+        return contagens[inicio_perfil + indice * 7:inicio_perfil + indice * 7 + 7]
+
+    return {
+        'status': 'success',
+        'inicio': inicio,
+        'fim': fim,
+        'concursos_analisados': sum(contagens[_INICIO_PARES:_INICIO_PARES + 7]),
+        'pares_impares': [
+            {'pares': pares, 'impares': 6 - pares, 'concursos': contagens[_INICIO_PARES + pares]}
+            for pares in range(7)
+        ],
+        'soma': [
+            {'faixa': f"{faixa * LARGURA_FAIXA_SOMA}-{faixa * LARGURA_FAIXA_SOMA + LARGURA_FAIXA_SOMA - 1}",
+             'concursos': contagens[_INICIO_SOMA + faixa]}
+            for faixa in range(1, FAIXAS_SOMA)
+        ],
+        # distribuicao[k]: concursos com exatamente k dezenas na década ou no quadrante
+        'decadas': [
+            {'decada': f"{i * 10 + 1:02d}-{i * 10 + 10:02d}", 'distribuicao': distribuicao(_INICIO_DECADAS, i)}
+            for i in range(DECADAS)
+        ],
+        'quadrantes': [
+            {'quadrante': i + 1,
+             'dezenas': sorted(f"{dezena:02d}" for dezena in range(1, 61) if _quadrante(dezena) == i),
+             'distribuicao': distribuicao(_INICIO_QUADRANTES, i)}
+            for i in range(QUADRANTES)
+        ],
+        'ultimo_concurso': ultimo
+    }
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""
+Limitador de taxa (token bucket) para as chamadas à API da Caixa.
+
+O bucket é compartilhado por todas as threads do processo. Opcionalmente o estado pode
+ser mantido em um arquivo protegido por lock (fcntl), para que vários processos na mesma
+máquina (workers do gunicorn, scheduler, scripts) dividam a mesma cota.
+"""
+import os
+import threading
+import time
+
+# fcntl só existe em sistemas POSIX; sem ele o bucket fica restrito ao processo
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+class TokenBucket:
+    def __init__(self, taxa, capacidade, arquivo_estado=None):
+        """
+        Args:
+            taxa: Tokens repostos por segundo (requisições por segundo em regime)
+            capacidade: Máximo de tokens acumulados (rajada permitida)
+            arquivo_estado: Caminho de um arquivo para compartilhar o bucket entre processos (opcional)
+        """
+        if taxa <= 0:
+            raise ValueError("A taxa do limitador deve ser maior que zero")
+        self.taxa = float(taxa)
+        self.capacidade = max(1.0, float(capacidade))
+        self.arquivo_estado = arquivo_estado if fcntl is not None else None
+        self._tokens = self.capacidade
+        self._atualizado_em = time.time()
+        self._lock = threading.Lock()
+
+        if arquivo_estado and fcntl is None:
+            print("fcntl indisponível, limitador de taxa restrito ao processo atual")
+
+    def _consumir(self, tokens, tokens_disponiveis, atualizado_em, agora):
+        """
+        Repõe os tokens pelo tempo decorrido e tenta consumir.
+
+        Returns:
+            Tupla (tokens restantes, segundos de espera necessários; 0 se consumiu)
+        """
+        tokens_disponiveis = min(self.capacidade, tokens_disponiveis + (agora - atualizado_em) * self.taxa)
+        if tokens_disponiveis >= tokens:
+            return tokens_disponiveis - tokens, 0.0
+        return tokens_disponiveis, (tokens - tokens_disponiveis) / self.taxa
+
+    def _tentar_local(self, tokens):
+        with self._lock:
+            agora = time.time()
+            self._tokens, espera = self._consumir(tokens, self._tokens, self._atualizado_em, agora)
+            self._atualizado_em = agora
+            return espera
+
+    def _tentar_arquivo(self, tokens):
+        with self._lock:
+            with open(self.arquivo_estado, 'a+') as arquivo:
+                fcntl.flock(arquivo, fcntl.LOCK_EX)
+                try:
+                    arquivo.seek(0)
+                    try:
+                        tokens_disponiveis, atualizado_em = (float(v) for v in arquivo.read().split())
+                    except ValueError:
+                        tokens_disponiveis, atualizado_em = self.capacidade, time.time()
+
+                    agora = time.time()
+                    tokens_disponiveis, espera = self._consumir(tokens, tokens_disponiveis, atualizado_em, agora)
+
+                    arquivo.seek(0)
+                    arquivo.truncate()
+                    arquivo.write(f"{tokens_disponiveis} {agora}")
+                    arquivo.flush()
+                    return espera
+                finally:
+                    fcntl.flock(arquivo, fcntl.LOCK_UN)
+
+    def adquirir(self, tokens=1, timeout=None):
+        """
+        Aguarda até haver tokens disponíveis e os consome.
+
+        Args:
+            tokens: Quantidade de tokens a consumir
+            timeout: Tempo máximo de espera em segundos (None espera indefinidamente)
+
+        Returns:
+            bool: True se os tokens foram consumidos, False se o timeout expirou
+        """
+        limite = None if timeout is None else time.monotonic() + timeout
+        while True:
+            if self.arquivo_estado:
+                try:
+                    espera = self._tentar_arquivo(tokens)
+                except OSError as e:
+                    print(f"Erro ao acessar estado do limitador em {self.arquivo_estado}: {str(e)}")
+                    espera = self._tentar_local(tokens)
+            else:
+                espera = self._tentar_local(tokens)
+
+            if espera <= 0:
+                return True
+            if limite is not None and time.monotonic() + espera > limite:
+                return False
+            time.sleep(espera)
+
+    @classmethod
+    def a_partir_do_ambiente(cls, prefixo, taxa_padrao, capacidade_padrao):
+        """
+        Cria um limitador configurado por variáveis de ambiente.
+
+        Lê <prefixo>_RATE_LIMIT (tokens por segundo), <prefixo>_RATE_BURST (rajada)
+        e <prefixo>_RATE_LIMIT_FILE (arquivo para compartilhar entre processos).
+        """
+        return cls(
+            taxa=float(os.environ.get(f"{prefixo}_RATE_LIMIT", taxa_padrao)),
+            capacidade=float(os.environ.get(f"{prefixo}_RATE_BURST", capacidade_padrao)),
+            arquivo_estado=os.environ.get(f"{prefixo}_RATE_LIMIT_FILE") or None
+        )
@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+"""
+Camada de codificação de respostas HTTP compartilhada entre a API Flask (src/api.py)
+e o router do Firebase Functions (functions/main.py).
+
+Negocia o formato do corpo pelo cabeçalho Accept (JSON compacto ou MessagePack)
+e a compressão pelo cabeçalho Accept-Encoding (brotli ou gzip), comprimindo apenas
+respostas acima de um tamanho mínimo.
+"""
+import gzip
+import json
+import os
+from src.services.firebase_service import FirestoreEncoder
+
+# Dependências opcionais: sem elas a resposta cai para JSON / gzip
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Respostas menores que este tamanho (em bytes) não compensam a compressão
+TAMANHO_MINIMO_COMPRESSAO = int(os.environ.get('RESPONSE_COMPRESS_MIN_BYTES', 1024))
+NIVEL_GZIP = 6
+NIVEL_BROTLI = 5
+
+TIPO_JSON = 'application/json'
+TIPOS_MSGPACK = ('application/msgpack', 'application/x-msgpack')
+
+
+def _parse_qualidades(cabecalho):
+    """
+    Interpreta um cabeçalho no formato 'valor;q=0.8, outro' em um dicionário.
+
+    Args:
+        cabecalho: Valor bruto do cabeçalho Accept ou Accept-Encoding
+
+    Returns:
+        Dicionário {valor: qualidade}
+    """
+    qualidades = {}
+    if not cabecalho:
+        return qualidades
+
+    for parte in cabecalho.split(','):
+        itens = [item.strip() for item in parte.split(';')]
+        valor = itens[0].lower()
+        if not valor:
+            continue
+
+        qualidade = 1.0
+        for parametro in itens[1:]:
+            if parametro.startswith('q='):
+                try:
+                    qualidade = float(parametro[2:])
+                except ValueError:
+                    qualidade = 0.0
+        qualidades[valor] = qualidade
+    return qualidades
+
+
+def escolher_formato(accept):
+    """
+    Escolhe o formato do corpo da resposta a partir do cabeçalho Accept.
+
+    Args:
+        accept: Valor do cabeçalho Accept
+
+    Returns:
+        'msgpack' se o cliente pediu MessagePack (e a biblioteca está instalada), senão 'json'
+    """
+    if msgpack is None:
+        return 'json'
+
+    qualidades = _parse_qualidades(accept)
+    q_msgpack = max(qualidades.get(tipo, 0.0) for tipo in TIPOS_MSGPACK)
+    q_json = qualidades.get(TIPO_JSON, 0.0)
+    if q_msgpack > 0 and q_msgpack >= q_json:
+        return 'msgpack'
+    return 'json'
+
+
+def escolher_codificacao(accept_encoding):
+    """
+    Escolhe a compressão da resposta a partir do cabeçalho Accept-Encoding.
+
+    Args:
+        accept_encoding: Valor do cabeçalho Accept-Encoding
+
+    Returns:
+        'br', 'gzip' ou None quando o cliente não aceita nenhuma compressão suportada
+    """
+    qualidades = _parse_qualidades(accept_encoding)
+    curinga = qualidades.get('*', 0.0)
+
+    candidatas = []
+    if brotli is not None:
+        candidatas.append('br')
+    candidatas.append('gzip')
+
+    melhor, melhor_q = None, 0.0
+    for codificacao in candidatas:
+        qualidade = qualidades.get(codificacao, curinga)
+        if qualidade > melhor_q:
+            melhor, melhor_q = codificacao, qualidade
+    return melhor
+
+
+def _msgpack_default(obj):
+    """Converte tipos não suportados pelo MessagePack usando as mesmas regras do JSON."""
+    return FirestoreEncoder().default(obj)
+
+
+def serializar(dados, formato='json'):
+    """
+    Serializa os dados no formato escolhido.
+
+    Args:
+        dados: Estrutura a ser serializada
+        formato: 'json' ou 'msgpack'
+
+    Returns:
+        Tupla (bytes, content_type)
+    """
+    if formato == 'msgpack':
+        return msgpack.packb(dados, default=_msgpack_default, use_bin_type=True), TIPOS_MSGPACK[0]
+
+    corpo = json.dumps(dados, cls=FirestoreEncoder, ensure_ascii=False, separators=(',', ':'))
+    return corpo.encode('utf-8'), f'{TIPO_JSON}; charset=utf-8'
+
+
+def comprimir(corpo, codificacao):
+    """
+    Comprime o corpo da resposta com a codificação informada.
+
+    Args:
+        corpo: Bytes do corpo
+        codificacao: 'br' ou 'gzip'
+
+    Returns:
+        Bytes comprimidos
+    """
+    if codificacao == 'br':
+        return brotli.compress(corpo, quality=NIVEL_BROTLI)
+    return gzip.compress(corpo, compresslevel=NIVEL_GZIP)
+
+
+def codificar_resposta(dados, accept=None, accept_encoding=None):
+    """
+    Serializa e, se compensar, comprime os dados de uma resposta.
+
+    Args:
+        dados: Estrutura a ser enviada ao cliente
+        accept: Valor do cabeçalho Accept da requisição
+        accept_encoding: Valor do cabeçalho Accept-Encoding da requisição
+
+    Returns:
+        Tupla (corpo em bytes, dicionário de cabeçalhos)
+    """
+    corpo, content_type = serializar(dados, escolher_formato(accept))
+    headers = {
+        'Content-Type': content_type,
+        'Vary': 'Accept, Accept-Encoding'
+    }
+
+    if len(corpo) >= TAMANHO_MINIMO_COMPRESSAO:
+        codificacao = escolher_codificacao(accept_encoding)
+        if codificacao:
+            corpo = comprimir(corpo, codificacao)
+            headers['Content-Encoding'] = codificacao
+
+    headers['Content-Length'] = str(len(corpo))
+    return corpo, headers
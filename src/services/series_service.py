@@ -0,0 +1,289 @@
+# -*- coding: utf-8 -*-
+"""
+Séries temporais de arrecadação, estimativas e prêmios de cada concurso.
+
+Os valores do histórico em memória são mantidos em colunas (uma lista por campo, alinhadas
+com a lista ordenada dos números dos concursos) e agregados por mês e por ano. Um observador
+do historico_store atualiza as colunas e recalcula apenas o mês e o ano do concurso alterado.
+
+Para gráficos de longo prazo, as séries são reduzidas pelo algoritmo LTTB (Largest Triangle
+Three Buckets), que mantém os picos e vales visíveis com poucas centenas de pontos. As
+sequências de concursos acumulados são detectadas em uma passada pela coluna acumulado.
+"""
+import threading
+from bisect import bisect_left
+from src.services import historico_store
+
+PONTOS_PADRAO = 500
+PONTOS_MAXIMO = 5000
+AGRUPAMENTOS = {'mes': 7, 'ano': 4}  # prefixo da data (AAAA-MM-DD) que identifica o período
+MAIORES_SEQUENCIAS = 5
+
+_FAIXAS = ('sena', 'quina', 'quadra')
+
+
+def _valor(lista, i):
+    return float((lista or [])[i] or 0) if i < len(lista or []) else 0.0
+
+
+# Campos disponíveis nas séries, extraídos da entrada compacta de cada concurso
+CAMPOS_SERIE = {
+    'valor_arrecadado': lambda entrada: float(entrada.get('arrecadado') or 0),
+    'valor_acumulado_proximo_concurso': lambda entrada: float(entrada.get('acumulado_proximo') or 0),
+    'valor_estimado_proximo_concurso': lambda entrada: float(entrada.get('estimativa_proximo') or 0),
+    **{f'premio_{faixa}': (lambda i: lambda entrada: _valor(entrada.get('premios'), i))(i)
+       for i, faixa in enumerate(_FAIXAS)},
+    **{f'ganhadores_{faixa}': (lambda i: lambda entrada: _valor(entrada.get('ganhadores'), i))(i)
+       for i, faixa in enumerate(_FAIXAS)},
+}
+
+_estado = {
+    'numeros': [],                                    # números dos concursos, em ordem crescente
+    'datas': [],                                      # data (AAAA-MM-DD) de cada concurso
+    'acumulado': [],                                  # se o concurso acumulou
+    'colunas': {campo: [] for campo in CAMPOS_SERIE},
+    'membros': {agrupamento: {} for agrupamento in AGRUPAMENTOS},   # período -> números dos concursos
+    'periodos': {agrupamento: {} for agrupamento in AGRUPAMENTOS},  # período -> agregados
+    'construido': False
+}
+_lock = threading.Lock()
+
+
+def _periodo(data, agrupamento):
+    return str(data)[:AGRUPAMENTOS[agrupamento]] if data else None
+
+
+def _agregar_periodo(agrupamento, periodo):
+    """Recalcula os agregados de um mês ou ano a partir das colunas."""
+    numeros = _estado['numeros']
+    colunas = _estado['colunas']
+    membros = _estado['membros'][agrupamento].get(periodo)
+    if not membros:
+        _estado['membros'][agrupamento].pop(periodo, None)
+        _estado['periodos'][agrupamento].pop(periodo, None)
+        return
+    indices = [bisect_left(numeros, numero) for numero in sorted(membros)]
+    arrecadado = sum(colunas['valor_arrecadado'][i] for i in indices)
+    _estado['periodos'][agrupamento][periodo] = {
+        'periodo': periodo,
+        'concursos': len(indices),
+        'primeiro_concurso': numeros[indices[0]],
+        'ultimo_concurso': numeros[indices[-1]],
+        'valor_arrecadado': round(arrecadado, 2),
+        'media_arrecadado': round(arrecadado / len(indices), 2),
+        'acumulados': sum(1 for i in indices if _estado['acumulado'][i]),
+        'maior_estimativa': max(colunas['valor_estimado_proximo_concurso'][i] for i in indices),
+        # Total pago em cada faixa: ganhadores × prêmio individual
+        'premios_pagos': {
+            faixa: round(sum(colunas[f'ganhadores_{faixa}'][i] * colunas[f'premio_{faixa}'][i] for i in indices), 2)
+            for faixa in _FAIXAS
+        },
+        'ganhadores': {faixa: int(sum(colunas[f'ganhadores_{faixa}'][i] for i in indices)) for faixa in _FAIXAS}
+    }
+
+
+def _aplicar(sorteios, completo=False):
+    """Atualiza as colunas com os concursos alterados no histórico (observador do historico_store)."""
+    with _lock:
+        if completo:
+            _estado.update({
+                'numeros': [], 'datas': [], 'acumulado': [],
+                'colunas': {campo: [] for campo in CAMPOS_SERIE},
+                'membros': {agrupamento: {} for agrupamento in AGRUPAMENTOS},
+                'periodos': {agrupamento: {} for agrupamento in AGRUPAMENTOS},
+                'construido': True
+            })
+        numeros = _estado['numeros']
+        alterados = set()
+        for numero, entrada in sorted((int(numero), entrada) for numero, entrada in sorteios.items()):
+            data = str(entrada.get('data'))[:10] if entrada.get('data') else None
+            # Concursos novos chegam em ordem: o caso comum é acrescentar ao final das colunas
+            i = len(numeros) if not numeros or numero > numeros[-1] else bisect_left(numeros, numero)
+            if i < len(numeros) and numeros[i] == numero:
+                for agrupamento in AGRUPAMENTOS:
+                    periodo = _periodo(_estado['datas'][i], agrupamento)
+                    _estado['membros'][agrupamento].get(periodo, set()).discard(numero)
+                    alterados.add((agrupamento, periodo))
+                _estado['datas'][i] = data
+                _estado['acumulado'][i] = bool(entrada.get('acumulado'))
+                for campo, extrair in CAMPOS_SERIE.items():
+                    _estado['colunas'][campo][i] = extrair(entrada)
+            else:
+                numeros.insert(i, numero)
+                _estado['datas'].insert(i, data)
+                _estado['acumulado'].insert(i, bool(entrada.get('acumulado')))
+                for campo, extrair in CAMPOS_SERIE.items():
+                    _estado['colunas'][campo].insert(i, extrair(entrada))
+            for agrupamento in AGRUPAMENTOS:
+                periodo = _periodo(data, agrupamento)
+                if periodo:
+                    _estado['membros'][agrupamento].setdefault(periodo, set()).add(numero)
+                    alterados.add((agrupamento, periodo))
+
+        for agrupamento, periodo in alterados:
+            if periodo:
+                _agregar_periodo(agrupamento, periodo)
+
+
+historico_store.registrar_observador(_aplicar)
+
+
+def _garantir_construido():
+    """Carrega o histórico (o que monta as colunas) e o mantém em dia com concursos novos."""
+    historico_store.atualizar()
+    if not _estado['construido']:
+        ultimo = historico_store.ultimo_numero()
+        if not _estado['construido']:
+            # O histórico já estava carregado antes do registro do observador
+            _aplicar(historico_store.obter_entradas(1, ultimo or 0), completo=True)
+
+
+def lttb(xs, ys, pontos):
+    """
+    Reduz uma série a `pontos` pontos pelo algoritmo Largest Triangle Three Buckets.
+
+    O primeiro e o último ponto são mantidos; os demais são divididos em pontos - 2 grupos,
+    e de cada grupo é escolhido o ponto que forma o maior triângulo com o ponto escolhido
+    no grupo anterior e a média do grupo seguinte.
+
+    Returns:
+        Índices dos pontos escolhidos, em ordem crescente
+    """
+    total = len(xs)
+    if pontos >= total:
+        return list(range(total))
+    if pontos < 3:
+        return [0, total - 1][:pontos]
+
+    escolhidos = [0]
+    tamanho = (total - 2) / (pontos - 2)
+    anterior = 0
+    for grupo in range(pontos - 2):
+        inicio = int(grupo * tamanho) + 1
+        fim = int((grupo + 1) * tamanho) + 1
+        seguinte_fim = min(int((grupo + 2) * tamanho) + 1, total)
+        if fim < seguinte_fim:
+            media_x = sum(xs[fim:seguinte_fim]) / (seguinte_fim - fim)
+            media_y = sum(ys[fim:seguinte_fim]) / (seguinte_fim - fim)
+        else:
+            media_x, media_y = xs[-1], ys[-1]
+
+        ax, ay = xs[anterior], ys[anterior]
+        melhor, maior_area = inicio, -1.0
+        for j in range(inicio, fim):
+            area = abs((ax - media_x) * (ys[j] - ay) - (ax - xs[j]) * (media_y - ay))
+            if area > maior_area:
+                melhor, maior_area = j, area
+        escolhidos.append(melhor)
+        anterior = melhor
+    escolhidos.append(total - 1)
+    return escolhidos
+
+
+def _sequencias_acumulacao(inicio, fim):
+    """Sequências de concursos consecutivos que acumularam, no intervalo de índices informado."""
+    numeros = _estado['numeros']
+    acumulado = _estado['acumulado']
+    colunas = _estado['colunas']
+    sequencias = []
+    comeco = None
+    for i in range(inicio, fim + 1):
+        continua = comeco is not None and acumulado[i] and numeros[i] == numeros[i - 1] + 1
+        if acumulado[i] and not continua:
+            if comeco is not None:
+                sequencias.append((comeco, i - 1))
+            comeco = i
+        elif not acumulado[i] and comeco is not None:
+            sequencias.append((comeco, i - 1))
+            comeco = None
+    atual = None
+    if comeco is not None:
+        sequencias.append((comeco, fim))
+        atual = (comeco, fim)
+
+    def descrever(sequencia):
+        primeiro, ultimo = sequencia
+        descricao = {
+            'inicio': numeros[primeiro],
+            'fim': numeros[ultimo],
+            'concursos': ultimo - primeiro + 1,
+            'maior_estimativa': max(colunas['valor_estimado_proximo_concurso'][primeiro:ultimo + 1])
+        }
+        # Prêmio da sena pago no concurso que encerrou a sequência
+        seguinte = ultimo + 1
+        if seguinte < len(numeros) and numeros[seguinte] == numeros[ultimo] + 1 and not acumulado[seguinte]:
+            descricao['encerrada_no_concurso'] = numeros[seguinte]
+            descricao['premio_sena_pago'] = round(
+                colunas['ganhadores_sena'][seguinte] * colunas['premio_sena'][seguinte], 2)
+        return descricao
+
+    maiores = sorted(sequencias, key=lambda sequencia: (sequencia[0] - sequencia[1], -sequencia[0]))
+    return {
+        'total': len(sequencias),
+        'atual': descrever(atual) if atual else None,
+        'maiores': [descrever(sequencia) for sequencia in maiores[:MAIORES_SEQUENCIAS]]
+    }
+
+
+def obter_series(campo='valor_arrecadado', pontos=PONTOS_PADRAO, agrupar=None, ultimos=None, inicio=None, fim=None):
+    """
+    Obtém a série temporal de um campo de valores dos concursos, reduzida para gráficos.
+
+    Args:
+        campo: Campo da série (uma das chaves de CAMPOS_SERIE)
+        pontos: Quantidade máxima de pontos da série (redução por LTTB)
+        agrupar: 'mes' ou 'ano' para incluir os agregados por período
+        ultimos: Janela com os últimos N concursos (padrão: todo o histórico)
+        inicio: Primeiro concurso da janela (alternativa a ultimos)
+        fim: Último concurso da janela
+
+    Returns:
+        Dicionário com a série em colunas (concursos, datas, valores), as sequências de
+        concursos acumulados e, se pedido, os agregados por período
+    """
+    campo = campo or 'valor_arrecadado'
+    if campo not in CAMPOS_SERIE:
+        raise ValueError(f"Campo inválido. Use um de: {', '.join(CAMPOS_SERIE)}")
+    if agrupar and agrupar not in AGRUPAMENTOS:
+        raise ValueError(f"Agrupamento inválido. Use um de: {', '.join(AGRUPAMENTOS)}")
+    pontos = max(2, min(PONTOS_MAXIMO, pontos or PONTOS_PADRAO))
+
+    _garantir_construido()
+    with _lock:
+        numeros = _estado['numeros']
+        if not numeros:
+            raise ValueError("Nenhum sorteio disponível no histórico")
+        ultimo = numeros[-1]
+        fim = min(fim or ultimo, ultimo)
+        inicio = max(1, fim - ultimos + 1 if ultimos else inicio or 1)
+        primeiro_indice = bisect_left(numeros, inicio)
+        ultimo_indice = bisect_left(numeros, fim + 1) - 1
+        if fim < inicio or ultimo_indice < primeiro_indice:
+            raise ValueError("Intervalo de concursos inválido")
+
+        xs = numeros[primeiro_indice:ultimo_indice + 1]
+        ys = _estado['colunas'][campo][primeiro_indice:ultimo_indice + 1]
+        datas = _estado['datas'][primeiro_indice:ultimo_indice + 1]
+        escolhidos = lttb(xs, ys, pontos)
+        resultado = {
+            'status': 'success',
+            'campo': campo,
+            'inicio': xs[0],
+            'fim': xs[-1],
+            'concursos_analisados': len(xs),
+            'serie': {
+                'concursos': [xs[i] for i in escolhidos],
+                'datas': [datas[i] for i in escolhidos],
+                'valores': [ys[i] for i in escolhidos]
+            },
+            'acumulacoes': _sequencias_acumulacao(primeiro_indice, ultimo_indice),
+            'ultimo_concurso': ultimo
+        }
+        if agrupar:
+            # Períodos com concursos na janela (os agregados são sempre do período inteiro)
+            resultado['agrupamento'] = agrupar
+            resultado['periodos'] = [
+                dict(agregado) for _, agregado in sorted(_estado['periodos'][agrupar].items())
+                if agregado['ultimo_concurso'] >= xs[0] and agregado['primeiro_concurso'] <= xs[-1]
+            ]
+    return resultado
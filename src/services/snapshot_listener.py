@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+"""
+Listener do Firestore (on_snapshot) que mantém os caches do processo atualizados.
+
+Cada worker do gunicorn ou instância do Functions escuta os blocos de sorteios e o último
+concurso. As mudanças são empurradas para o histórico em memória e para o último concurso
+conhecido do cache HTTP, então as leituras são servidas da memória e ficam atualizadas
+poucos segundos após cada gravação. Se a conexão cair, o listener é recriado com backoff
+exponencial.
+
+É opcional: só é iniciado com FIRESTORE_LISTENER=true.
+"""
+import os
+import threading
+from google.cloud import firestore
+from src.services import historico_store, http_cache
+from src.services.firebase_service import FirebaseService, COLECAO_BLOCOS, COLECAO_CONCURSOS
+
+# Intervalo de verificação das conexões e limites do backoff de reconexão, em segundos
+INTERVALO_VERIFICACAO = 5
+BACKOFF_INICIAL = 1
+BACKOFF_MAXIMO = 60
+
+_estado = {'thread': None, 'watches': [], 'backoff': BACKOFF_INICIAL, 'reconexoes': 0}
+_lock = threading.Lock()
+_parar = threading.Event()
+
+
+def _ao_receber_blocos(docs, changes, read_time):
+    """Aplica no histórico em memória os blocos adicionados ou alterados."""
+    try:
+        alterados = [change.document for change in changes if change.type.name in ('ADDED', 'MODIFIED')]
+        for doc in alterados:
+            historico_store.aplicar_sorteios((doc.to_dict() or {}).get('sorteios'))
+        # O primeiro snapshot traz todos os blocos: o histórico está completo e ao vivo
+        historico_store.aplicar_sorteios({}, completo=True)
+        historico_store.definir_ao_vivo(True)
+        _estado['backoff'] = BACKOFF_INICIAL
+    except Exception as e:
+        print(f"Erro ao aplicar blocos recebidos do listener: {str(e)}")
+
+
+def _ao_receber_ultimo(docs, changes, read_time):
+    """Atualiza o último concurso em memória e no cache HTTP."""
+    try:
+        if not docs:
+            return
+        conteudo = FirebaseService._conteudo_concurso(docs[0].to_dict() or {})
+        historico_store.registrar_ultimo(conteudo)
+        http_cache.registrar_ultimo_concurso(conteudo.get('concurso'))
+    except Exception as e:
+        print(f"Erro ao aplicar último concurso recebido do listener: {str(e)}")
+
+
+def _assinar():
+    """Cria os listeners dos blocos e do último concurso."""
+    db = FirebaseService.get_instance().db
+    ultimo = (db.collection(COLECAO_CONCURSOS)
+              .order_by('numero', direction=firestore.Query.DESCENDING)
+              .limit(1))
+    _estado['watches'] = [
+        db.collection(COLECAO_BLOCOS).on_snapshot(_ao_receber_blocos),
+        ultimo.on_snapshot(_ao_receber_ultimo)
+    ]
+
+
+def _cancelar():
+    """Cancela os listeners atuais, ignorando erros de conexões já encerradas."""
+    for watch in _estado['watches']:
+        try:
+            watch.unsubscribe()
+        except Exception:
+            pass
+    _estado['watches'] = []
+
+
+def _conectado():
+    return bool(_estado['watches']) and all(getattr(watch, 'is_active', True) for watch in _estado['watches'])
+
+
+def _supervisionar():
+    """Mantém os listeners ativos, recriando-os com backoff exponencial quando caem."""
+    primeira_conexao = True
+    while not _parar.is_set():
+        if not _conectado():
+            historico_store.definir_ao_vivo(False)
+            _cancelar()
+            if not primeira_conexao:
+                # O backoff volta ao valor inicial quando um snapshot é recebido
+                espera = _estado['backoff']
+                _estado['backoff'] = min(BACKOFF_MAXIMO, espera * 2)
+                _estado['reconexoes'] += 1
+                print(f"Listener do Firestore desconectado, reconectando em {espera}s")
+                if _parar.wait(espera):
+                    break
+            primeira_conexao = False
+            try:
+                _assinar()
+                print("Listener do Firestore conectado")
+            except Exception as e:
+                print(f"Erro ao conectar o listener do Firestore: {str(e)}")
+                continue
+        _parar.wait(INTERVALO_VERIFICACAO)
+    _cancelar()
+    historico_store.definir_ao_vivo(False)
+
+
+def iniciar_listener():
+    """
+    Inicia o listener em uma thread de segundo plano, se habilitado por FIRESTORE_LISTENER.
+
+    Returns:
+        bool: True se o listener está em execução
+    """
+    if os.environ.get('FIRESTORE_LISTENER', 'false').lower() != 'true' or not FirebaseService.is_available():
+        return False
+    with _lock:
+        if _estado['thread'] is not None and _estado['thread'].is_alive():
+            return True
+        _parar.clear()
+        _estado['thread'] = threading.Thread(target=_supervisionar, name='firestore-listener', daemon=True)
+        _estado['thread'].start()
+    return True
+
+
+def parar_listener():
+    """Encerra o listener e volta a servir o histórico por consultas sob demanda."""
+    _parar.set()
+    with _lock:
+        thread = _estado['thread']
+    if thread is not None:
+        thread.join(timeout=INTERVALO_VERIFICACAO + 1)
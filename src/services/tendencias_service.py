@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+"""
+Séries de frequência móvel de cada dezena (tendência de dezenas quentes e frias).
+
+A frequência de uma dezena nos `janela` concursos terminados em n é C[n] - C[n - janela],
+onde C é a soma cumulativa da matriz de incidência (uma linha por concurso, 60 colunas).
+Assim, as séries das 60 dezenas em todos os pontos pedidos saem de uma única passada
+vetorizada, em vez de uma estatística completa por ponto.
+
+As séries calculadas ficam em cache por (janela, pontos, último concurso); qualquer mudança
+do histórico em memória esvazia o cache.
+"""
+import threading
+from src.services import historico_store
+
+# Dependência opcional: sem numpy, as séries são calculadas com uma janela deslizante em Python
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+JANELA_PADRAO = 50
+JANELA_MAXIMA = 1000
+PONTOS_PADRAO = 100
+PONTOS_MAXIMO = 1000
+MAX_SERIES_EM_CACHE = 32
+
+_cache = {}
+_geracao = {'valor': 0}  # incrementada a cada invalidação, para não guardar séries calculadas antes dela
+_lock = threading.Lock()
+
+
+def _invalidar(sorteios, completo=False):
+    """Esvazia o cache a cada mudança do histórico (observador do historico_store)."""
+    with _lock:
+        _cache.clear()
+        _geracao['valor'] += 1
+
+
+historico_store.registrar_observador(_invalidar)
+
+
+def _pontos(janela, ultimo, quantidade):
+    """Concursos finais das janelas amostradas, igualmente espaçados até o último concurso."""
+    if quantidade >= ultimo - janela + 1:
+        return list(range(janela, ultimo + 1))
+    passo = (ultimo - janela) / (quantidade - 1) if quantidade > 1 else 0
+    return sorted({ultimo - round(passo * i) for i in range(quantidade)})
+
+
+def _series_numpy(entradas, janela, pontos):
+    incidencia = np.zeros((pontos[-1] + 1, 60), dtype=np.int32)
+    for numero, entrada in entradas.items():
+        if numero < incidencia.shape[0]:
+            incidencia[numero, [int(dezena) - 1 for dezena in entrada.get('dezenas') or []]] = 1
+    cumulativa = np.cumsum(incidencia, axis=0)
+    fins = np.array(pontos)
+    # Linhas n × 60 -> 60 séries com um valor por ponto
+    return (cumulativa[fins] - cumulativa[fins - janela]).T.tolist()
+
+
+def _series_python(entradas, janela, pontos):
+    series = [[] for _ in range(60)]
+    contagem = [0] * 60
+    alvos = set(pontos)
+    for numero in range(1, pontos[-1] + 1):
+        for dezena in (entradas.get(numero) or {}).get('dezenas') or []:
+            contagem[int(dezena) - 1] += 1
+        for dezena in (entradas.get(numero - janela) or {}).get('dezenas') or []:
+            contagem[int(dezena) - 1] -= 1
+        if numero in alvos:
+            for i in range(60):
+                series[i].append(contagem[i])
+    return series
+
+
+def obter_tendencias(janela=JANELA_PADRAO, pontos=PONTOS_PADRAO):
+    """
+    Obtém a frequência móvel de cada dezena ao longo do histórico.
+
+    Args:
+        janela: Quantidade de concursos de cada janela
+        pontos: Quantidade máxima de pontos da série, igualmente espaçados até o último concurso
+
+    Returns:
+        Dicionário com os concursos finais de cada janela e, para cada dezena, a quantidade
+        de vezes que saiu em cada janela
+    """
+    janela = janela or JANELA_PADRAO
+    if not 1 <= janela <= JANELA_MAXIMA:
+        raise ValueError(f"A janela deve estar entre 1 e {JANELA_MAXIMA} concursos")
+    pontos = max(1, min(PONTOS_MAXIMO, pontos or PONTOS_PADRAO))
+
+    historico_store.atualizar()
+    ultimo = historico_store.ultimo_numero()
+    if not ultimo or ultimo < janela:
+        raise ValueError("O histórico tem menos concursos que a janela pedida")
+
+    chave = (janela, pontos, ultimo)
+    with _lock:
+        if chave in _cache:
+            return _cache[chave]
+        geracao = _geracao['valor']
+
+    concursos = _pontos(janela, ultimo, pontos)
+    entradas = historico_store.obter_entradas(1, ultimo)
+    series = (_series_numpy if np is not None else _series_python)(entradas, janela, concursos)
+    resultado = {
+        'status': 'success',
+        'janela': janela,
+        # Frequência de cada dezena em uma janela se os sorteios fossem uniformes
+        'frequencia_esperada': round(janela * 6 / 60, 2),
+        'concursos': concursos,
+        'dezenas': [{'dezena': f"{i + 1:02d}", 'frequencias': serie} for i, serie in enumerate(series)],
+        'ultimo_concurso': ultimo
+    }
+
+    with _lock:
+        if geracao != _geracao['valor']:
+            return resultado
+        if len(_cache) >= MAX_SERIES_EM_CACHE:
+            _cache.clear()
+        _cache[chave] = resultado
+    return resultado
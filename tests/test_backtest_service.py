@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+import pytest
+from src.services import backtest_service, historico_store
+
+SORTEIOS = {
+    1: {'dezenas': [1, 2, 3, 4, 5, 6], 'premios': [1000000.0, 5000.0, 100.0]},
+    2: {'dezenas': [10, 20, 30, 40, 50, 60], 'premios': [2000000.0, 6000.0, 200.0]},
+}
+
+
+@pytest.fixture(autouse=True)
+def historico(monkeypatch):
+    monkeypatch.setattr(historico_store, 'ultimo_numero', lambda: max(SORTEIOS))
+    monkeypatch.setattr(historico_store, 'obter_entradas',
+                        lambda inicio, fim: {n: e for n, e in SORTEIOS.items() if inicio <= n <= fim})
+
+
+@pytest.fixture(params=['numpy', 'python'])
+def modo(request, monkeypatch):
+    if request.param == 'numpy' and backtest_service.np is None:
+        pytest.skip("numpy não está instalado")
+    if request.param == 'python':
+        monkeypatch.setattr(backtest_service, 'np', None)
+    return request.param
+
+
+@pytest.mark.parametrize('aposta', [5, None, 'a', ['a', 2, 3, 4, 5, 6], [1, 2, 3], [1, 1, 2, 3, 4, 5], [0, 1, 2, 3, 4, 5]])
+def test_aposta_invalida_identifica_a_aposta(modo, aposta):
+    with pytest.raises(ValueError, match=r"^Aposta 2 inválida: "):
+        backtest_service.executar_backtest([[1, 2, 3, 4, 5, 6], aposta])
+
+
+def test_apostas_validadas_antes_dos_sorteios(monkeypatch):
+    def _falhar(inicio, fim):
+        raise AssertionError("a matriz dos sorteios não deveria ser montada")
+
+    monkeypatch.setattr(backtest_service, '_matrizes_sorteios', _falhar)
+    monkeypatch.setattr(historico_store, 'obter_entradas', _falhar)
+    with pytest.raises(ValueError, match="Aposta 1 inválida"):
+        backtest_service.executar_backtest([None])
+
+
+def test_backtest_apostas_validas(modo):
+    resultado = backtest_service.executar_backtest([[1, 2, 3, 4, 5, 6], ['10', '20', '30', '40', '7', '8']])
+
+    assert resultado['concursos_analisados'] == 2
+    primeira, segunda = resultado['resultados']
+    assert primeira['histograma_acertos'] == [1, 0, 0, 0, 0, 0, 1]
+    assert primeira['premio_total'] == 1000000.0
+    assert segunda['histograma_acertos'] == [1, 0, 0, 0, 1, 0, 0]
+    assert segunda['premio_total'] == 200.0
+    assert resultado['premio_total'] == 1000200.0
@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+import copy
+
+import pytest
+from google.cloud import firestore
+
+from src.services import firebase_service, historico_store
+from src.services.firebase_service import FirebaseService
+
+
+class _Conflito(Exception):
+    pass
+
+
+class _Snapshot:
+    def __init__(self, id, dados):
+        self.id = id
+        self.exists = dados is not None
+        self._dados = dados
+
+    def to_dict(self):
+        return copy.deepcopy(self._dados)
+
+
+def _mesclar(destino, dados):
+    for campo, valor in dados.items():
+        if isinstance(valor, firestore.ArrayUnion):
+            atual = destino.setdefault(campo, [])
+            atual.extend(v for v in valor.values if v not in atual)
+        elif isinstance(valor, dict) and isinstance(destino.get(campo), dict):
+            _mesclar(destino[campo], valor)
+        else:
+            destino[campo] = copy.deepcopy(valor)
+
+
+class _Documento:
+    def __init__(self, db, colecao, id):
+        self.db, self.colecao, self.id = db, colecao, id
+
+    @property
+    def chave(self):
+        return (self.colecao, self.id)
+
+    def get(self, transaction=None):
+        if transaction is not None:
+            transaction.lidos[self.chave] = self.db.versoes.get(self.chave, 0)
+        return _Snapshot(self.id, self.db.dados.get(self.chave))
+
+
+class _Consulta:
+    def __init__(self, db, colecao, filtros=(), ordem=None, limite=None):
+        self.db, self.colecao = db, colecao
+        self.filtros, self.ordem, self.limite = list(filtros), ordem, limite
+
+    def document(self, id):
+        return _Documento(self.db, self.colecao, str(id))
+
+    def where(self, filter):
+        assert filter.op_string == '>'
+        return _Consulta(self.db, self.colecao, self.filtros + [filter], self.ordem, self.limite)
+
+    def order_by(self, campo):
+        return _Consulta(self.db, self.colecao, self.filtros, campo, self.limite)
+
+    def limit(self, limite):
+        return _Consulta(self.db, self.colecao, self.filtros, self.ordem, limite)
+
+    def stream(self):
+        documentos = [_Snapshot(id, dados) for (colecao, id), dados in self.db.dados.items()
+                      if colecao == self.colecao
+                      and all((dados.get(f.field_path) or 0) > f.value for f in self.filtros)]
+        if self.ordem:
+            documentos.sort(key=lambda doc: doc._dados[self.ordem])
+        return iter(documentos[:self.limite])
+
+
+class _Transacao:
+    def __init__(self, db):
+        self.db, self.lidos, self.escritas = db, {}, []
+
+    def set(self, ref, dados, merge=False):
+        self.escritas.append((ref.chave, dados, merge))
+
+    def update(self, ref, dados):
+        self.escritas.append((ref.chave, dados, True))
+
+    def confirmar(self):
+        if self.db.antes_de_confirmar:
+            gancho, self.db.antes_de_confirmar = self.db.antes_de_confirmar, None
+            gancho()
+        if any(self.db.versoes.get(chave, 0) != versao for chave, versao in self.lidos.items()):
+            raise _Conflito()
+        for chave, dados, merge in self.escritas:
+            documento = self.db.dados.get(chave) if merge else None
+            self.db.dados[chave] = documento if documento is not None else {}
+            _mesclar(self.db.dados[chave], dados)
+            self.db.versoes[chave] = self.db.versoes.get(chave, 0) + 1
+
+
+class _FirestoreFalso:
+    """Firestore em memória com transações otimistas: a confirmação falha se um documento lido mudou."""
+
+    def __init__(self):
+        self.dados, self.versoes = {}, {}
+        self.antes_de_confirmar = None
+
+    def collection(self, nome):
+        return _Consulta(self, nome)
+
+    def transaction(self):
+        return _Transacao(self)
+
+
+def _transacional(funcao):
+    def executar(transaction):
+        while True:
+            resultado = funcao(transaction)
+            try:
+                transaction.confirmar()
+                return resultado
+            except _Conflito:
+                transaction = transaction.db.transaction()
+    return executar
+
+
+class _Servico:
+    def __init__(self, db):
+        self.db = db
+
+
+@pytest.fixture
+def db(monkeypatch):
+    db = _FirestoreFalso()
+    monkeypatch.setattr(firebase_service.firestore, 'transactional', _transacional)
+    monkeypatch.setattr(FirebaseService, '_instance', _Servico(db))
+    monkeypatch.setattr(historico_store, '_sorteios', {})
+    return db
+
+
+def _concurso(numero):
+    return {'concurso': numero, 'data': '01/01/2024', 'dezenas': [1, 2, 3, 4, 5, numero % 50 + 6]}
+
+
+def _sincronizar(desde):
+    concursos = []
+    while True:
+        alteracoes = FirebaseService.buscar_alteracoes(desde, limite=2)
+        concursos.extend(c['concurso'] for c in alteracoes['concursos'])
+        desde = alteracoes['watermark']
+        if not alteracoes['tem_mais']:
+            return concursos, desde
+
+
+def test_replica_nao_perde_lote_confirmado_depois_de_gravacao_concorrente(db):
+    replica = {}
+
+    def gravacao_concorrente():
+        # Entre a leitura do contador pelo lote e a sua confirmação, outro processo grava um
+        # concurso e uma réplica sincroniza, avançando a marca d'água
+        FirebaseService.salvar_concurso(_concurso(10))
+        replica['concursos'], replica['watermark'] = _sincronizar(0)
+
+    db.antes_de_confirmar = gravacao_concorrente
+    resultados = FirebaseService.salvar_concursos([_concurso(n) for n in (1, 2, 3)])
+
+    assert replica == {'concursos': [10], 'watermark': 1}
+    assert [r['sequencia'] for r in resultados] == [2, 3, 4]
+    concursos, watermark = _sincronizar(replica['watermark'])
+    assert concursos == [1, 2, 3]
+    assert watermark == 4
+    assert db.dados[('indices', 'sequencia_concursos')] == {'valor': 4}
+
+
+def test_numerar_concursos_nao_reutiliza_sequencia_concorrente(db):
+    for numero in (1, 2):
+        db.dados[('concursos', str(numero))] = {'numero': numero, 'dezenas': ['01']}
+
+    db.antes_de_confirmar = lambda: FirebaseService.salvar_concurso(_concurso(3))
+    assert FirebaseService.numerar_concursos([1, 2]) == (2, 3)
+
+    concursos, watermark = _sincronizar(0)
+    assert concursos == [3, 1, 2]
+    assert watermark == 3